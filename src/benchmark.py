@@ -0,0 +1,126 @@
+import sys
+import time
+import json
+import argparse
+from engine import LookupEngine, DEFAULT_WORKERS
+from transport import SearchTransport
+from key_pool import KeyPool
+from rate_limit import RateLimiter
+from mock_server import MockSearchServer
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class TimedEngine(LookupEngine):
+    # Times whole lookups (retries and backoff included), which is what a user waits for.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookup_times = []
+
+    def lookup(self, domain):
+        started = time.monotonic()
+        outcome = super().lookup(domain)
+        with self.lock:
+            self.lookup_times.append(time.monotonic() - started)
+        return outcome
+
+
+def run_scenario(args, workers, hedge):
+    invalid_keys = [f"bench-invalid-{n}" for n in range(args.invalid_keys)]
+    api_keys = [f"bench-key-{n}" for n in range(args.keys)] + invalid_keys
+    domains = [f"domain{n}.example" for n in range(args.domains)]
+    server = MockSearchServer(latency=args.latency / 1000.0, jitter=args.jitter / 1000.0,
+                              tail_rate=args.tail_rate, tail_latency=args.tail_latency / 1000.0,
+                              throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                              daily_quota=args.daily_quota, invalid_keys=invalid_keys)
+    with server:
+        transport = SearchTransport(pool_size=workers, url=server.url)
+        engine = TimedEngine(KeyPool(api_keys, daily_quota=args.daily_quota or 10 ** 9), server.cx,
+                             workers=workers, transport=transport,
+                             rate_limiter=RateLimiter(per_minute=args.qpm),
+                             timeout=args.timeout, hedge=hedge)
+        started = time.monotonic()
+        results, _, not_processed = engine.run(domains)
+        elapsed = time.monotonic() - started
+        stats = transport.stats()
+        transport.close()
+    wasted = max(0, stats["requests"] - len(results))
+    return {
+        "workers": workers,
+        "hedge": hedge,
+        "domains": len(domains),
+        "checked": len(results),
+        "unchecked": len(not_processed),
+        "elapsed": round(elapsed, 3),
+        "domains_per_s": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(engine.lookup_times, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(engine.lookup_times, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(engine.lookup_times, 0.99) * 1000, 1),
+        "requests": stats["requests"],
+        "retries": engine.retries,
+        "hedges": engine.hedges,
+        "hedge_wins": engine.hedge_wins,
+        "wasted_requests": wasted,
+        "quota_waste_pct": round(100.0 * wasted / stats["requests"], 1) if stats["requests"] else 0.0,
+        "statuses": {str(code): count for code, count in sorted(server.statuses.items())},
+        "connections_opened": stats["connections_opened"],
+    }
+
+
+COLUMNS = [("workers", 7), ("hedge", 5), ("checked", 7), ("domains_per_s", 9), ("p50_ms", 8), ("p95_ms", 8),
+           ("p99_ms", 8), ("requests", 8), ("retries", 7), ("hedges", 6), ("quota_waste_pct", 7)]
+HEADERS = {"domains_per_s": "dom/s", "quota_waste_pct": "waste%"}
+
+
+def print_table(rows, stream):
+    stream.write(" ".join(HEADERS.get(name, name).rjust(width) for name, width in COLUMNS) + "\n")
+    for row in rows:
+        stream.write(" ".join(str(row[name]).rjust(width) for name, width in COLUMNS) + "\n")
+    stream.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmark",
+                                     description="Measure lookup throughput against a local mock of the Custom Search API.")
+    parser.add_argument("-n", "--domains", type=int, default=500, help="domains looked up per run")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1, 4, DEFAULT_WORKERS, 16],
+                        help="worker counts to compare")
+    parser.add_argument("-k", "--keys", type=int, default=4, help="valid API keys")
+    parser.add_argument("--invalid-keys", type=int, default=0, help="extra keys the server rejects as not valid")
+    parser.add_argument("--latency", type=float, default=50, help="base server latency in ms")
+    parser.add_argument("--jitter", type=float, default=20, help="random extra latency in ms")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of requests that take --tail-latency")
+    parser.add_argument("--tail-latency", type=float, default=1000, help="latency of slow requests in ms")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with a per-minute 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s (0 omits the header)")
+    parser.add_argument("--daily-quota", type=int, help="queries each key may make before the server answers 'per day' 429s")
+    parser.add_argument("--qpm", type=int, default=6000, help="client-side queries per minute allowed per key")
+    parser.add_argument("-t", "--timeout", type=float, default=15, help="seconds to wait on each request")
+    parser.add_argument("--hedge", choices=["off", "on", "both"], default="off", help="run with hedged requests")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per run instead of a table")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    hedges = {"off": [False], "on": [True], "both": [False, True]}[args.hedge]
+    rows = []
+    for workers in args.workers:
+        for hedge in hedges:
+            row = run_scenario(args, workers, hedge)
+            rows.append(row)
+            if args.json:
+                print(json.dumps(row), flush=True)
+    if not args.json:
+        print_table(rows, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
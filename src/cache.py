@@ -0,0 +1,173 @@
+import os
+import csv
+import glob
+import gzip
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+CACHE_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'cache.sqlite3')
+DEFAULT_TTL_HOURS = 168
+DEFAULT_ZERO_TTL_HOURS = 6
+DEFAULT_ERROR_TTL_HOURS = 0.5
+DEFAULT_MAX_ENTRIES = 200000
+EVICT_EVERY = 500
+CSV_PATTERN = "GIndexChecker_*.csv*"
+
+
+def normalize_key(domain):
+    domain = domain.strip().lower()
+    for prefix in ("https://", "http://"):
+        if domain.startswith(prefix):
+            domain = domain[len(prefix):]
+    return domain.rstrip("/")
+
+
+class ResultCache:
+
+    def __init__(self, path=CACHE_FILE, ttl_hours=DEFAULT_TTL_HOURS, zero_ttl_hours=DEFAULT_ZERO_TTL_HOURS,
+                 error_ttl_hours=DEFAULT_ERROR_TTL_HOURS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.zero_ttl = zero_ttl_hours * 3600
+        self.error_ttl = error_ttl_hours * 3600
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " domain TEXT NOT NULL, cx TEXT NOT NULL, total INTEGER NOT NULL,"
+            " error INTEGER NOT NULL DEFAULT 0, checked_at REAL NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (domain, cx))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_checked_at ON results (checked_at)")
+        self.conn.commit()
+
+    @classmethod
+    def from_config(cls, config, path=CACHE_FILE):
+        return cls(
+            path=path,
+            ttl_hours=config.get('CACHE_TTL_HOURS', DEFAULT_TTL_HOURS),
+            zero_ttl_hours=config.get('CACHE_ZERO_TTL_HOURS', DEFAULT_ZERO_TTL_HOURS),
+            error_ttl_hours=config.get('CACHE_ERROR_TTL_HOURS', DEFAULT_ERROR_TTL_HOURS),
+            max_entries=config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+        )
+
+    def ttl_for(self, total, error):
+        if error:
+            return self.error_ttl
+        if total == 0:
+            return self.zero_ttl
+        return self.ttl
+
+    def get(self, domain, cx):
+        return self.get_many([domain], cx).get(domain)
+
+    def get_many(self, domains, cx):
+        return {domain: total for domain, (total, _, _) in self.get_entries(domains, cx).items()}
+
+    def get_entries(self, domains, cx):
+        """Unexpired entries as ``{domain: (total, checked_at, error)}``."""
+        now = time.time()
+        keys = {}
+        for domain in domains:
+            keys.setdefault(normalize_key(domain), []).append(domain)
+        found = {}
+        names = list(keys)
+        with self.lock:
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows = self.conn.execute(
+                    "SELECT domain, total, checked_at, error FROM results"
+                    " WHERE cx = ? AND expires_at > ? AND domain IN (%s)" % ",".join("?" * len(chunk)),
+                    [cx, now] + chunk,
+                ).fetchall()
+                for key, total, checked_at, error in rows:
+                    for domain in keys[key]:
+                        found[domain] = (total, checked_at, bool(error))
+            self.hits += len(found)
+            self.misses += len(domains) - len(found)
+        return found
+
+    def put(self, domain, cx, total, error=False, checked_at=None):
+        self.put_many([(domain, total, error)], cx, checked_at=checked_at)
+
+    def put_many(self, entries, cx, checked_at=None):
+        checked_at = checked_at if checked_at is not None else time.time()
+        rows = [(normalize_key(domain), cx, int(total), 1 if error else 0, checked_at,
+                 checked_at + self.ttl_for(total, error))
+                for domain, total, error in entries]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO results (domain, cx, total, error, checked_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (domain, cx) DO UPDATE SET total = excluded.total, error = excluded.error,"
+                " checked_at = excluded.checked_at, expires_at = excluded.expires_at"
+                " WHERE excluded.checked_at >= results.checked_at", rows)
+            self.conn.commit()
+            self._puts += len(rows)
+            if self._puts >= EVICT_EVERY:
+                self._puts = 0
+                self._evict()
+        return len(rows)
+
+    def _evict(self):
+        self.conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+        count = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM results WHERE rowid IN "
+                "(SELECT rowid FROM results ORDER BY checked_at LIMIT ?)", (count - self.max_entries,))
+        self.conn.commit()
+
+    def evict(self):
+        with self.lock:
+            self._evict()
+
+    def warm_from_csv(self, paths, cx):
+        loaded = 0
+        for path in paths:
+            checked_at = csv_timestamp(path)
+            entries = []
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rt", newline='', encoding='utf-8') as csv_file:
+                reader = csv.reader(csv_file)
+                next(reader, None)
+                for row in reader:
+                    if len(row) < 2 or not row[1].strip().isdigit():
+                        continue
+                    entries.append((row[0], int(row[1]), False))
+            # Skip rows that are already expired so they don't evict fresh entries.
+            entries = [entry for entry in entries
+                       if checked_at + self.ttl_for(entry[1], False) > time.time()]
+            if entries:
+                loaded += self.put_many(entries, cx, checked_at=checked_at)
+        return loaded
+
+    def warm_from_directory(self, directory, cx):
+        return self.warm_from_csv(sorted(glob.glob(os.path.join(directory, CSV_PATTERN))), cx)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM results")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def csv_timestamp(path):
+    name = os.path.basename(path)
+    name = name[:-3] if name.endswith(".gz") else name
+    name = os.path.splitext(name)[0]
+    try:
+        return datetime.strptime(name[len("GIndexChecker_"):], "%Y-%m-%d_%H-%M").timestamp()
+    except ValueError:
+        return os.path.getmtime(path)
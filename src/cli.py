@@ -0,0 +1,276 @@
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime
+from config import CONFIG_FILE, load_config, save_config
+from engine import LookupEngine, DEFAULT_DEADLINE, DEFAULT_WORKERS
+from transport import DEFAULT_TIMEOUT
+from key_pool import KeyPool
+from extractor import ExtractStats, extract_file, extract_stream
+from journal import Journal
+from rate_limit import RateLimiter
+from metrics import Metrics, MetricsExporter
+from tracelog import TraceLog
+from history import HistoryStore
+from planner import GROUP_MODES, GROUP_OFF, plan_from_config
+from quota_planner import ORDERS, ORDER_PRIORITY, Backlog, next_reset, plan_quota, priorities_from_config
+from exporters import FORMATS, CsvExporter, JsonlExporter, ExportError, open_exporter
+
+EXIT_OK = 0
+EXIT_CONFIG = 1
+EXIT_INVALID_CX = 2
+EXIT_QUOTA = 3
+EXIT_INTERRUPTED = 130
+RESET_MARGIN = 60
+# Seconds an interrupted run waits for requests in flight before closing its outputs.
+STOP_GRACE_SECONDS = 5
+
+
+def read_domains(sources, extract, processes=1):
+    if not extract:
+        domains = []
+        for source in sources or ["-"]:
+            file = sys.stdin if source == "-" else open(source, encoding="utf-8")
+            try:
+                domains.extend(line.strip() for line in file if line.strip())
+            finally:
+                if file is not sys.stdin:
+                    file.close()
+        return list(dict.fromkeys(domains))
+    seen = set()
+    domains = []
+    for source in sources or ["-"]:
+        if source == "-":
+            stats = ExtractStats()
+            domains.extend(extract_stream(sys.stdin.buffer, seen=seen, stats=stats))
+            stats.finish()
+        else:
+            found, stats = extract_file(source, processes=processes)
+            for domain in found:
+                if domain not in seen:
+                    seen.add(domain)
+                    domains.append(domain)
+        print(f"{source}: {stats}", file=sys.stderr)
+    return domains
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="gindexchecker", description="Check Google indexed URLs for a list of domains.")
+    parser.add_argument("inputs", nargs="*", help="files with domains, one per line ('-' or nothing reads stdin)")
+    parser.add_argument("-o", "--output", help="write results to this file instead of stdout")
+    parser.add_argument("-f", "--format", choices=FORMATS,
+                        help="output format (default: from the -o extension, else csv); a .gz output is gzip-compressed")
+    parser.add_argument("-w", "--workers", type=int, help="parallel lookups (default: WORKERS from config)")
+    parser.add_argument("-t", "--timeout", type=float, help="seconds to wait on each request (default: REQUEST_TIMEOUT from config)")
+    parser.add_argument("--deadline", type=float,
+                        help="seconds one lookup may spend including retries (default: LOOKUP_DEADLINE from config)")
+    parser.add_argument("--hedge", action="store_true", help="re-issue lookups slower than the p95 latency on another key")
+    parser.add_argument("-c", "--config", default=CONFIG_FILE, help="path to config.json")
+    parser.add_argument("--extract", action="store_true", help="extract domains from free text before checking")
+    parser.add_argument("--processes", type=int, default=1, help="processes used by --extract on large files")
+    parser.add_argument("--group", choices=GROUP_MODES,
+                        help="query each host or registrable domain once and copy the result to every matching line "
+                             "(default: QUERY_GROUPING from config, else off)")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the local result cache")
+    parser.add_argument("--journal", help="record completed lookups in this file so an interrupted run can be resumed")
+    parser.add_argument("--resume", action="store_true", help="resume the unfinished run recorded in --journal")
+    parser.add_argument("--metrics-file", help="keep a metrics snapshot in this file (.prom for Prometheus text, else JSON)")
+    parser.add_argument("--metrics-port", type=int, help="serve /metrics and /metrics.json on this local port")
+    parser.add_argument("--no-history", action="store_true", help="do not record this run in the history store")
+    parser.add_argument("--trace", help="append a JSONL record of every lookup to this file (see tracelog.py)")
+    parser.add_argument("--unprocessed", help="write domains that could not be checked to this file")
+    parser.add_argument("--backlog", action="store_true",
+                        help="check only what today's remaining quota covers and queue the rest in BACKLOG_FILE "
+                             "(default: QUOTA_PLANNER from config)")
+    parser.add_argument("--order", choices=ORDERS,
+                        help="order used by the backlog planner (default: QUOTA_ORDER from config, else priority)")
+    parser.add_argument("--priorities", help="CSV of domain,priority rows for --order priority (default: PRIORITY_FILE)")
+    parser.add_argument("--drain-backlog", action="store_true", help="also check the domains queued in the backlog")
+    parser.add_argument("--until-done", action="store_true",
+                        help="keep running across quota resets until the inputs and the backlog are all checked")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = load_config(args.config)
+    api_keys = [key.strip() for key in config.get('API_KEYS', []) if key.strip()]
+    cx = config.get('CX', '').strip()
+    if not api_keys or not cx:
+        print("config.json needs at least one API key and the CX key", file=sys.stderr)
+        return EXIT_CONFIG
+    if args.resume and not args.journal:
+        print("--resume needs --journal", file=sys.stderr)
+        return EXIT_CONFIG
+    journal = Journal(args.journal) if args.journal else None
+    resumed = journal.load() if args.resume else None
+    if args.resume and resumed is None:
+        print(f"no unfinished run in {args.journal}", file=sys.stderr)
+        return EXIT_CONFIG
+    if resumed and resumed["cx"] is not None and resumed["cx"] != cx:
+        print(f"the run in {args.journal} was started with a different CX; "
+              f"restore that CX to resume it, or run without --resume to start over", file=sys.stderr)
+        return EXIT_CONFIG
+    drain = args.drain_backlog or args.until_done
+    backlog = Backlog.from_config(config, enabled=args.backlog or drain)
+    if resumed:
+        domains = resumed["remaining"]
+    elif drain and not args.inputs:
+        domains = []
+    else:
+        domains = read_domains(args.inputs, args.extract, args.processes)
+    if drain and backlog is not None:
+        domains = list(dict.fromkeys(domains + backlog.pending()))
+    if not domains and not resumed:
+        print("no domains to check", file=sys.stderr)
+        return EXIT_CONFIG
+    order = args.order or config.get('QUOTA_ORDER', ORDER_PRIORITY)
+    if order not in ORDERS:
+        print(f"QUOTA_ORDER must be one of {', '.join(ORDERS)}", file=sys.stderr)
+        return EXIT_CONFIG
+    try:
+        plan = plan_from_config(domains, config, args.group)
+        priorities = priorities_from_config(config, args.priorities) if backlog is not None else None
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_CONFIG
+    if (args.group or config.get('QUERY_GROUPING', GROUP_OFF)) != GROUP_OFF:
+        print(f"{plan.inputs} inputs -> {len(plan.targets)} queries ({plan.saved} saved by grouping)", file=sys.stderr)
+
+    key_pool = KeyPool.from_config(api_keys, config)
+    cache = None
+    if not args.no_cache and config.get('CACHE_ENABLED', True):
+        from cache import ResultCache
+        cache = ResultCache.from_config(config)
+
+    def on_error(domain, status_code, text):
+        print(f"error checking {domain}: {status_code} {text.strip()}", file=sys.stderr)
+
+    try:
+        if args.output:
+            writer = open_exporter(args.output, args.format)
+        elif args.format == "parquet":
+            raise ExportError("parquet output needs -o FILE")
+        else:
+            writer = (JsonlExporter if args.format == "jsonl" else CsvExporter)(sys.stdout, flush_every=1)
+    except (ExportError, OSError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_CONFIG
+
+    metrics = Metrics()
+    if args.metrics_file or args.metrics_port is not None:
+        metrics_exporter = MetricsExporter(metrics, path=args.metrics_file, port=args.metrics_port)
+    else:
+        metrics_exporter = MetricsExporter.from_config(metrics, config)
+    if metrics_exporter is not None:
+        metrics_exporter.start()
+    tracer = TraceLog(args.trace) if args.trace else TraceLog.from_config(config)
+    history = None if args.no_history else HistoryStore.from_config(config)
+
+    engine = None
+    checked = []
+    queued = 0
+    # Held while a result is written, so an interrupt can't close the outputs under a worker.
+    delivering = threading.Lock()
+    interrupted = threading.Event()
+    try:
+        if resumed:
+            for domain, total in resumed["results"].items():
+                writer.write(domain, total)
+        while True:
+            if backlog is not None:
+                quota = plan_quota(plan, key_pool, cx, cache=cache, history=history, order=order,
+                                   priorities=priorities)
+                targets = quota.run
+                deferred = plan.lines_for(quota.deferred)
+                print(f"{quota.needed} queries needed, {quota.budget} left on the keys today; "
+                      f"{len(deferred)} domains wait for a later quota day", file=sys.stderr)
+            else:
+                targets, deferred = plan.targets, []
+            if journal is not None:
+                if resumed:
+                    journal.reopen()
+                    resumed = None
+                else:
+                    journal.start(plan.lines_for(targets), cx)
+            run_id = history.start_run(cx) if history is not None else None
+            engine = LookupEngine(key_pool, cx, workers=args.workers or config.get('WORKERS', DEFAULT_WORKERS),
+                                  on_error=on_error, cache=cache, rate_limiter=RateLimiter.from_config(config),
+                                  timeout=args.timeout or config.get('REQUEST_TIMEOUT', DEFAULT_TIMEOUT),
+                                  hedge=args.hedge or config.get('HEDGE', False), metrics=metrics,
+                                  tracer=tracer,
+                                  deadline=args.deadline or config.get('LOOKUP_DEADLINE', DEFAULT_DEADLINE))
+            checked = []
+
+            def on_result(target, total, fetched):
+                with delivering:
+                    if interrupted.is_set():
+                        return
+                    for domain, total in plan.expand(target, total):
+                        if journal is not None:
+                            journal.record(domain, total)
+                        writer.write(domain, total)
+                        if history is not None and fetched is not None:
+                            history.record(run_id, domain, total, fetched)
+                        checked.append(domain)
+
+            _, _, not_processed = engine.run(targets, on_result=on_result)
+            not_processed = plan.lines_for(not_processed)
+            if journal is not None and not engine.invalid_cx and not not_processed:
+                journal.finish()
+                journal = None
+            if history is not None:
+                history.finish_run(run_id)
+            if backlog is not None and not engine.invalid_cx:
+                queued = backlog.settle(checked, not_processed + deferred)
+                not_processed += deferred
+            if not (args.until_done and queued and not engine.invalid_cx):
+                break
+            config['KEY_STATE'] = key_pool.to_config()
+            save_config(config, args.config)
+            resume_at = next_reset() + RESET_MARGIN
+            print(f"{queued} domains queued; waiting for the quota reset at "
+                  f"{datetime.fromtimestamp(resume_at):%Y-%m-%d %H:%M}", file=sys.stderr)
+            time.sleep(max(0, resume_at - time.time()))
+            plan = plan_from_config(backlog.pending(), config, args.group)
+    except KeyboardInterrupt:
+        if engine is not None:
+            engine.stop()
+            # Let requests in flight finish and be written, but don't hang on one that doesn't return.
+            engine.join(STOP_GRACE_SECONDS)
+        with delivering:
+            interrupted.set()
+        if backlog is not None:
+            backlog.settle(checked, [])
+        return EXIT_INTERRUPTED
+    finally:
+        if journal is not None:
+            journal.close()
+        writer.close()
+        if metrics_exporter is not None:
+            metrics_exporter.stop()
+        if tracer is not None:
+            tracer.close()
+        if history is not None:
+            history.close()
+        config['KEY_STATE'] = key_pool.to_config()
+        save_config(config, args.config)
+
+    if engine.invalid_cx:
+        print("the CX key is invalid", file=sys.stderr)
+        return EXIT_INVALID_CX
+    if not_processed:
+        if backlog is not None:
+            print(f"{queued} domains are queued in {backlog.path}; run with --drain-backlog after the quota resets "
+                  f"at {datetime.fromtimestamp(next_reset()):%Y-%m-%d %H:%M}", file=sys.stderr)
+        else:
+            print(f"{len(not_processed)} domains could not be checked: API keys invalid or out of quota", file=sys.stderr)
+        if args.unprocessed:
+            with open(args.unprocessed, "w", encoding="utf-8") as file:
+                file.write("\n".join(not_processed) + "\n")
+        return EXIT_QUOTA
+    return EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+import os
+import json
+
+CONFIG_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'config.json')
+
+def load_config(path=CONFIG_FILE):
+    try:
+        with open(path, 'r') as file:
+            config = json.load(file)
+            return config
+    except FileNotFoundError:
+        return {'API_KEYS': [], 'CX': '', 'language': "en"}
+
+def save_config(config, path=CONFIG_FILE):
+    with open(path, 'w') as file:
+        json.dump(config, file)
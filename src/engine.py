@@ -0,0 +1,339 @@
+import time
+import threading
+from collections import deque
+from transport import SearchTransport, TransportError, DEFAULT_TIMEOUT, redact_key
+from key_pool import KeyPool
+from rate_limit import RateLimiter, THROTTLE_DAILY, backoff_delay, classify_throttle, parse_retry_after
+from tracelog import LookupTrace, OUTCOME_OK, OUTCOME_ERROR, OUTCOME_UNPROCESSED, OUTCOME_CANCELLED, OUTCOME_INVALID_CX
+
+DEFAULT_WORKERS = 8
+MAX_RETRIES = 6
+# Seconds one lookup may spend on requests and retry backoff before it is given up as not processed.
+DEFAULT_DEADLINE = 60
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+class LookupEngine:
+
+    def __init__(self, key_pool, cx, workers=DEFAULT_WORKERS, on_error=None, transport=None, cache=None,
+                 rate_limiter=None, max_retries=MAX_RETRIES, timeout=DEFAULT_TIMEOUT, hedge=False, metrics=None,
+                 tracer=None, inflight=None, deadline=DEFAULT_DEADLINE):
+        self.key_pool = key_pool if isinstance(key_pool, KeyPool) else KeyPool(key_pool)
+        self.cx = cx
+        self.workers = max(1, int(workers))
+        self.transport = transport if transport is not None else SearchTransport(pool_size=self.workers)
+        self.on_error = on_error
+        self.cache = cache
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hedge = hedge
+        self.metrics = metrics
+        self.tracer = tracer
+        self.inflight = inflight
+        self.hedge_executor = None
+        if hedge:
+            from concurrent.futures import ThreadPoolExecutor
+            self.hedge_executor = ThreadPoolExecutor(max_workers=self.workers * 2)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.coalesced = 0
+        self.invalid_cx = False
+        self.threads = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        """Waits up to ``timeout`` seconds for the run's workers to exit; True when none is left running.
+
+        After stop() a worker still finishes the request it has in flight, and may call on_result for it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self.threads)
+
+    @property
+    def cancelled(self):
+        return self.stop_event.is_set() and not self.invalid_cx
+
+    def hedge_after(self):
+        with self.lock:
+            if len(self.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * HEDGE_QUANTILE) - 1]
+
+    def timed_search(self, api_key, query, trace=None, hedge=False, timeout=None):
+        wall = time.time()
+        started = time.monotonic()
+        try:
+            response = self.transport.search(api_key, self.cx, query, timeout=timeout or self.timeout)
+        except TransportError as e:
+            if self.metrics is not None:
+                self.metrics.record_request(api_key, None, time.monotonic() - started)
+            if trace is not None:
+                trace.add_request(api_key, wall, wall + time.monotonic() - started, "error", message=str(e), hedge=hedge)
+            raise
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.latencies.append(elapsed)
+        if self.metrics is not None:
+            self.metrics.record_request(api_key, response.status_code, elapsed)
+        if trace is not None:
+            trace.add_response(api_key, wall, wall + elapsed, response, hedge=hedge)
+        return response
+
+    def send(self, api_key, query, trace=None, timeout=None):
+        delay = self.hedge_after() if self.hedge else None
+        if delay is None or (timeout is not None and delay >= timeout):
+            return self.timed_search(api_key, query, trace, timeout=timeout), api_key
+        from concurrent.futures import TimeoutError as FutureTimeout, wait, FIRST_COMPLETED
+        primary = self.hedge_executor.submit(self.timed_search, api_key, query, trace, False, timeout)
+        try:
+            return primary.result(timeout=delay), api_key
+        except FutureTimeout:
+            pass
+        # The primary is slower than the p95: race it against the same query on another ready key.
+        backup_key = self.key_pool.acquire(delay=self.rate_limiter.delay)
+        if not backup_key or backup_key == api_key or self.rate_limiter.delay(backup_key) > 0:
+            return primary.result(), api_key
+        self.rate_limiter.acquire(backup_key)
+        with self.lock:
+            self.hedges += 1
+        if self.metrics is not None:
+            self.metrics.record_hedge()
+        backup = self.hedge_executor.submit(self.timed_search, backup_key, query, trace, True,
+                                            None if timeout is None else timeout - delay)
+        keys = {primary: api_key, backup: backup_key}
+        pending = set(keys)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except TransportError as e:
+                    error = e
+                    continue
+                for loser in (done | pending) - {future}:
+                    loser.add_done_callback(lambda f, key=keys[loser]: self.settle_hedge(f, key))
+                if future is backup:
+                    with self.lock:
+                        self.hedge_wins += 1
+                return response, keys[future]
+        raise error
+
+    def settle_hedge(self, future, api_key):
+        # The losing request of a hedge still spends quota when it succeeds.
+        try:
+            if future.result().status_code == 200:
+                self.key_pool.record_use(api_key)
+        except TransportError:
+            pass
+
+    def report_error(self, domain, status_code, text):
+        if self.on_error:
+            self.on_error(domain, status_code, redact_key(text))
+
+    def shared_lookup(self, domain):
+        # With an in-flight registry, a domain another engine is already querying waits for that answer.
+        from cache import normalize_key
+
+        def leader():
+            if self.cache is not None:
+                # The leader may have started after another run cached the domain; don't pay for it twice.
+                total = self.cache.get(domain, self.cx)
+                if total is not None:
+                    return total, None, False
+            return self.lookup(domain)
+
+        outcome, shared = self.inflight.do((self.cx, normalize_key(domain)), leader)
+        if shared:
+            with self.lock:
+                self.coalesced += 1
+            if self.metrics is not None:
+                self.metrics.record_coalesced()
+            if outcome[0] is None and not self.stop_event.is_set():
+                # The leader was cancelled or ran out of keys; this run still wants an answer.
+                return self.lookup(domain)
+        return outcome
+
+    def lookup(self, domain):
+        if self.tracer is None:
+            return self.attempt_lookup(domain)
+        trace = LookupTrace(domain)
+        result, api_key, error = self.attempt_lookup(domain, trace)
+        if error:
+            outcome = OUTCOME_ERROR
+        elif result is not None:
+            outcome = OUTCOME_OK
+        elif self.invalid_cx:
+            outcome = OUTCOME_INVALID_CX
+        elif self.stop_event.is_set():
+            outcome = OUTCOME_CANCELLED
+        else:
+            outcome = OUTCOME_UNPROCESSED
+        self.tracer.record(trace.to_entry(outcome, result))
+        return result, api_key, error
+
+    def wait_for(self, trace, wait, *args):
+        started = time.monotonic()
+        outcome = wait(*args)
+        if trace is not None:
+            trace.add_wait(time.monotonic() - started)
+        return outcome
+
+    def attempt_lookup(self, domain, trace=None):
+        query = f"site:{domain}"
+        attempt = 0
+        deadline = None if self.deadline is None else time.monotonic() + self.deadline
+        while not self.stop_event.is_set():
+            api_key = self.key_pool.acquire(delay=self.rate_limiter.delay)
+            if not api_key:
+                return None, None, False
+            waited = time.monotonic()
+            if not self.wait_for(trace, self.rate_limiter.acquire, api_key, self.stop_event):
+                break
+            timeout = None
+            if deadline is not None:
+                # Waiting for a key's rate limit is pacing, not a slow lookup, so it moves the deadline.
+                deadline += time.monotonic() - waited
+                timeout = min(self.timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return None, None, False
+            try:
+                response, api_key = self.send(api_key, query, trace, timeout)
+            except TransportError:
+                attempt += 1
+                with self.lock:
+                    self.retries += 1
+                if self.metrics is not None:
+                    self.metrics.record_retry()
+                if attempt > self.max_retries:
+                    return None, None, False
+                delay = backoff_delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    return None, None, False
+                self.wait_for(trace, self.stop_event.wait, delay)
+                continue
+            if response.status_code == 200:
+                self.key_pool.record_use(api_key)
+                self.rate_limiter.on_success(api_key)
+                try:
+                    search_results = response.json()
+                    return int(search_results.get("searchInformation", {}).get("totalResults", "0")), api_key, False
+                except (ValueError, TypeError, AttributeError):
+                    # A 200 that isn't the expected JSON (a proxy's page, a truncated body) is this domain's error.
+                    self.report_error(domain, response.status_code, response.text)
+                    return 0, api_key, True
+            elif response.status_code == 429:
+                if classify_throttle(response) == THROTTLE_DAILY:
+                    self.key_pool.mark_exhausted(api_key)
+                    continue
+                attempt += 1
+                with self.lock:
+                    self.retries += 1
+                if self.metrics is not None:
+                    self.metrics.record_retry()
+                if attempt > self.max_retries:
+                    return None, None, False
+                self.rate_limiter.on_throttle(api_key, attempt, parse_retry_after(response.headers.get("Retry-After")))
+            elif response.status_code == 400:
+                try:
+                    error_info = response.json()["error"]["errors"][0]
+                    message = error_info.get("message", "").strip().lower()
+                except Exception:
+                    self.report_error(domain, response.status_code, response.text)
+                    return 0, api_key, True
+                if "request contains an invalid argument" in message:
+                    with self.lock:
+                        self.invalid_cx = True
+                    self.stop()
+                    return None, None, False
+                if "api key not valid" in message or "api key not found" in message:
+                    self.key_pool.mark_invalid(api_key)
+                    continue
+                if "quota exceeded" in message:
+                    self.key_pool.mark_exhausted(api_key)
+                    continue
+                self.report_error(domain, response.status_code, response.text)
+                return 0, api_key, True
+            else:
+                self.report_error(domain, response.status_code, response.text)
+                return 0, api_key, True
+        return None, None, False
+
+    def run(self, domains, on_result=None):
+        """Looks up every domain; returns ``(results, keys_used, not_processed)``.
+
+        ``on_result(domain, total, fetched)`` is called as each domain finishes. ``fetched`` is when the API
+        gave the count (for a cache hit, when the cached answer was fetched), or None for the 0 recorded for
+        a failed lookup.
+        """
+        results = {}
+        if self.cache is not None:
+            entries = self.cache.get_entries(domains, self.cx)
+            for domain, (result, fetched, error) in entries.items():
+                results[domain] = result
+                if on_result:
+                    on_result(domain, result, None if error else fetched)
+            domains = [domain for domain in domains if domain not in results]
+            if self.metrics is not None:
+                self.metrics.record_cache(len(results), len(domains))
+        pending = iter(list(enumerate(domains)))
+        keys_used = set()
+        not_processed = []
+
+        def worker():
+            while True:
+                with self.lock:
+                    item = next(pending, None)
+                if item is None:
+                    return
+                index, domain = item
+                try:
+                    if self.stop_event.is_set():
+                        result, api_key, error = None, None, False
+                    elif self.inflight is not None:
+                        # A leader's exception reaches every follower too; each lands here for its own domain.
+                        result, api_key, error = self.shared_lookup(domain)
+                    else:
+                        result, api_key, error = self.lookup(domain)
+                except Exception as e:
+                    # One bad lookup must not take the thread, and every domain queued behind it, down with it.
+                    self.report_error(domain, type(e).__name__, str(e))
+                    result, api_key, error = None, None, False
+                if result is not None and api_key is not None and self.cache is not None:
+                    self.cache.put(domain, self.cx, result, error=error)
+                with self.lock:
+                    if result is None:
+                        not_processed.append((index, domain))
+                        continue
+                    results[domain] = result
+                    if api_key is not None:
+                        keys_used.add(api_key)
+                if self.metrics is not None:
+                    self.metrics.record_result()
+                if on_result:
+                    on_result(domain, result, time.time() if api_key is not None and not error else None)
+
+        threads = [threading.Thread(target=worker, daemon=True)
+                   for _ in range(min(self.workers, max(1, len(domains))))]
+        for thread in threads:
+            thread.start()
+        self.threads = threads
+        for thread in threads:
+            thread.join()
+        if self.hedge_executor is not None:
+            self.hedge_executor.shutdown(wait=False)
+        not_processed.sort()
+        return results, keys_used, [domain for _, domain in not_processed]
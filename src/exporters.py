@@ -0,0 +1,188 @@
+import io
+import csv
+import gzip
+import json
+import queue
+import threading
+from tiers import tier_for, count_sort_key
+
+FORMATS = ("csv", "jsonl", "parquet")
+CSV_HEADER = ["Domain", "Total Results"]
+FLUSH_EVERY = 1000
+PARQUET_BATCH_ROWS = 50000
+STOP = object()
+
+
+class ExportError(Exception):
+    pass
+
+
+def format_from_path(path):
+    name = path.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    for fmt in FORMATS:
+        if name.endswith("." + fmt):
+            return fmt
+    if name.endswith(".json"):
+        return "jsonl"
+    return "csv"
+
+
+class StreamExporter:
+
+    def __init__(self, stream, flush_every=FLUSH_EVERY, format_total=None, close_stream=False):
+        self.stream = stream
+        self.flush_every = flush_every
+        self.format_total = format_total
+        self.close_stream = close_stream
+        self.lock = threading.Lock()
+        self.rows = 0
+
+    def value(self, total):
+        if self.format_total is not None and not isinstance(total, int):
+            return self.format_total(total)
+        return total
+
+    def write(self, domain, total):
+        self.write_many([(domain, total)])
+
+    def write_many(self, rows):
+        with self.lock:
+            for domain, total in rows:
+                self.encode(domain, self.value(total))
+                self.rows += 1
+                if self.flush_every and self.rows % self.flush_every == 0:
+                    self.stream.flush()
+
+    def close(self):
+        with self.lock:
+            self.stream.flush()
+            if self.close_stream:
+                self.stream.close()
+
+
+class CsvExporter(StreamExporter):
+
+    def __init__(self, stream, **options):
+        super().__init__(stream, **options)
+        self.writer = csv.writer(stream)
+        self.writer.writerow(CSV_HEADER)
+
+    def encode(self, domain, total):
+        self.writer.writerow([domain, total])
+
+
+class JsonlExporter(StreamExporter):
+
+    def encode(self, domain, total):
+        self.stream.write(json.dumps({"domain": domain, "total_results": total}) + "\n")
+
+
+class ParquetExporter:
+    # Rows are buffered up to one row group, so memory stays bounded however long the run is.
+
+    def __init__(self, path, batch_rows=PARQUET_BATCH_ROWS):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportError("Parquet export needs the optional pyarrow package (pip install pyarrow)")
+        self.pa = pa
+        self.schema = pa.schema([("domain", pa.string()), ("total_results", pa.int64()), ("tier", pa.string())])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+        self.batch_rows = batch_rows
+        self.lock = threading.Lock()
+        self.rows = 0
+        self.domains = []
+        self.totals = []
+        self.tiers = []
+
+    def write(self, domain, total):
+        self.write_many([(domain, total)])
+
+    def write_many(self, rows):
+        with self.lock:
+            for domain, total in rows:
+                self.domains.append(domain)
+                self.totals.append(total if isinstance(total, int) else None)
+                self.tiers.append(tier_for(total))
+                self.rows += 1
+                if len(self.domains) >= self.batch_rows:
+                    self._flush()
+
+    def _flush(self):
+        if not self.domains:
+            return
+        batch = self.pa.RecordBatch.from_arrays(
+            [self.pa.array(self.domains, self.pa.string()), self.pa.array(self.totals, self.pa.int64()),
+             self.pa.array(self.tiers, self.pa.string())], schema=self.schema)
+        self.writer.write_table(self.pa.Table.from_batches([batch]))
+        self.domains, self.totals, self.tiers = [], [], []
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.writer.close()
+
+
+def open_exporter(path, fmt=None, format_total=None):
+    fmt = fmt or format_from_path(path)
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown export format: {fmt}")
+    if fmt == "parquet":
+        return ParquetExporter(path)
+    if path.lower().endswith(".gz"):
+        # Flushing a gzip stream ends a deflate block, so compressed files are only flushed on close.
+        stream = io.TextIOWrapper(gzip.open(path, "wb"), encoding="utf-8", newline="")
+        flush_every = None
+    else:
+        stream = open(path, "w", newline="", encoding="utf-8")
+        flush_every = FLUSH_EVERY
+    exporter = CsvExporter if fmt == "csv" else JsonlExporter
+    return exporter(stream, flush_every=flush_every, format_total=format_total, close_stream=True)
+
+
+class BackgroundExport:
+    """Feeds an exporter from its own thread so callers (the Tk loop) never wait on disk or compression."""
+
+    def __init__(self, exporter, on_done=None):
+        self.exporter = exporter
+        self.on_done = on_done
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put_many(self, rows, sort=False):
+        if self.error is None:
+            self.queue.put(([rows], sort))
+
+    def put_chunks(self, chunks):
+        """Queues an iterable of row lists; it is consumed on the export thread, so a lazy snapshot is
+        read there too."""
+        if self.error is None:
+            self.queue.put((chunks, False))
+
+    def close(self):
+        self.queue.put(STOP)
+
+    def _run(self):
+        try:
+            while True:
+                item = self.queue.get()
+                if item is STOP:
+                    break
+                chunks, sort = item
+                for rows in chunks:
+                    if sort:
+                        rows = sorted(rows, key=lambda row: count_sort_key(row[1]), reverse=True)
+                    self.exporter.write_many(rows)
+        except Exception as e:
+            self.error = e
+        try:
+            self.exporter.close()
+        except Exception as e:
+            self.error = self.error or e
+        if self.on_done:
+            self.on_done(self.error, self.exporter.rows)
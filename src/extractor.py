@@ -0,0 +1,161 @@
+import io
+import os
+import codecs
+import re
+import time
+
+CHUNK_SIZE = 4 * 1024 * 1024
+MAX_CARRY = 64 * 1024
+DOMAIN_PATTERN = re.compile(r'(?<![\w.-])((?:[^\W_][\w-]*\.)+(?:xn--[\w-]+|[^\W\d_]{2,}))(?![\w-])(?:[/?#:]\S*)?')
+BOUNDARY_CHARS = " \n\r\t"
+
+
+class ExtractStats:
+
+    def __init__(self):
+        self.bytes = 0
+        self.matches = 0
+        self.unique = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def mb_per_s(self):
+        if not self.elapsed:
+            return 0.0
+        return self.bytes / (1024 * 1024) / self.elapsed
+
+    def __str__(self):
+        return (f"{self.unique} domains ({self.matches} matches) from {self.bytes / (1024 * 1024):.1f} MB "
+                f"in {self.elapsed:.2f}s ({self.mb_per_s:.1f} MB/s)")
+
+
+def normalize_domain(host):
+    host = host.lower().rstrip(".")
+    if host.startswith("www.") and "." in host[4:]:
+        host = host[4:]
+    if not host.isascii():
+        try:
+            host = host.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    if len(host) > 253 or any(len(label) > 63 for label in host.split(".")):
+        return None
+    return host
+
+
+def extract_text(text, seen=None, stats=None, raw_seen=None):
+    seen = seen if seen is not None else set()
+    raw_seen = raw_seen if raw_seen is not None else set()
+    found = []
+    matches = DOMAIN_PATTERN.findall(text)
+    if stats is not None:
+        stats.matches += len(matches)
+    for host in matches:
+        # Most repeats are byte-identical, so skip them before paying for normalization.
+        if host in raw_seen:
+            continue
+        raw_seen.add(host)
+        domain = normalize_domain(host)
+        if domain and domain not in seen:
+            seen.add(domain)
+            found.append(domain)
+    if stats is not None:
+        stats.unique += len(found)
+    return found
+
+
+def split_at_boundary(buffer):
+    # A domain never contains whitespace, so cutting after the last one keeps every token whole.
+    start = max(0, len(buffer) - MAX_CARRY)
+    index = max(buffer.rfind(char, start) for char in BOUNDARY_CHARS)
+    if index >= 0:
+        return buffer[:index + 1], buffer[index + 1:]
+    if len(buffer) < MAX_CARRY:
+        return "", buffer
+    return buffer, ""
+
+
+def extract_stream(stream, chunk_size=CHUNK_SIZE, seen=None, stats=None):
+    seen = seen if seen is not None else set()
+    raw_seen = set()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    carry = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if stats is not None:
+            stats.bytes += len(chunk)
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        ready, carry = split_at_boundary(carry + chunk)
+        for domain in extract_text(ready, seen, stats, raw_seen):
+            yield domain
+    if carry:
+        for domain in extract_text(carry, seen, stats, raw_seen):
+            yield domain
+
+
+def _extract_range(path, start, end):
+    with open(path, "rb") as file:
+        file.seek(start)
+        data = file.read(end - start)
+    stats = ExtractStats()
+    found = extract_text(data.decode("utf-8", errors="ignore"), stats=stats)
+    return stats.matches, found
+
+
+def _range_boundaries(path, parts):
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, "rb") as file:
+        for part in range(1, parts):
+            position = max(offsets[-1], size * part // parts)
+            file.seek(position)
+            # Move forward to the next whitespace byte; UTF-8 continuation bytes are never ASCII.
+            while True:
+                block = file.read(4096)
+                if not block:
+                    position = size
+                    break
+                index = max(block.find(char.encode()) for char in BOUNDARY_CHARS)
+                if index >= 0:
+                    position += index + 1
+                    break
+                position += len(block)
+            offsets.append(position)
+    offsets.append(size)
+    return [(offsets[i], offsets[i + 1]) for i in range(parts) if offsets[i] < offsets[i + 1]]
+
+
+def extract_file(path, processes=1, chunk_size=CHUNK_SIZE):
+    stats = ExtractStats()
+    if processes <= 1:
+        with open(path, "rb") as file:
+            domains = list(extract_stream(file, chunk_size=chunk_size, stats=stats))
+        return domains, stats.finish()
+    ranges = _range_boundaries(path, processes * 4)
+    seen = set()
+    domains = []
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_extract_range, path, start, end) for start, end in ranges]
+        for future in futures:
+            matches, part = future.result()
+            stats.matches += matches
+            for domain in part:
+                if domain not in seen:
+                    seen.add(domain)
+                    domains.append(domain)
+    stats.bytes = os.path.getsize(path)
+    stats.unique = len(domains)
+    return domains, stats.finish()
+
+
+def filtrar_dominios(entrada):
+    return "\n".join(extract_stream(io.StringIO(entrada)))
@@ -1,16 +1,31 @@
 import os
-import sys
 import tkinter as tk
 from tkinter import messagebox, ttk, Menu, filedialog
-import csv
-import requests
-import json
 import webbrowser
 from datetime import datetime
 import threading
+import queue
+import time
 import re
 from utils import resource_path, TRANSLATIONS, load_config, save_config, set_app_icon
 from spinner import Spinner
+from extractor import filtrar_dominios
+from results_view import ResultsView
+from tiers import QUOTA_EXCEEDED, TIER_COLORS
+from result_store import ResultStore
+from result_filter import ResultFilter
+from engine import LookupEngine, DEFAULT_DEADLINE, DEFAULT_WORKERS
+from transport import SearchTransport, DEFAULT_TIMEOUT
+from key_pool import KeyPool
+from journal import Journal
+from rate_limit import RateLimiter
+
+UI_TICK_MS = 100
+METRICS_REFRESH_MS = 1000
+BACKLOG_CHECK_MS = 5 * 60 * 1000
+MAX_UI_BATCH = 2000
+# Keystrokes in the search box closer together than this are applied as one filter.
+FILTER_DELAY_MS = 150
 
 class ToolTip:
     def __init__(self, widget, text='widget info', delay=1000):
@@ -59,12 +74,6 @@ class ToolTip:
         if tw:
             tw.destroy()
 
-def filtrar_dominios(entrada):
-    patron = re.compile(r'\b([a-zA-Z0-9-]+\.[a-zA-Z]{2,}(?:\/[^\s]*)?)\b')
-    dominios = patron.findall(entrada)
-    unique_domains = list(dict.fromkeys(dominios))
-    return "\n".join(unique_domains)
-
 class GIndexCheckerApp:
     def __init__(self, root):
         self.root = root
@@ -77,26 +86,99 @@ class GIndexCheckerApp:
         self.help_doc_win = None
         self.help_about_win = None
         self.help_donations_win = None
+        self.metrics_win = None
+        self.history_win = None
         self.child_windows = []
         self.load_configuration()
-        self.key_usage = {key: 0 for key in self.api_keys}
-        self.current_api_key_index = 0
-        self.full_results = {}
-        self.invalid_cx_flag = False
+        self.key_pool = KeyPool.from_config(self.api_keys, self.config)
+        self.rate_limiter = RateLimiter.from_config(self.config)
+        self.result_store = ResultStore.from_config(self.config)
+        self.result_filter = ResultFilter(self.result_store)
+        self.filter_job = None
+        self.metrics_job = None
+        self.result_queue = queue.Queue()
+        self.live_exports = []
+        self.search_running = False
+        self.engine = None
+        self.journal = Journal()
+        self.resuming = False
+        self.services = {}
+        self.services_lock = threading.RLock()
+        self.metrics_exporter = None
         self.create_widgets()
         self.create_menu()
+        self.root.after_idle(self.start_metrics_exporter)
+        self.root.after(200, self.check_pending_work)
+
+    def service(self, name, build):
+        # Services are built on first use so the window appears without opening the cache and history
+        # databases or importing the modules behind them.
+        with self.services_lock:
+            if name not in self.services:
+                self.services[name] = build()
+            return self.services[name]
+
+    @property
+    def transport(self):
+        return self.service('transport', lambda: SearchTransport(pool_size=self.workers))
+
+    @property
+    def key_verifier(self):
+        from verifier import KeyVerifier, DEFAULT_CACHE_MINUTES
+        return self.service('key_verifier', lambda: KeyVerifier(
+            self.transport, cache_minutes=self.config.get('VERIFY_CACHE_MINUTES', DEFAULT_CACHE_MINUTES)))
+
+    @property
+    def cache(self):
+        from cache import ResultCache
+        return self.service('cache', lambda: ResultCache.from_config(self.config)
+                            if self.config.get('CACHE_ENABLED', True) else None)
+
+    @property
+    def metrics(self):
+        from metrics import Metrics
+        return self.service('metrics', Metrics)
+
+    @property
+    def tracer(self):
+        from tracelog import TraceLog
+        return self.service('tracer', lambda: TraceLog.from_config(self.config))
+
+    @property
+    def history(self):
+        from history import HistoryStore
+        return self.service('history', lambda: HistoryStore.from_config(self.config))
+
+    @property
+    def backlog(self):
+        from quota_planner import Backlog
+        return self.service('backlog', lambda: Backlog.from_config(self.config))
+
+    def start_metrics_exporter(self):
+        from metrics import MetricsExporter
+        self.metrics_exporter = MetricsExporter.from_config(self.metrics, self.config)
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.start()
 
     def translate(self, key, **kwargs):
         return TRANSLATIONS[self.language].get(key, key).format(**kwargs)
 
     def load_configuration(self):
         config = load_config()
+        self.config = config
         self.api_keys = [key.strip() for key in config.get('API_KEYS', [])]
         self.cx = config.get('CX', '').strip()
         self.language = config.get('language', "es")
+        self.workers = config.get('WORKERS', DEFAULT_WORKERS)
+        self.request_timeout = config.get('REQUEST_TIMEOUT', DEFAULT_TIMEOUT)
+        self.lookup_deadline = config.get('LOOKUP_DEADLINE', DEFAULT_DEADLINE)
+        self.hedge = config.get('HEDGE', False)
 
     def save_configuration(self):
-        config = {'API_KEYS': self.api_keys, 'CX': self.cx, 'language': self.language}
+        config = dict(self.config)
+        config.update({'API_KEYS': self.api_keys, 'CX': self.cx, 'language': self.language, 'WORKERS': self.workers,
+                       'KEY_STATE': self.key_pool.to_config()})
+        self.config = config
         save_config(config)
 
     def validate_length(self, new_text):
@@ -158,28 +240,37 @@ class GIndexCheckerApp:
         self.search_button.place(x=500, y=90)
         ToolTip(self.search_button, lambda: self.translate("tooltip_search"), delay=1000)
 
-        self.spinner = Spinner(self.root, text=self.translate("analyzing_text"))
+        self.spinner = Spinner(self.root, length=480, text=self.translate("analyzing_text"))
 
         self.results_frame = tk.Frame(self.root, bg=bg_color)
         self.results_frame.place(x=10, y=220, width=500, height=350)
-        self.results_text = tk.Text(
-            self.results_frame, 
-            bg='#3c3f41', 
-            fg=fg_color,
-            insertbackground=fg_color, 
-            cursor="arrow",
-            wrap="word"
-        )
-        self.results_text.grid(row=0, column=0, sticky="nsew")
-        self.results_scroll = tk.Scrollbar(
+        self.summary_label = tk.Label(self.results_frame, bg=bg_color, fg=fg_color, anchor="w", justify=tk.LEFT)
+        self.summary_label.grid(row=0, column=0, sticky="ew")
+        self.filter_frame = tk.Frame(self.results_frame, bg=bg_color)
+        self.filter_frame.grid(row=1, column=0, sticky="ew", pady=(0, 4))
+        self.filter_label = tk.Label(self.filter_frame, text=self.translate("results_filter"), bg=bg_color, fg=fg_color)
+        self.filter_label.pack(side="left")
+        self.filter_var = tk.StringVar()
+        self.filter_entry = tk.Entry(self.filter_frame, textvariable=self.filter_var,
+                                     bg='#3c3f41', fg=fg_color, insertbackground=fg_color)
+        self.filter_entry.pack(side="left", fill="x", expand=True, padx=5)
+        self.filter_entry.bind("<Escape>", lambda e: self.filter_var.set(""))
+        self.filter_var.trace_add("write", self.schedule_filter)
+        ToolTip(self.filter_entry, lambda: self.translate("tooltip_results_filter"), delay=1000)
+        self.filter_count_label = tk.Label(self.filter_frame, bg=bg_color, fg=fg_color)
+        self.filter_count_label.pack(side="right")
+        self.results_view = ResultsView(
             self.results_frame,
-            orient="vertical",
-            command=self.results_text.yview,
-            width=16, bg="gray", activebackground="gray"
+            self.result_store,
+            row_filter=self.result_filter,
+            on_open=self.open_in_browser,
+            format_total=self.format_total,
+            headings=self.result_headings(),
+            bg='#3c3f41',
+            fg=fg_color
         )
-        self.results_scroll.grid(row=0, column=1, sticky="ns")
-        self.results_text.config(yscrollcommand=self.results_scroll.set)
-        self.results_frame.grid_rowconfigure(0, weight=1)
+        self.results_view.grid(row=2, column=0, sticky="nsew")
+        self.results_frame.grid_rowconfigure(2, weight=1)
         self.results_frame.grid_columnconfigure(0, weight=1)
 
         self.buttons_frame = tk.Frame(self.root, bg=bg_color)
@@ -237,6 +328,9 @@ class GIndexCheckerApp:
         self.settings_menu.add_command(label=self.translate("change_language"), command=self.change_language)
         self.settings_menu.add_command(label=self.translate("api_keys"), command=self.api_keys_window)
         self.settings_menu.add_command(label=self.translate("cx"), command=self.cx_window)
+        self.settings_menu.add_command(label=self.translate("import_cache"), command=self.import_cache)
+        self.settings_menu.add_command(label=self.translate("metrics"), command=self.metrics_window)
+        self.settings_menu.add_command(label=self.translate("compare_runs"), command=self.history_window)
         self.help_menu = Menu(menubar, tearoff=0, bg='#3c3f41', fg='white')
         menubar.add_cascade(label=self.translate("help_menu_label"), menu=self.help_menu)
         self.help_menu.add_command(label=self.translate("help_documentation"), command=self.show_help_documentation)
@@ -251,11 +345,11 @@ class GIndexCheckerApp:
         for win in self.child_windows:
             if hasattr(win, "update_ui_texts"):
                 win.update_ui_texts()
-        self.spinner.update_text(self.translate("analyzing_text"))
+        self.spinner.update_idle_text(self.translate("analyzing_text"))
 
     def update_ui_texts(self):
         self.query_label.config(text=self.translate("domain_input"))
-        self.search_button.config(text=self.translate("analyze_domains"))
+        self.search_button.config(text=self.translate("cancel_analysis" if self.search_running else "analyze_domains"))
         self.filtrar_button.config(text=self.translate("filter_domains"))
         self.copy_all_button.config(text=self.translate("copy_all"))
         self.copy_green_button.config(text=self.translate("green").capitalize())
@@ -263,8 +357,12 @@ class GIndexCheckerApp:
         self.copy_orange_button.config(text=self.translate("orange").capitalize())
         self.export_csv_button.config(text=self.translate("export_csv"))
         self.clear_results_button.config(text=self.translate("clear_results"))
+        self.filter_label.config(text=self.translate("results_filter"))
+        self.update_filter_count()
         if hasattr(self.query_text, 'context_menu'):
             self.add_context_menu(self.query_text)
+        self.results_view.set_headings(self.result_headings())
+        self.results_view.redraw()
 
     def filtrar_dominios_en_casilla(self):
         entrada = self.query_text.get("1.0", tk.END).strip()
@@ -298,8 +396,21 @@ class GIndexCheckerApp:
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.api_tree.yview)
         self.api_tree.configure(yscroll=scrollbar.set)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.api_tree.tag_configure("ok", foreground="green")
+        self.api_tree.tag_configure("fail", foreground="red")
+        self.api_tree.tag_configure("quota", foreground="orange")
         for key in self.api_keys:
-            self.api_tree.insert("", tk.END, values=(key, ""))
+            status = self.key_pool.status(key)
+            cached = self.key_verifier.cached(key)
+            if cached:
+                tag = {"ok": "ok", "quota": "quota"}.get(cached[0], "fail")
+                self.api_tree.insert("", tk.END, values=(key, cached[1]), tags=(tag,))
+            elif status == "invalid":
+                self.api_tree.insert("", tk.END, values=(key, "no valid"), tags=("fail",))
+            elif status == "exhausted":
+                self.api_tree.insert("", tk.END, values=(key, "quota exceeded"), tags=("quota",))
+            else:
+                self.api_tree.insert("", tk.END, values=(key, ""))
         self.api_paste_label = ttk.Label(self.api_keys_win, text=self.translate("paste_api_key_here"),
                                           background='#2d2d2d', foreground='white')
         self.api_paste_label.pack(padx=10, pady=(10,0))
@@ -360,8 +471,7 @@ class GIndexCheckerApp:
         key = self.api_keys_entry.get().strip()
         if key:
             self.api_keys.append(key)
-            if key not in self.key_usage:
-                self.key_usage[key] = 0
+            self.key_pool.add_key(key)
             self.api_tree.insert("", tk.END, values=(key, ""))
             self.api_keys_entry.delete(0, tk.END)
             self.save_configuration()
@@ -373,57 +483,44 @@ class GIndexCheckerApp:
                 key = self.api_tree.item(item, "values")[0]
                 self.api_keys = [k for k in self.api_keys if k != key]
                 self.api_tree.delete(item)
-                if key in self.key_usage:
-                    del self.key_usage[key]
+                self.key_pool.remove_key(key)
+                self.key_verifier.forget(key)
             self.save_configuration()
 
     def verify_api_keys(self):
-        dummy_cx = "invalid_cx_placeholder"
-        test_query = "test"
+        keys = [self.api_tree.item(item, "values")[0] for item in self.api_tree.get_children()]
         for item in self.api_tree.get_children():
-            key = self.api_tree.item(item, "values")[0]
-            params = {"key": key, "cx": dummy_cx, "q": test_query}
-            try:
-                response = requests.get("https://www.googleapis.com/customsearch/v1", params=params)
-                if response.status_code == 400:
-                    error_info = response.json()["error"]["errors"][0]
-                    message = error_info.get("message", "").strip().lower()
-                    if "request contains an invalid argument" in message:
-                        self.api_tree.set(item, "Status", "OK")
-                        self.api_tree.tag_configure("ok", foreground="green")
-                        self.api_tree.item(item, tags=("ok",))
-                    elif "api key not valid" in message or "api key not found" in message:
-                        self.api_tree.set(item, "Status", "no valid")
-                        self.api_tree.tag_configure("fail", foreground="red")
-                        self.api_tree.item(item, tags=("fail",))
-                    elif "quota exceeded" in message:
-                        self.api_tree.set(item, "Status", message)
-                        self.api_tree.tag_configure("quota", foreground="orange")
-                        self.api_tree.item(item, tags=("quota",))
-                    else:
-                        self.api_tree.set(item, "Status", message)
-                        self.api_tree.tag_configure("fail", foreground="red")
-                        self.api_tree.item(item, tags=("fail",))
-                else:
-                    try:
-                        error_info = response.json()["error"]["errors"][0]
-                        message = error_info.get("message", "").strip().lower()
-                        if "quota exceeded" in message:
-                            self.api_tree.set(item, "Status", message)
-                            self.api_tree.tag_configure("quota", foreground="orange")
-                            self.api_tree.item(item, tags=("quota",))
-                        else:
-                            self.api_tree.set(item, "Status", message)
-                            self.api_tree.tag_configure("fail", foreground="red")
-                            self.api_tree.item(item, tags=("fail",))
-                    except Exception:
-                        self.api_tree.set(item, "Status", "Falla")
-                        self.api_tree.tag_configure("fail", foreground="red")
-                        self.api_tree.item(item, tags=("fail",))
-            except Exception as e:
-                self.api_tree.set(item, "Status", "Falla")
-                self.api_tree.tag_configure("fail", foreground="red")
-                self.api_tree.item(item, tags=("fail",))
+            self.api_tree.set(item, "Status", "...")
+            self.api_tree.item(item, tags=())
+        self.verify_button.config(state="disabled")
+        # Asking to verify always probes again: a cached "invalid" or "quota" would keep a key that has
+        # since been fixed quarantined in the pool. The cache only fills the list when the window opens.
+        self.key_verifier.verify(
+            keys,
+            on_result=lambda key, status, message: self.root.after(0, lambda: self.show_key_status(key, status, message)),
+            on_done=lambda: self.root.after(0, self.finish_key_verification),
+            force=True
+        )
+
+    def show_key_status(self, key, status, message):
+        if status == "ok":
+            self.key_pool.mark_verified(key, True)
+        elif status == "invalid":
+            self.key_pool.mark_verified(key, False)
+        elif status == "quota":
+            self.key_pool.mark_exhausted(key)
+        if self.api_keys_win is None or not self.api_keys_win.winfo_exists():
+            return
+        tag = {"ok": "ok", "quota": "quota"}.get(status, "fail")
+        for item in self.api_tree.get_children():
+            if self.api_tree.item(item, "values")[0] == key:
+                self.api_tree.set(item, "Status", message)
+                self.api_tree.item(item, tags=(tag,))
+
+    def finish_key_verification(self):
+        self.save_configuration()
+        if self.api_keys_win is not None and self.api_keys_win.winfo_exists():
+            self.verify_button.config(state="normal")
 
     def cx_window(self):
         if self.cx_win is not None and self.cx_win.winfo_exists():
@@ -494,46 +591,8 @@ class GIndexCheckerApp:
         if self.cx_win is not None and self.cx_win.winfo_exists():
             self.on_child_close(self.cx_win, "cx_win")
 
-    def get_available_api_key(self):
-        if self.current_api_key_index < len(self.api_keys):
-            return self.api_keys[self.current_api_key_index]
-        return None
-
-    def get_indexed_urls(self, domain):
-        query = f"site:{domain}"
-        self.invalid_cx_flag = False
-        while True:
-            api_key = self.get_available_api_key()
-            if not api_key:
-                return None
-            params = {"key": api_key, "cx": self.cx, "q": query}
-            response = requests.get("https://www.googleapis.com/customsearch/v1", params=params)
-            if response.status_code == 200:
-                search_results = response.json()
-                total_results = search_results.get("searchInformation", {}).get("totalResults", "0")
-                self.key_usage[api_key] += 1
-                return int(total_results)
-            elif response.status_code == 429:
-                self.current_api_key_index += 1
-            elif response.status_code == 400:
-                try:
-                    error_info = response.json()["error"]["errors"][0]
-                    message = error_info.get("message", "").strip().lower()
-                    if "request contains an invalid argument" in message:
-                        self.invalid_cx_flag = True
-                        return None
-                    if "api key not valid" in message or "api key not found" in message or "quota exceeded" in message:
-                        self.current_api_key_index += 1
-                        continue
-                    else:
-                        self.root.after(0, lambda: messagebox.showerror("Error", f"Error al obtener resultados para {domain}: {response.status_code}\n{response.text}"))
-                        return 0
-                except Exception:
-                    self.root.after(0, lambda: messagebox.showerror("Error", f"Error al obtener resultados para {domain}: {response.status_code}\n{response.text}"))
-                    return 0
-            else:
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Error al obtener resultados para {domain}: {response.status_code}\n{response.text}"))
-                return 0
+    def show_lookup_error(self, domain, status_code, text):
+        self.root.after(0, lambda: messagebox.showerror("Error", f"Error al obtener resultados para {domain}: {status_code}\n{text}"))
 
     def validate_config(self):
         if not self.api_keys and not self.cx:
@@ -548,40 +607,210 @@ class GIndexCheckerApp:
         return True
 
     def search(self):
+        if self.search_running:
+            self.cancel_search()
+            return
         if not self.validate_config():
             return
+        if not self.key_pool.has_available():
+            messagebox.showwarning("Configuración Requerida", self.translate("api_limit_reached"))
+            return
         self.filtrar_dominios_en_casilla()
-        self.current_api_key_index = 0
-        self.invalid_cx_flag = False
-        self.spinner.start()
-        threading.Thread(target=self._search_process).start()
-
-    def _search_process(self):
         domains = self.query_text.get("1.0", tk.END).strip().split("\n")
         if not domains or domains == [""]:
-            self.root.after(0, lambda: messagebox.showwarning("Error de Entrada", self.translate("enter_domains")))
-            self.root.after(0, self.spinner.stop)
+            messagebox.showwarning("Error de Entrada", self.translate("enter_domains"))
+            return
+        self.search_running = True
+        self.run_total = 0
+        self.queries_saved = 0
+        self.run_done = 0
+        self.run_started = time.monotonic()
+        self.spinner.start()
+        self.search_button.config(text=self.translate("cancel_analysis"))
+        threading.Thread(target=self._search_process, args=(domains, self.resuming), daemon=True).start()
+        self.root.after(UI_TICK_MS, self.drain_results)
+
+    def _search_process(self, domains, resume=False):
+        from planner import GROUP_OFF, plan_from_config, plan_queries
+        from quota_planner import ORDERS, ORDER_PRIORITY, plan_quota, priorities_from_config
+        lines = [domain for domain in dict.fromkeys(d.strip() for d in domains) if domain]
+        known = self.result_store.contains_many(lines)
+        checked = [domain for domain in lines if domain in known]
+        pending = [domain for domain in lines if domain not in known]
+        try:
+            plan = plan_from_config(pending, self.config)
+        except (ValueError, OSError):
+            plan = plan_queries(pending, GROUP_OFF)
+        targets, deferred = plan.targets, []
+        if self.backlog is not None:
+            try:
+                priorities = priorities_from_config(self.config)
+            except (ValueError, OSError):
+                priorities = None
+            order = self.config.get('QUOTA_ORDER', ORDER_PRIORITY)
+            quota = plan_quota(plan, self.key_pool, self.cx, cache=self.cache, history=self.history,
+                               order=order if order in ORDERS else ORDER_PRIORITY, priorities=priorities)
+            targets, deferred = quota.run, plan.lines_for(quota.deferred)
+        if resume:
+            self.journal.reopen()
+        else:
+            self.journal.start(plan.lines_for(targets), self.cx)
+        self.result_queue.put(("start", len(pending) - len(deferred)))
+        if plan.saved:
+            self.result_queue.put(("plan", (plan.inputs, len(plan.targets), plan.saved)))
+        if self.backlog is not None:
+            self.result_queue.put(("quota", (quota.needed, quota.budget, len(deferred))))
+        engine = LookupEngine(self.key_pool, self.cx, workers=self.workers, on_error=self.show_lookup_error,
+                              transport=self.transport, cache=self.cache, rate_limiter=self.rate_limiter,
+                              timeout=self.request_timeout, hedge=self.hedge, metrics=self.metrics,
+                              tracer=self.tracer, deadline=self.lookup_deadline)
+        self.engine = engine
+        run_id = self.history.start_run(self.cx) if self.history is not None else None
+
+        def on_result(target, total, fetched):
+            for domain, total in plan.expand(target, total):
+                self.journal.record(domain, total)
+                if run_id is not None and fetched is not None:
+                    self.history.record(run_id, domain, total, fetched)
+                self.result_queue.put(("result", (domain, total)))
+                checked.append(domain)
+
+        _, keys_used, not_processed = engine.run(targets, on_result=on_result)
+        not_processed = plan.lines_for(not_processed)
+        if self.tracer is not None:
+            self.tracer.flush()
+        if run_id is not None:
+            self.history.finish_run(run_id)
+        queued = self.backlog is not None and not engine.invalid_cx
+        if engine.cancelled or not not_processed or queued:
+            self.journal.finish()
+        else:
+            self.journal.close()
+        if queued:
+            # A cancelled run hands its leftovers back to the input field instead of queueing them.
+            self.backlog.settle(checked, [] if engine.cancelled else not_processed + deferred)
+        not_processed += deferred
+        self.result_queue.put(("done", (keys_used, not_processed, engine.invalid_cx, engine.cancelled)))
+
+    def cancel_search(self):
+        if self.engine is not None:
+            self.engine.stop()
+            self.search_button.config(state="disabled")
+
+    def check_pending_work(self):
+        self.check_interrupted_job()
+        self.check_backlog()
+
+    def check_backlog(self):
+        self.root.after(BACKLOG_CHECK_MS, self.check_backlog)
+        if self.backlog is None or self.search_running or self.query_text.get("1.0", tk.END).strip():
+            return
+        if not self.api_keys or not self.cx or not self.backlog.due() or not self.key_pool.has_available():
+            return
+        domains = self.backlog.pending()
+        self.query_text.insert(tk.END, "\n".join(domains))
+        self.summary_label.config(text=self.translate("backlog_resumed", count=len(domains)))
+        self.search()
+
+    def check_interrupted_job(self):
+        job = self.journal.load()
+        if job is None:
+            return
+        if job["cx"] is not None and job["cx"] != self.cx:
+            # Counts come from the search engine the CX names; another engine's totals aren't comparable.
+            messagebox.showwarning(self.translate("resume_title"), self.translate("resume_cx_changed"))
+            self.journal.discard()
+            return
+        if not messagebox.askyesno(self.translate("resume_title"), self.translate(
+                "resume_prompt", done=len(job["results"]), total=len(job["domains"]))):
+            self.journal.discard()
+            return
+        self.result_store.update(job["results"])
+        self.process_results(set())
+        if not job["remaining"]:
+            self.journal.finish()
+            return
+        self.query_text.delete("1.0", tk.END)
+        self.query_text.insert(tk.END, "\n".join(job["remaining"]))
+        self.resuming = True
+        self.search()
+        self.resuming = False
+
+    def drain_results(self):
+        batch = []
+        finished = None
+        try:
+            while len(batch) < MAX_UI_BATCH:
+                kind, payload = self.result_queue.get_nowait()
+                if kind == "start":
+                    self.run_total = payload
+                elif kind == "plan":
+                    inputs, queries, self.queries_saved = payload
+                    self.summary_label.config(text=self.translate(
+                        "query_plan", inputs=inputs, queries=queries, saved=self.queries_saved))
+                elif kind == "quota":
+                    needed, budget, deferred = payload
+                    prefix = self.summary_label.cget("text") + "    " if self.queries_saved else ""
+                    self.summary_label.config(text=prefix + self.translate(
+                        "quota_plan", needed=needed, budget=budget, deferred=deferred))
+                elif kind == "result":
+                    batch.append(payload)
+                else:
+                    finished = payload
+                    break
+        except queue.Empty:
+            pass
+        if batch:
+            self.result_store.add_many(batch)
+            self.results_view.refresh()
+            self.update_filter_count()
+            for export in self.live_exports:
+                export.put_many(batch)
+            self.run_done += len(batch)
+        self.update_progress()
+        if finished is not None:
+            self.finish_search(*finished)
+        else:
+            self.root.after(UI_TICK_MS, self.drain_results)
+
+    def update_progress(self):
+        if not self.run_total:
             return
-        new_results = {}
-        keys_used = set()
-        not_processed = []
-        for domain in domains:
-            domain = domain.strip()
-            if domain:
-                if domain in self.full_results:
-                    continue
-                result = self.get_indexed_urls(domain)
-                if self.invalid_cx_flag:
-                    self.root.after(0, lambda: messagebox.showerror("Error", self.translate("invalid_cx_error")))
-                    self.root.after(0, self.spinner.stop)
-                    return
-                if result is None:
-                    not_processed.append(domain)
-                    continue
-                new_results[domain] = result
-                keys_used.add(self.api_keys[self.current_api_key_index])
-        self.full_results.update(new_results)
-        if not_processed:
+        elapsed = time.monotonic() - self.run_started
+        rate = self.run_done / elapsed if elapsed > 0 else 0.0
+        if rate > 0:
+            eta = int((self.run_total - self.run_done) / rate)
+            eta_text = f"{eta // 3600:d}:{eta % 3600 // 60:02d}:{eta % 60:02d}"
+        else:
+            eta_text = "--:--:--"
+        self.spinner.set_progress(self.run_done, self.run_total, self.translate(
+            "progress_text", done=self.run_done, total=self.run_total, rate=rate, eta=eta_text))
+
+    def finish_search(self, keys_used, not_processed, invalid_cx, cancelled):
+        self.search_running = False
+        for export in self.live_exports:
+            export.close()
+        self.live_exports = []
+        self.engine = None
+        self.search_button.config(text=self.translate("analyze_domains"), state="normal")
+        self.save_configuration()
+        self.spinner.stop()
+        if invalid_cx:
+            messagebox.showerror("Error", self.translate("invalid_cx_error"))
+            return
+        self.query_text.delete(1.0, tk.END)
+        queued = self.backlog is not None and not cancelled
+        if not_processed and not queued:
+            self.query_text.insert(tk.END, "\n".join(not_processed))
+        self.process_results(keys_used)
+        if cancelled:
+            messagebox.showinfo("Información", self.translate("analysis_cancelled", count=len(not_processed)))
+        elif not_processed and queued:
+            from quota_planner import next_reset
+            messagebox.showinfo("Información", self.translate(
+                "backlog_queued", count=len(not_processed),
+                time=datetime.fromtimestamp(next_reset()).strftime("%Y-%m-%d %H:%M")))
+        elif not_processed:
             count = len(not_processed)
             if self.language == "es":
                 message = (
@@ -594,76 +823,66 @@ class GIndexCheckerApp:
                     f"{count} domains could not be analyzed because the provided API keys are either invalid or have reached "
                     "their daily quota. Please verify and add valid API keys; the unprocessed domains will remain in the input field."
                 )
-            self.root.after(0, lambda: messagebox.showinfo("Información", message))
-        self.root.after(0, lambda: self.query_text.delete(1.0, tk.END))
-        if not_processed:
-            self.root.after(0, lambda: self.query_text.insert(tk.END, "\n".join(not_processed)))
-        self.root.after(0, lambda: self.results_text.delete(1.0, tk.END))
-        self.root.after(0, lambda: self.process_results(self.full_results, keys_used))
-        self.root.after(0, self.spinner.stop)
-
-    def process_results(self, results, keys_used):
-        sorted_results = sorted(results.items(), key=lambda item: (0 if isinstance(item[1], int) else 1, item[1]), reverse=True)
-        self.results_text.insert(tk.END, self.translate("api_keys_used", count=len(keys_used)) + "\n\n")
-        self.results_text.insert(tk.END, self.translate("domain_results") + "\n")
-        self.results_text.insert(tk.END, self.translate("divider") + "\n")
-        self.domain_colors = {"green": [], "yellow": [], "orange": []}
-        for domain, total in sorted_results:
-            if total == "quota_exceeded":
-                display_text = self.translate("cuota_api_superada")
-                color = "#FF8C00"
-                self.domain_colors["orange"].append(domain)
-            else:
-                if total > 10:
-                    color = "#00FF00"
-                    self.domain_colors["green"].append(domain)
-                elif total > 5:
-                    color = "yellow"
-                    self.domain_colors["yellow"].append(domain)
-                elif total > 0:
-                    color = "orange"
-                    self.domain_colors["orange"].append(domain)
-                else:
-                    color = "#FF5252"
-            tag_name = f"link_{domain.replace('.', '_')}"
-            self.results_text.insert(tk.END, domain, tag_name)
-            if isinstance(total, int):
-                self.results_text.insert(tk.END, f": {total} " + self.translate("urls_indexed") + "\n", "default")
-            else:
-                self.results_text.insert(tk.END, f": {display_text}\n", "default")
-            self.results_text.tag_configure(tag_name, foreground=color, underline=True)
-            self.results_text.tag_configure("default", foreground="white")
-            self.results_text.tag_bind(tag_name, "<Button-1>", lambda e, d=domain: self.open_in_browser(d))
-            self.results_text.tag_bind(tag_name, "<Enter>", lambda e: self.results_text.config(cursor="hand2"))
-            self.results_text.tag_bind(tag_name, "<Leave>", lambda e: self.results_text.config(cursor="arrow"))
-        self.results_text.update_idletasks()
+            messagebox.showinfo("Información", message)
+
+    def result_headings(self):
+        return {"domain": self.translate("column_domain"), "total": self.translate("column_total"),
+                "tier": self.translate("column_tier")}
+
+    def format_total(self, total):
+        if total == QUOTA_EXCEEDED:
+            return self.translate("cuota_api_superada")
+        return f"{total} " + self.translate("urls_indexed")
+
+    def process_results(self, keys_used):
+        transport = self.services.get('transport')
+        stats = transport.stats() if transport is not None else {"handshakes_saved": 0, "wire_bytes": 0,
+                                                                 "compression_saved": 0}
+        self.summary_label.config(text=self.translate("api_keys_used", count=len(keys_used)) + "    " +
+                                  self.translate("transport_stats", handshakes=stats["handshakes_saved"],
+                                                 kb=stats["wire_bytes"] // 1024,
+                                                 compressed_kb=stats["compression_saved"] // 1024))
+        if getattr(self, "queries_saved", 0):
+            self.summary_label.config(text=self.summary_label.cget("text") + "    " +
+                                      self.translate("queries_saved", saved=self.queries_saved))
+        self.results_view.refresh()
+        self.update_filter_count()
+
+    def schedule_filter(self, *args):
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_job = None
+        self.result_filter.set_text(self.filter_var.get())
+        self.results_view.refresh(reset=True)
+        self.update_filter_count()
+
+    def update_filter_count(self):
+        text = ""
+        if self.result_filter.active:
+            text = self.translate("results_filter_count", shown=len(self.results_view.rows),
+                                  total=len(self.result_store))
+        self.filter_count_label.config(text=text)
 
     def open_in_browser(self, domain):
         url = f"https://www.google.com/search?q=site:{domain}"
         webbrowser.open(url)
 
     def copy_domains(self, color):
-        if not hasattr(self, "domain_colors"):
-            messagebox.showinfo("Copiar Dominios", self.translate("no_domains_to_copy"))
-            return
         translated_color = self.translate(color)
-        if color in self.domain_colors:
-            domains = self.domain_colors[color]
-            if domains:
-                self.root.clipboard_clear()
-                self.root.clipboard_append("\n".join(domains))
-                self.root.update()
-                messagebox.showinfo("Copiar Dominios", self.translate("copy_color", color=translated_color))
-            else:
-                messagebox.showinfo("Copiar Dominios", self.translate("no_domains_to_copy"))
+        domains = self.result_store.domains_in_tiers([color], self.result_filter.mask())
+        if domains:
+            self.root.clipboard_clear()
+            self.root.clipboard_append("\n".join(domains))
+            self.root.update()
+            messagebox.showinfo("Copiar Dominios", self.translate("copy_color", color=translated_color))
         else:
             messagebox.showinfo("Copiar Dominios", self.translate("no_domains_to_copy"))
 
     def copy_all_domains(self):
-        if not hasattr(self, "domain_colors"):
-            messagebox.showinfo("Copiar Todos", self.translate("no_domains_to_copy"))
-            return
-        all_domains = self.domain_colors.get("green", []) + self.domain_colors.get("yellow", []) + self.domain_colors.get("orange", [])
+        all_domains = self.result_store.domains_in_tiers(["green", "yellow", "orange"], self.result_filter.mask())
         if all_domains:
             self.root.clipboard_clear()
             self.root.clipboard_append("\n".join(all_domains))
@@ -673,38 +892,176 @@ class GIndexCheckerApp:
             messagebox.showinfo("Copiar Todos", self.translate("no_domains_to_copy"))
 
     def export_csv(self):
-        if not self.full_results:
-            messagebox.showwarning("Export CSV", self.translate("enter_domains"))
+        if not len(self.result_store):
+            messagebox.showwarning(self.translate("export_csv"), self.translate("enter_domains"))
             return
         now = datetime.now()
         default_filename = f"GIndexChecker_{now.strftime('%Y-%m-%d_%H-%M')}.csv"
         file_path = filedialog.asksaveasfilename(
             initialfile=default_filename,
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("CSV files", "*.csv"), ("CSV files (gzip)", "*.csv.gz"), ("JSON Lines", "*.jsonl"),
+                       ("JSON Lines (gzip)", "*.jsonl.gz"), ("Parquet", "*.parquet"), ("All files", "*.*")]
         )
-        if file_path:
+        if not file_path:
+            return
+        from exporters import BackgroundExport, ExportError, open_exporter
+        try:
+            exporter = open_exporter(file_path, format_total=lambda total: self.translate("cuota_api_superada"))
+        except (ExportError, OSError) as e:
+            messagebox.showerror(self.translate("export_csv"), f"Error: {e}")
+            return
+        export = BackgroundExport(exporter, on_done=lambda error, rows: self.root.after(
+            0, self.finish_export, error, rows))
+        # Already in count order from the store's index, so the export thread has nothing to sort. Only the
+        # filter mask is built here; the rows are read on the export thread.
+        mask = self.result_filter.mask()
+        export.put_chunks(self.result_store.snapshot(mask=mask))
+        if self.search_running and mask is None:
+            # Keep appending results as they arrive; the file is closed when the analysis ends. A filtered
+            # export is a snapshot of the rows shown.
+            self.live_exports.append(export)
+        else:
+            export.close()
+
+    def finish_export(self, error, rows):
+        if error is not None:
+            messagebox.showerror(self.translate("export_csv"), f"Error: {error}")
+        else:
+            messagebox.showinfo(self.translate("export_csv"), self.translate("csv_export_success", count=rows))
+
+    def import_cache(self):
+        if self.cache is None:
+            return
+        file_paths = filedialog.askopenfilenames(
+            filetypes=[("GIndexChecker CSV", "GIndexChecker_*.csv*"), ("CSV files", "*.csv *.csv.gz"), ("All files", "*.*")]
+        )
+        if file_paths:
             try:
-                sorted_results = sorted(
-                    self.full_results.items(),
-                    key=lambda item: item[1] if isinstance(item[1], int) else 0,
-                    reverse=True
-                )
-                with open(file_path, mode='w', newline='', encoding='utf-8') as csv_file:
-                    writer = csv.writer(csv_file)
-                    writer.writerow(["Domain", "Total Results"])
-                    for domain, total in sorted_results:
-                        if total == "quota_exceeded":
-                            writer.writerow([domain, self.translate("cuota_api_superada")])
-                        else:
-                            writer.writerow([domain, total])
-                messagebox.showinfo("Export CSV", self.translate("csv_export_success"))
+                loaded = self.cache.warm_from_csv(file_paths, self.cx)
+                messagebox.showinfo(self.translate("import_cache"), self.translate("import_cache_success", count=loaded))
             except Exception as e:
-                messagebox.showerror("Export CSV", f"Error exporting CSV: {e}")
+                messagebox.showerror(self.translate("import_cache"), f"Error importing CSV: {e}")
+
+    def metrics_window(self):
+        if self.metrics_win is not None and self.metrics_win.winfo_exists():
+            self.metrics_win.lift()
+            return
+        self.metrics_win = tk.Toplevel(self.root)
+        self.child_windows.append(self.metrics_win)
+        self.metrics_win.title(self.translate("metrics"))
+        set_app_icon(self.metrics_win)
+        self.metrics_win.geometry("600x360")
+        self.metrics_win.resizable(False, False)
+        self.metrics_win.configure(bg='#2d2d2d')
+        text = tk.Text(self.metrics_win, wrap="none", bg='#2d2d2d', fg='white', bd=0, font=("Courier", 10))
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+
+        def refresh():
+            if self.metrics_win is None or not self.metrics_win.winfo_exists():
+                return
+            # A language change refreshes early; drop the scheduled refresh so only one timer chain runs.
+            if self.metrics_job is not None:
+                self.metrics_win.after_cancel(self.metrics_job)
+            text.config(state="normal")
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, self.format_metrics(self.metrics.snapshot()))
+            text.config(state="disabled")
+            self.metrics_job = self.metrics_win.after(METRICS_REFRESH_MS, refresh)
+
+        def update_ui():
+            self.metrics_win.title(self.translate("metrics"))
+            refresh()
+        refresh()
+        self.metrics_win.update_ui_texts = update_ui
+        self.metrics_win.protocol("WM_DELETE_WINDOW", lambda w=self.metrics_win: self.on_child_close(w, "metrics_win"))
+
+    def history_window(self):
+        from history import DEFAULT_DROP_PERCENT, write_diff_csv
+        if self.history is None:
+            return
+        if self.history_win is not None and self.history_win.winfo_exists():
+            self.history_win.lift()
+            return
+        self.history_win = tk.Toplevel(self.root)
+        self.child_windows.append(self.history_win)
+        self.history_win.title(self.translate("compare_runs"))
+        set_app_icon(self.history_win)
+        self.history_win.geometry("600x450")
+        self.history_win.resizable(False, False)
+        self.history_win.configure(bg='#2d2d2d')
+        percent = self.config.get('HISTORY_DROP_PERCENT', DEFAULT_DROP_PERCENT)
+        changes = self.history.diff(drop_percent=percent)
+        not_compared = self.history.not_compared()
+        counts = {}
+        for change in changes:
+            counts[change["change"]] = counts.get(change["change"], 0) + 1
+        summary = tk.Label(self.history_win, bg='#2d2d2d', fg='white', justify="left", wraplength=570)
+        summary.pack(padx=10, pady=(10, 0), anchor="w")
+        text = tk.Text(self.history_win, wrap="none", bg='#2d2d2d', fg='white', bd=0, font=("Courier", 10))
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        for tier, color in TIER_COLORS.items():
+            text.tag_configure(tier, foreground=color)
+        for change in changes:
+            text.insert(tk.END, f"{change['domain']:<40} {change['old']:>9} -> {change['new']:<9} "
+                                f"{self.translate('change_' + change['change'])}\n", change["new_tier"])
+        text.config(state="disabled")
+
+        def export():
+            file_path = filedialog.asksaveasfilename(
+                initialfile=f"GIndexChecker_changes_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.csv",
+                defaultextension=".csv", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+            if file_path:
+                with open(file_path, "w", newline="", encoding="utf-8") as file:
+                    write_diff_csv(changes, file)
+
+        export_button = tk.Button(self.history_win, command=export, bg='white', fg='black', width=15, cursor="hand2")
+        export_button.pack(pady=(0, 10))
+
+        def update_ui():
+            self.history_win.title(self.translate("compare_runs"))
+            export_button.config(text=self.translate("export_csv"))
+            if changes or len(self.history.latest_runs(2)) == 2:
+                summary.config(text=self.translate(
+                    "history_summary", percent=percent, deindexed=counts.get("deindexed", 0),
+                    dropped=counts.get("dropped", 0), indexed=counts.get("indexed", 0), gained=counts.get("gained", 0))
+                    + (" " + self.translate("history_not_compared", count=not_compared) if not_compared else ""))
+            else:
+                summary.config(text=self.translate("history_empty"))
+        update_ui()
+        self.history_win.update_ui_texts = update_ui
+        self.history_win.protocol("WM_DELETE_WINDOW", lambda w=self.history_win: self.on_child_close(w, "history_win"))
+
+    def format_metrics(self, snap):
+        def seconds(value):
+            if value is None:
+                return "-"
+            return "∞" if value == float("inf") else f"{value:g}s"
+
+        statuses = snap["statuses"]
+        latency = snap["latency"]
+        lines = [
+            self.translate("metrics_overview", requests=snap["requests"], rpm=snap["requests_per_min"],
+                           results=snap["results"], rate=snap["results_per_s"]),
+            self.translate("metrics_statuses", ok=statuses["200"], bad=statuses["400"], throttled=statuses["429"],
+                           other=statuses["other"], error=statuses["error"]),
+            self.translate("metrics_latency", p50=seconds(latency["p50"]), p95=seconds(latency["p95"]),
+                           p99=seconds(latency["p99"])),
+            self.translate("metrics_cache", hits=snap["cache"]["hits"], misses=snap["cache"]["misses"],
+                           retries=snap["retries"], hedges=snap["hedges"]),
+            "",
+            self.translate("metrics_keys"),
+        ]
+        for name, entry in sorted(snap["keys"].items(), key=lambda item: -item[1]["requests"]):
+            lines.append(f"{name:<18} {entry['requests']:>8} {entry['statuses']['200']:>5} "
+                         f"{entry['statuses']['429']:>5} {seconds(entry['latency']['p95']):>5}")
+        return "\n".join(lines)
 
     def clear_results(self):
-        self.results_text.delete(1.0, tk.END)
-        self.full_results = {}
+        self.result_store.clear()
+        self.results_view.refresh(reset=True)
+        self.update_filter_count()
+        self.summary_label.config(text="")
 
     def show_help_documentation(self):
         if self.help_doc_win is not None and self.help_doc_win.winfo_exists():
@@ -0,0 +1,58 @@
+"""Lookup API without the Tk interface.
+
+With ``src`` on ``sys.path``::
+
+    from gindexchecker_core import check_domains, load_config
+
+    for domain, total in check_domains(["example.com"], config=load_config()):
+        print(domain, total)
+
+Names are resolved on first access, so importing the package does not load
+``requests``, ``sqlite3`` or any module that is not used.
+"""
+import importlib
+
+_EXPORTS = {
+    "check_domains": "gindexchecker_core.lookups",
+    "check_domains_async": "gindexchecker_core.lookups",
+    "build_engine": "gindexchecker_core.lookups",
+    "load_config": "config",
+    "save_config": "config",
+    "LookupEngine": "engine",
+    "KeyPool": "key_pool",
+    "RateLimiter": "rate_limit",
+    "SearchTransport": "transport",
+    "TransportError": "transport",
+    "ResultCache": "cache",
+    "Journal": "journal",
+    "Metrics": "metrics",
+    "TraceLog": "tracelog",
+    "JobService": "service",
+    "InflightRegistry": "singleflight",
+    "WorkQueue": "work_queue",
+    "SQLiteWorkQueue": "work_queue",
+    "QueueWorker": "work_queue",
+    "open_queue": "work_queue",
+    "register_backend": "work_queue",
+    "open_exporter": "exporters",
+    "BackgroundExport": "exporters",
+    "extract_file": "extractor",
+    "extract_stream": "extractor",
+    "normalize_domain": "extractor",
+    "tier_for": "tiers",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,81 @@
+import queue
+import threading
+
+DONE = object()
+
+
+def build_engine(api_keys=None, cx=None, config=None, cache=False, **options):
+    from engine import LookupEngine, DEFAULT_DEADLINE, DEFAULT_WORKERS
+    from key_pool import KeyPool
+    from rate_limit import RateLimiter
+    from transport import DEFAULT_TIMEOUT
+    config = config or {}
+    if api_keys is None:
+        api_keys = [key.strip() for key in config.get('API_KEYS', []) if key.strip()]
+    if cx is None:
+        cx = config.get('CX', '').strip()
+    if not api_keys or not cx:
+        raise ValueError("at least one API key and the CX key are required")
+    if cache is True:
+        from cache import ResultCache
+        cache = ResultCache.from_config(config)
+    options.setdefault("workers", config.get('WORKERS', DEFAULT_WORKERS))
+    options.setdefault("timeout", config.get('REQUEST_TIMEOUT', DEFAULT_TIMEOUT))
+    options.setdefault("hedge", config.get('HEDGE', False))
+    options.setdefault("deadline", config.get('LOOKUP_DEADLINE', DEFAULT_DEADLINE))
+    options.setdefault("rate_limiter", RateLimiter.from_config(config))
+    return LookupEngine(KeyPool.from_config(api_keys, config), cx, cache=cache or None, **options)
+
+
+def run_engine(engine, domains, put):
+    # Domains that could not be checked (keys out of quota, invalid CX, cancelled) come last with a None total.
+    try:
+        _, _, not_processed = engine.run(domains, on_result=lambda domain, total, fetched: put((domain, total)))
+        for domain in not_processed:
+            put((domain, None))
+    except BaseException as e:
+        put((DONE, e))
+    else:
+        put((DONE, None))
+
+
+def check_domains(domains, engine=None, **options):
+    """Yield ``(domain, total)`` pairs as lookups finish; closing the iterator stops the run."""
+    engine = engine if engine is not None else build_engine(**options)
+    results = queue.Queue()
+    threading.Thread(target=run_engine, args=(engine, list(domains), results.put), daemon=True).start()
+    try:
+        while True:
+            item = results.get()
+            if item[0] is DONE:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        engine.stop()
+
+
+async def check_domains_async(domains, engine=None, **options):
+    """Async generator version of :func:`check_domains`; lookups run on a worker thread."""
+    import asyncio
+    engine = engine if engine is not None else build_engine(**options)
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue()
+
+    def put(item):
+        loop.call_soon_threadsafe(results.put_nowait, item)
+
+    running = loop.run_in_executor(None, run_engine, engine, list(domains), put)
+    try:
+        while True:
+            item = await results.get()
+            if item[0] is DONE:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        engine.stop()
+        # Wait for the worker thread so nothing is handed to the loop after the caller is done with it.
+        await running
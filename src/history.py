@@ -0,0 +1,249 @@
+import os
+import sys
+import csv
+import time
+import sqlite3
+import threading
+from cache import normalize_key
+from tiers import tier_for
+
+HISTORY_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'history.sqlite3')
+DEFAULT_DROP_PERCENT = 50
+FLUSH_EVERY = 500
+CHUNK = 500
+DEINDEXED = "deindexed"
+DROPPED = "dropped"
+INDEXED = "indexed"
+GAINED = "gained"
+# A cache hit replays an older answer: only a count the API gave after the old run's count is compared.
+NEWER = ("COALESCE(b.checked, (SELECT started FROM runs WHERE id = b.run_id))"
+         " > COALESCE(a.checked, (SELECT started FROM runs WHERE id = a.run_id))")
+DIFF_HEADER = ["Domain", "Old Total", "New Total", "Change %", "Change", "Old Tier", "New Tier"]
+
+
+class HistoryStore:
+    # Domains are interned to integer ids and observations live in a WITHOUT ROWID table keyed by
+    # (run, domain): a count costs ~20 bytes with its index, and a run diff is a merge of two key ranges.
+    # ``checked`` is when the API gave the count; a cache hit carries the time of the answer it replays.
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " id INTEGER PRIMARY KEY, cx TEXT, started REAL NOT NULL, finished REAL, domains INTEGER NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute("CREATE TABLE IF NOT EXISTS domains (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            " run_id INTEGER NOT NULL, domain_id INTEGER NOT NULL, total INTEGER NOT NULL, checked REAL,"
+            " PRIMARY KEY (run_id, domain_id)) WITHOUT ROWID"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(observations)")]
+        if "checked" not in columns:
+            self.conn.execute("ALTER TABLE observations ADD COLUMN checked REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS observations_domain ON observations (domain_id)")
+        self.conn.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get('HISTORY_ENABLED', True):
+            return None
+        return cls(config.get('HISTORY_FILE', HISTORY_FILE))
+
+    def start_run(self, cx=None):
+        with self.lock:
+            cursor = self.conn.execute("INSERT INTO runs (cx, started) VALUES (?, ?)", (cx, time.time()))
+            self.conn.commit()
+            self.pending[cursor.lastrowid] = []
+            return cursor.lastrowid
+
+    def record(self, run_id, domain, total, checked=None):
+        """Adds a count to the run; ``checked`` is when the API answered, earlier than now for a cache hit.
+
+        An error's 0 is not a count and must not be recorded, or diff() would report it as a change.
+        """
+        if not isinstance(total, int):
+            return
+        with self.lock:
+            rows = self.pending.setdefault(run_id, [])
+            rows.append((normalize_key(domain), total, checked if checked is not None else time.time()))
+            if len(rows) >= FLUSH_EVERY:
+                self._flush(run_id)
+
+    def finish_run(self, run_id):
+        with self.lock:
+            self._flush(run_id)
+            self.pending.pop(run_id, None)
+            self.conn.execute(
+                "UPDATE runs SET finished = ?,"
+                " domains = (SELECT COUNT(*) FROM observations WHERE run_id = ?) WHERE id = ?",
+                (time.time(), run_id, run_id))
+            self.conn.commit()
+
+    def _flush(self, run_id):
+        rows = self.pending.get(run_id)
+        if not rows:
+            return
+        self.pending[run_id] = []
+        ids = self._domain_ids([domain for domain, _, _ in rows])
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO observations (run_id, domain_id, total, checked) VALUES (?, ?, ?, ?)",
+            [(run_id, ids[domain], total, checked) for domain, total, checked in rows])
+        self.conn.commit()
+
+    def _domain_ids(self, names):
+        self.conn.executemany("INSERT OR IGNORE INTO domains (name) VALUES (?)", [(name,) for name in names])
+        ids = {}
+        for start in range(0, len(names), CHUNK):
+            chunk = names[start:start + CHUNK]
+            ids.update((name, domain_id) for domain_id, name in self.conn.execute(
+                "SELECT id, name FROM domains WHERE name IN (%s)" % ",".join("?" * len(chunk)), chunk))
+        return ids
+
+    def runs(self, limit=20):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, cx, started, finished, domains FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [{"id": run_id, "cx": cx, "started": started, "finished": finished, "domains": domains}
+                for run_id, cx, started, finished, domains in rows]
+
+    def trend(self, domain):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT DISTINCT COALESCE(o.checked, r.started), o.total FROM observations o"
+                " JOIN runs r ON r.id = o.run_id"
+                " WHERE o.domain_id = (SELECT id FROM domains WHERE name = ?) ORDER BY 1",
+                (normalize_key(domain),)).fetchall()
+
+    def last_checked(self, domains):
+        names = list(dict.fromkeys(normalize_key(domain) for domain in domains))
+        found = {}
+        with self.lock:
+            for start in range(0, len(names), CHUNK):
+                chunk = names[start:start + CHUNK]
+                found.update(self.conn.execute(
+                    "SELECT d.name, MAX(COALESCE(o.checked, r.started)) FROM domains d"
+                    " JOIN observations o ON o.domain_id = d.id JOIN runs r ON r.id = o.run_id"
+                    " WHERE d.name IN (%s) GROUP BY d.name" % ",".join("?" * len(chunk)), chunk))
+        return found
+
+    def latest_runs(self, count=2):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id FROM runs WHERE finished IS NOT NULL AND domains > 0 ORDER BY id DESC LIMIT ?",
+                (count,)).fetchall()
+        return [run_id for run_id, in reversed(rows)]
+
+    def diff(self, old_run=None, new_run=None, drop_percent=DEFAULT_DROP_PERCENT):
+        if old_run is None or new_run is None:
+            latest = self.latest_runs(2)
+            if len(latest) < 2:
+                return []
+            old_run, new_run = latest
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT d.name, a.total, b.total FROM observations a"
+                " JOIN observations b ON b.run_id = ? AND b.domain_id = a.domain_id"
+                " JOIN domains d ON d.id = a.domain_id"
+                " WHERE a.run_id = ? AND a.total != b.total AND %s" % NEWER, (new_run, old_run)).fetchall()
+        changes = []
+        for domain, old, new in rows:
+            kind = classify_change(old, new, drop_percent)
+            if kind is not None:
+                changes.append({"domain": domain, "old": old, "new": new, "change": kind,
+                                "percent": round(100.0 * (new - old) / old, 1) if old else None,
+                                "old_tier": tier_for(old), "new_tier": tier_for(new)})
+        order = {DEINDEXED: 0, DROPPED: 1, INDEXED: 2, GAINED: 3}
+        changes.sort(key=lambda change: (order[change["change"]], -(change["old"] - change["new"])))
+        return changes
+
+    def not_compared(self, old_run=None, new_run=None):
+        """Domains in both runs whose newer count is no newer than the old one, i.e. it came from the cache."""
+        if old_run is None or new_run is None:
+            latest = self.latest_runs(2)
+            if len(latest) < 2:
+                return 0
+            old_run, new_run = latest
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM observations a"
+                " JOIN observations b ON b.run_id = ? AND b.domain_id = a.domain_id"
+                " WHERE a.run_id = ? AND NOT %s" % NEWER, (new_run, old_run)).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            for run_id in list(self.pending):
+                self._flush(run_id)
+            self.conn.close()
+
+
+def classify_change(old, new, drop_percent=DEFAULT_DROP_PERCENT):
+    if old > 0 and new == 0:
+        return DEINDEXED
+    if old == 0 and new > 0:
+        return INDEXED
+    if new < old * (1 - drop_percent / 100.0):
+        return DROPPED
+    if new > old * (1 + drop_percent / 100.0):
+        return GAINED
+    return None
+
+
+def write_diff_csv(changes, stream):
+    writer = csv.writer(stream)
+    writer.writerow(DIFF_HEADER)
+    for change in changes:
+        writer.writerow([change["domain"], change["old"], change["new"],
+                         "" if change["percent"] is None else change["percent"], change["change"],
+                         change["old_tier"], change["new_tier"]])
+
+
+def main(argv=None):
+    import argparse
+    from datetime import datetime
+    from config import load_config
+    parser = argparse.ArgumentParser(prog="history", description="Query the history of indexed URL counts.")
+    parser.add_argument("--file", help="history database (default: HISTORY_FILE from config or history.sqlite3)")
+    commands = parser.add_subparsers(dest="command")
+    runs = commands.add_parser("runs", help="list recorded runs")
+    runs.add_argument("-n", "--limit", type=int, default=20)
+    trend = commands.add_parser("trend", help="show the counts recorded for a domain")
+    trend.add_argument("domain")
+    diff = commands.add_parser("diff", help="compare two runs (default: the last two)")
+    diff.add_argument("old", nargs="?", type=int)
+    diff.add_argument("new", nargs="?", type=int)
+    diff.add_argument("--drop", type=float, default=DEFAULT_DROP_PERCENT, help="report drops and gains above this percent")
+    diff.add_argument("-o", "--output", help="write the changes to this CSV file")
+    args = parser.parse_args(argv)
+    store = HistoryStore(args.file or load_config().get('HISTORY_FILE', HISTORY_FILE))
+    try:
+        if args.command == "trend":
+            for started, total in store.trend(args.domain):
+                print(f"{datetime.fromtimestamp(started):%Y-%m-%d %H:%M}  {total:>10}  {tier_for(total)}")
+        elif args.command == "diff":
+            changes = store.diff(args.old, args.new, args.drop)
+            skipped = store.not_compared(args.old, args.new)
+            if skipped:
+                print(f"{skipped} domains served from cache, not compared", file=sys.stderr)
+            if args.output:
+                with open(args.output, "w", newline="", encoding="utf-8") as file:
+                    write_diff_csv(changes, file)
+            else:
+                write_diff_csv(changes, sys.stdout)
+        else:
+            for run in store.runs(getattr(args, "limit", 20)):
+                state = "" if run["finished"] else "  (unfinished)"
+                print(f"{run['id']:>5}  {datetime.fromtimestamp(run['started']):%Y-%m-%d %H:%M}  "
+                      f"{run['domains']:>8} domains{state}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
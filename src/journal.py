@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import threading
+
+JOURNAL_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'journal.jsonl')
+FSYNC_EVERY = 50
+FSYNC_INTERVAL = 2.0
+
+
+class Journal:
+
+    def __init__(self, path=JOURNAL_FILE, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.file = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def start(self, domains, cx):
+        with self.lock:
+            self._close()
+            self.file = open(self.path, "w", encoding="utf-8")
+            self._write({"type": "job", "cx": cx, "started": time.time(), "domains": list(domains)})
+            self._sync()
+
+    def reopen(self):
+        with self.lock:
+            self._close()
+            self.file = open(self.path, "a", encoding="utf-8")
+            if self.file.tell() > 0:
+                with open(self.path, "rb") as existing:
+                    existing.seek(-1, os.SEEK_END)
+                    if existing.read(1) != b"\n":
+                        self.file.write("\n")
+
+    def record(self, domain, total):
+        with self.lock:
+            if self.file is None:
+                return
+            self._write({"type": "result", "domain": domain, "total": total})
+            self.unsynced += 1
+            if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+                self._sync()
+
+    def finish(self):
+        with self.lock:
+            self._close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def discard(self):
+        self.finish()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+        job = None
+        results = {}
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash can leave the last line half written.
+                    continue
+                if entry.get("type") == "job":
+                    job = entry
+                elif entry.get("type") == "result" and job is not None:
+                    results[entry["domain"]] = entry["total"]
+        if job is None:
+            return None
+        remaining = [domain for domain in job["domains"] if domain not in results]
+        return {"cx": job.get("cx"), "started": job.get("started"), "domains": job["domains"],
+                "results": results, "remaining": remaining}
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry) + "\n")
+
+    def _sync(self):
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _close(self):
+        if self.file is not None:
+            self._sync()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,150 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_DAILY_QUOTA = 100
+STATUS_OK = "ok"
+STATUS_EXHAUSTED = "exhausted"
+STATUS_INVALID = "invalid"
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+except Exception:
+    # Without tz data fall back to Pacific Standard Time; the reset is at most an hour off during DST.
+    QUOTA_TZ = timezone(timedelta(hours=-8))
+
+
+def quota_day(now=None):
+    now = now if now is not None else datetime.now(timezone.utc)
+    return now.astimezone(QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+class KeyPool:
+
+    def __init__(self, api_keys, state=None, daily_quota=DEFAULT_DAILY_QUOTA, quotas=None):
+        self.lock = threading.Lock()
+        self.daily_quota = daily_quota
+        self.quotas = dict(quotas or {})
+        self.state = {}
+        self.weights = {}
+        self.api_keys = []
+        state = state or {}
+        for key in api_keys:
+            self.add_key(key, state.get(key))
+
+    @classmethod
+    def from_config(cls, api_keys, config):
+        return cls(api_keys, state=config.get('KEY_STATE'),
+                   daily_quota=config.get('DAILY_QUOTA', DEFAULT_DAILY_QUOTA),
+                   quotas=config.get('KEY_QUOTAS'))
+
+    def add_key(self, key, entry=None):
+        with self.lock:
+            if key in self.state:
+                return
+            entry = dict(entry or {})
+            entry.setdefault("day", quota_day())
+            entry.setdefault("used", 0)
+            entry.setdefault("status", STATUS_OK)
+            self.api_keys.append(key)
+            self.state[key] = entry
+            self.weights[key] = 0
+
+    def remove_key(self, key):
+        with self.lock:
+            if key in self.state:
+                self.api_keys.remove(key)
+                del self.state[key]
+                del self.weights[key]
+
+    def limit(self, key):
+        return self.quotas.get(key, self.daily_quota)
+
+    def _roll_day(self):
+        today = quota_day()
+        for entry in self.state.values():
+            if entry["day"] != today:
+                entry["day"] = today
+                entry["used"] = 0
+                if entry["status"] == STATUS_EXHAUSTED:
+                    entry["status"] = STATUS_OK
+
+    def _live_keys(self):
+        return [key for key in self.api_keys if self.state[key]["status"] == STATUS_OK]
+
+    def remaining(self, key):
+        with self.lock:
+            self._roll_day()
+            entry = self.state[key]
+            if entry["status"] != STATUS_OK:
+                return 0
+            return max(0, self.limit(key) - entry["used"])
+
+    def total_remaining(self):
+        with self.lock:
+            self._roll_day()
+            return sum(max(0, self.limit(key) - self.state[key]["used"]) for key in self._live_keys())
+
+    def acquire(self, delay=None):
+        # Smooth weighted round-robin: keys with more budget left are picked proportionally more often.
+        # With a delay function, keys that can send right now win over throttled ones.
+        with self.lock:
+            self._roll_day()
+            live = self._live_keys()
+            if not live:
+                return None
+            if delay is not None:
+                waits = {key: delay(key) for key in live}
+                ready = [key for key in live if waits[key] <= 0]
+                if not ready:
+                    return min(live, key=waits.get)
+                live = ready
+            total = 0
+            best = None
+            for key in live:
+                weight = max(1, self.limit(key) - self.state[key]["used"])
+                self.weights[key] += weight
+                total += weight
+                if best is None or self.weights[key] > self.weights[best]:
+                    best = key
+            self.weights[best] -= total
+            return best
+
+    def has_available(self):
+        with self.lock:
+            self._roll_day()
+            return bool(self._live_keys())
+
+    def record_use(self, key):
+        with self.lock:
+            if key in self.state:
+                self.state[key]["used"] += 1
+
+    def mark_exhausted(self, key):
+        with self.lock:
+            if key in self.state and self.state[key]["status"] == STATUS_OK:
+                self.state[key]["status"] = STATUS_EXHAUSTED
+
+    def mark_invalid(self, key):
+        with self.lock:
+            if key in self.state:
+                self.state[key]["status"] = STATUS_INVALID
+
+    def mark_verified(self, key, valid=True):
+        with self.lock:
+            if key in self.state:
+                self.state[key]["status"] = STATUS_OK if valid else STATUS_INVALID
+
+    def status(self, key):
+        with self.lock:
+            self._roll_day()
+            return self.state[key]["status"] if key in self.state else None
+
+    def usage(self):
+        with self.lock:
+            self._roll_day()
+            return {key: self.state[key]["used"] for key in self.api_keys}
+
+    def to_config(self):
+        with self.lock:
+            return {key: dict(self.state[key]) for key in self.api_keys}
@@ -1,9 +1,13 @@
-import tkinter as tk
-from gindexchecker_app import GIndexCheckerApp
-from utils import resource_path, set_app_icon
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main())
+    import tkinter as tk
+    from gindexchecker_app import GIndexCheckerApp
+    from utils import set_app_icon
     root = tk.Tk()
     set_app_icon(root)
     app = GIndexCheckerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import threading
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STATUS_ERROR = "error"
+STATUS_CLASSES = ("200", "400", "429", "other", STATUS_ERROR)
+EXPORT_INTERVAL = 5.0
+PREFIX = "gindexchecker"
+
+
+def fingerprint(key):
+    # Metrics and logs identify keys by a short hash; the key itself never leaves config.json.
+    import hashlib
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:10]
+
+
+def status_class(status):
+    if status in (200, 400, 429):
+        return str(status)
+    if status is None:
+        return STATUS_ERROR
+    return "other"
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the quantile; precise enough to spot a slow tail.
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {"buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+                "count": self.count, "sum": round(self.sum, 6),
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+class Metrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.keys = {}
+            self.latency = Histogram()
+            self.statuses = dict.fromkeys(STATUS_CLASSES, 0)
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self.retries = 0
+            self.hedges = 0
+            self.coalesced = 0
+            self.results = 0
+
+    def _key(self, key):
+        name = fingerprint(key)
+        if name not in self.keys:
+            self.keys[name] = {"requests": 0, "statuses": dict.fromkeys(STATUS_CLASSES, 0), "latency": Histogram()}
+        return self.keys[name]
+
+    def record_request(self, key, status, latency):
+        label = status_class(status)
+        with self.lock:
+            entry = self._key(key)
+            entry["requests"] += 1
+            entry["statuses"][label] += 1
+            entry["latency"].observe(latency)
+            self.statuses[label] += 1
+            self.latency.observe(latency)
+
+    def record_cache(self, hits, misses):
+        with self.lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+
+    def record_hedge(self):
+        with self.lock:
+            self.hedges += 1
+
+    def record_coalesced(self):
+        with self.lock:
+            self.coalesced += 1
+
+    def record_result(self):
+        with self.lock:
+            self.results += 1
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = max(1e-9, time.time() - self.started)
+            requests_made = sum(self.statuses.values())
+            return {
+                "started": self.started,
+                "elapsed": round(elapsed, 3),
+                "requests": requests_made,
+                "results": self.results,
+                "results_per_s": round(self.results / elapsed, 3),
+                "requests_per_min": round(requests_made * 60 / elapsed, 2),
+                "statuses": dict(self.statuses),
+                "latency": self.latency.snapshot(),
+                "cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "coalesced": self.coalesced,
+                "keys": {name: {"requests": entry["requests"], "statuses": dict(entry["statuses"]),
+                                "latency": entry["latency"].snapshot()}
+                         for name, entry in self.keys.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{PREFIX}_{name}{{{label_text}}} {value}" if label_text else f"{PREFIX}_{name} {value}")
+
+        metric("requests_total", "counter", "API requests by key fingerprint and status.",
+               [((("key", name), ("status", status)), count)
+                for name, entry in sorted(snap["keys"].items()) for status, count in entry["statuses"].items()])
+        lines.append(f"# HELP {PREFIX}_request_duration_seconds API request latency by key fingerprint.")
+        lines.append(f"# TYPE {PREFIX}_request_duration_seconds histogram")
+        for name, entry in sorted(snap["keys"].items()):
+            cumulative = 0
+            for bound, count in entry["latency"]["buckets"].items():
+                cumulative += count
+                lines.append(f'{PREFIX}_request_duration_seconds_bucket{{key="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_request_duration_seconds_sum{{key="{name}"}} {entry["latency"]["sum"]}')
+            lines.append(f'{PREFIX}_request_duration_seconds_count{{key="{name}"}} {entry["latency"]["count"]}')
+        metric("cache_hits_total", "counter", "Domains answered from the local cache.", [((), snap["cache"]["hits"])])
+        metric("cache_misses_total", "counter", "Domains that needed an API lookup.", [((), snap["cache"]["misses"])])
+        metric("retries_total", "counter", "Lookups retried after a throttle or network error.", [((), snap["retries"])])
+        metric("hedges_total", "counter", "Hedged duplicate requests sent.", [((), snap["hedges"])])
+        metric("coalesced_total", "counter", "Lookups answered by a concurrent query for the same domain.",
+               [((), snap["coalesced"])])
+        metric("results_total", "counter", "Domains with a result.", [((), snap["results"])])
+        metric("start_time_seconds", "gauge", "Unix time the counters were last reset.", [((), snap["started"])])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        temp = path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temp, path)
+
+
+class MetricsExporter:
+
+    def __init__(self, metrics, path=None, port=None, interval=EXPORT_INTERVAL, host="127.0.0.1"):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.server = None
+        if port is not None:
+            from http.server import ThreadingHTTPServer
+            self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.threads = []
+
+    @classmethod
+    def from_config(cls, metrics, config):
+        path = config.get('METRICS_FILE')
+        port = config.get('METRICS_PORT')
+        if not path and port is None:
+            return None
+        return cls(metrics, path=path, port=port)
+
+    def handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path.split("?")[0] == "/metrics":
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path.split("?")[0] == "/metrics.json":
+                    body, content_type = metrics.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        if self.server is not None:
+            self.server.daemon_threads = True
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+        if self.path:
+            self.threads.append(threading.Thread(target=self._write_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def _write_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        if self.path:
+            try:
+                self.metrics.write(self.path)
+            except OSError:
+                pass
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.flush()
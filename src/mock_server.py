@@ -0,0 +1,122 @@
+import gzip
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SEARCH_PATH = "/customsearch/v1"
+
+
+def error_body(code, message, reason, status):
+    return {"error": {"code": code, "message": message, "status": status,
+                      "errors": [{"message": message, "domain": "global", "reason": reason}]}}
+
+
+INVALID_KEY = error_body(400, "API key not valid. Please pass a valid API key.", "badRequest", "INVALID_ARGUMENT")
+INVALID_CX = error_body(400, "Request contains an invalid argument.", "badRequest", "INVALID_ARGUMENT")
+PER_MINUTE = error_body(429, "Quota exceeded for quota metric 'Queries' and limit 'Queries per minute per user' "
+                             "of service 'customsearch.googleapis.com'.", "rateLimitExceeded", "RESOURCE_EXHAUSTED")
+PER_DAY = error_body(429, "Quota exceeded for quota metric 'Queries' and limit 'Queries per day' "
+                          "of service 'customsearch.googleapis.com'.", "rateLimitExceeded", "RESOURCE_EXHAUSTED")
+
+
+class MockSearchServer:
+
+    def __init__(self, latency=0.05, jitter=0.02, tail_rate=0.0, tail_latency=1.0, throttle_rate=0.0,
+                 retry_after=1, daily_quota=None, invalid_keys=(), cx="mock-cx", host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.daily_quota = daily_quota
+        self.invalid_keys = set(invalid_keys)
+        self.cx = cx
+        self.lock = threading.Lock()
+        self.used = {}
+        self.statuses = {}
+        self.requests = 0
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{SEARCH_PATH}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, params):
+        key = params.get("key", "")
+        delay = self.latency + random.uniform(0, self.jitter)
+        if self.tail_rate and random.random() < self.tail_rate:
+            delay = self.tail_latency
+        time.sleep(delay)
+        if key in self.invalid_keys:
+            return 400, INVALID_KEY, {}
+        if params.get("cx") != self.cx:
+            return 400, INVALID_CX, {}
+        with self.lock:
+            if self.daily_quota is not None and self.used.get(key, 0) >= self.daily_quota:
+                return 429, PER_DAY, {}
+            if self.throttle_rate and random.random() < self.throttle_rate:
+                return 429, PER_MINUTE, {"Retry-After": str(self.retry_after)} if self.retry_after else {}
+            self.used[key] = self.used.get(key, 0) + 1
+        total = sum(map(ord, params.get("q", ""))) % 500
+        body = {"searchInformation": {"totalResults": str(total)}}
+        if not params.get("fields"):
+            body["items"] = [{"title": "Result", "link": "https://example.com/", "snippet": "x" * 200}] * 10
+        return 200, body, {}
+
+    def handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in two writes; with Nagle on, the body waits for the client's delayed
+            # ACK and every response gains ~40 ms that no real server would add.
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                if url.path != SEARCH_PATH:
+                    status, body, headers = 404, error_body(404, "Not Found", "notFound", "NOT_FOUND"), {}
+                else:
+                    status, body, headers = mock.respond(params)
+                with mock.lock:
+                    mock.requests += 1
+                    mock.statuses[status] = mock.statuses.get(status, 0) + 1
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    payload = gzip.compress(payload)
+                    self.send_header("Content-Encoding", "gzip")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
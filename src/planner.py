@@ -0,0 +1,74 @@
+from extractor import normalize_domain
+
+GROUP_OFF = "off"
+GROUP_HOST = "host"
+GROUP_REGISTRABLE = "registrable"
+GROUP_MODES = (GROUP_OFF, GROUP_HOST, GROUP_REGISTRABLE)
+
+
+def host_of(line):
+    host = line.strip()
+    if "://" in host:
+        host = host.split("://", 1)[1]
+    for separator in "/?#":
+        host = host.split(separator, 1)[0]
+    host = host.rsplit("@", 1)[-1].split(":", 1)[0]
+    return normalize_domain(host) if host else None
+
+
+class QueryPlan:
+    """Maps each query target to the input lines it answers, in first-seen order."""
+
+    def __init__(self, groups):
+        self.groups = groups
+
+    @property
+    def targets(self):
+        return list(self.groups)
+
+    @property
+    def inputs(self):
+        return sum(len(lines) for lines in self.groups.values())
+
+    @property
+    def saved(self):
+        return self.inputs - len(self.groups)
+
+    def expand(self, target, total):
+        return [(line, total) for line in self.groups.get(target, [target])]
+
+    def lines_for(self, targets):
+        lines = []
+        for target in targets:
+            lines.extend(self.groups.get(target, [target]))
+        return lines
+
+
+def plan_queries(lines, mode=GROUP_REGISTRABLE, rules=None):
+    groups = {}
+    for line in lines:
+        target = line
+        if mode != GROUP_OFF:
+            host = host_of(line)
+            if host:
+                target = host
+                if mode == GROUP_REGISTRABLE:
+                    if rules is None:
+                        from public_suffix import default_rules
+                        rules = default_rules()
+                    target = rules.registrable_domain(host)
+        members = groups.setdefault(target, [])
+        if line not in members:
+            members.append(line)
+    return QueryPlan(groups)
+
+
+def plan_from_config(lines, config, mode=None):
+    mode = mode or config.get('QUERY_GROUPING', GROUP_OFF)
+    if mode not in GROUP_MODES:
+        raise ValueError(f"QUERY_GROUPING must be one of {', '.join(GROUP_MODES)}")
+    rules = None
+    if mode == GROUP_REGISTRABLE:
+        from public_suffix import load_rules
+        rules = load_rules(config)
+    return plan_queries(lines, mode, rules)
@@ -0,0 +1,112 @@
+import threading
+
+# A subset of the Public Suffix List (https://publicsuffix.org/list/, MPL 2.0): the multi-label suffixes
+# most often seen in SEO work plus popular hosting platforms whose subdomains belong to different owners.
+# Single-label TLDs need no entry. Set PUBLIC_SUFFIX_FILE to a full public_suffix_list.dat to use the
+# complete list instead.
+BUNDLED_RULES = """
+ac.uk co.uk gov.uk ltd.uk me.uk net.uk nhs.uk org.uk plc.uk police.uk sch.uk
+asn.au com.au edu.au gov.au id.au net.au org.au
+ac.nz co.nz geek.nz gen.nz govt.nz net.nz org.nz school.nz
+ac.jp ad.jp co.jp ed.jp go.jp gr.jp lg.jp ne.jp or.jp
+art.br blog.br com.br edu.br eng.br gov.br net.br org.br
+com.ar edu.ar gob.ar int.ar net.ar org.ar
+com.mx edu.mx gob.mx net.mx org.mx
+com.es edu.es gob.es nom.es org.es
+com.co edu.co gov.co net.co nom.co org.co
+com.pe edu.pe gob.pe net.pe nom.pe org.pe
+co.ve com.ve gob.ve net.ve org.ve web.ve
+com.ec edu.ec gob.ec net.ec org.ec
+com.uy edu.uy gub.uy net.uy org.uy
+com.py edu.py gov.py net.py org.py
+com.bo edu.bo gob.bo net.bo org.bo
+gob.cl gov.cl
+com.pt edu.pt gov.pt org.pt
+asso.fr com.fr gouv.fr nom.fr
+com.pl edu.pl gov.pl info.pl net.pl org.pl waw.pl
+com.tr edu.tr gen.tr gov.tr net.tr org.tr biz.tr
+com.ru msk.ru net.ru org.ru spb.ru
+com.ua in.ua kiev.ua net.ua org.ua
+ac.in co.in edu.in firm.in gen.in gov.in ind.in net.in org.in res.in
+ac.za co.za gov.za net.za org.za web.za
+com.cn edu.cn gov.cn net.cn org.cn
+com.hk edu.hk gov.hk net.hk org.hk
+com.sg edu.sg gov.sg net.sg org.sg
+com.tw edu.tw gov.tw idv.tw net.tw org.tw
+ac.kr co.kr go.kr ne.kr or.kr re.kr
+com.my edu.my gov.my net.my org.my
+ac.id biz.id co.id go.id my.id net.id or.id web.id
+com.ph edu.ph gov.ph net.ph org.ph
+ac.th co.th go.th in.th net.th or.th
+com.vn edu.vn gov.vn net.vn org.vn
+ac.il co.il gov.il net.il org.il
+com.eg edu.eg gov.eg org.eg
+com.ng edu.ng gov.ng net.ng org.ng
+ac.ke co.ke go.ke ne.ke or.ke
+com.pk edu.pk gov.pk net.pk org.pk
+com.sa edu.sa gov.sa net.sa org.sa
+ac.ae co.ae gov.ae net.ae org.ae
+*.bd *.ck !www.ck *.er *.fk *.jm *.kh *.mm *.np *.pg
+appspot.com azurewebsites.net blogspot.com cloudfront.net firebaseapp.com github.io gitlab.io
+herokuapp.com myshopify.com netlify.app pages.dev s3.amazonaws.com substack.com tumblr.com
+vercel.app web.app weebly.com wixsite.com wordpress.com
+"""
+
+
+class SuffixRules:
+
+    def __init__(self, lines):
+        self.rules = set()
+        self.exceptions = set()
+        for line in lines:
+            for rule in line.split():
+                if rule.startswith("//"):
+                    break
+                rule = rule.lower()
+                try:
+                    rule = rule.encode("idna").decode("ascii") if not rule.isascii() else rule
+                except UnicodeError:
+                    continue
+                if rule.startswith("!"):
+                    self.exceptions.add(rule[1:])
+                else:
+                    self.rules.add(rule)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as file:
+            return cls(file)
+
+    def suffix_length(self, labels):
+        # Labels from the left are dropped until a rule matches, so the longest matching suffix wins.
+        for start in range(len(labels)):
+            candidate = ".".join(labels[start:])
+            if candidate in self.exceptions:
+                return len(labels) - start - 1
+            if candidate in self.rules or "*." + ".".join(labels[start + 1:]) in self.rules:
+                return len(labels) - start
+        return 1
+
+    def registrable_domain(self, host):
+        labels = host.split(".")
+        size = self.suffix_length(labels)
+        if size >= len(labels):
+            return host
+        return ".".join(labels[-(size + 1):])
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_rules():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SuffixRules(BUNDLED_RULES.splitlines())
+        return _default
+
+
+def load_rules(config):
+    path = config.get('PUBLIC_SUFFIX_FILE')
+    return SuffixRules.from_file(path) if path else default_rules()
@@ -0,0 +1,161 @@
+import os
+import csv
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from cache import normalize_key
+from key_pool import QUOTA_TZ, quota_day
+
+BACKLOG_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'backlog.json')
+ORDER_INPUT = "input"
+ORDER_STALE = "stale"
+ORDER_PRIORITY = "priority"
+ORDERS = (ORDER_INPUT, ORDER_STALE, ORDER_PRIORITY)
+
+
+def next_reset(now=None):
+    """Epoch seconds of the next Pacific midnight, when Google resets the daily quota."""
+    now = now if now is not None else datetime.now(timezone.utc)
+    local = now.astimezone(QUOTA_TZ)
+    midnight = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.timestamp()
+
+
+def load_priorities(path):
+    # One "domain,priority" row per line; higher numbers are checked first and missing ones count as 0.
+    priorities = {}
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if len(row) < 2 or not row[0].strip():
+                continue
+            try:
+                priorities[normalize_key(row[0])] = float(row[1])
+            except ValueError:
+                continue
+    return priorities
+
+
+def priorities_from_config(config, path=None):
+    priorities = {normalize_key(domain): float(value)
+                  for domain, value in (config.get('DOMAIN_PRIORITIES') or {}).items()}
+    path = path or config.get('PRIORITY_FILE')
+    if path:
+        priorities.update(load_priorities(path))
+    return priorities
+
+
+class QuotaPlan:
+    """Splits an ordered list of query targets into what today's remaining quota covers and what has to wait."""
+
+    def __init__(self, targets, cached, budget):
+        self.targets = targets
+        self.cached = cached
+        self.budget = budget
+        uncached = [target for target in targets if target not in cached]
+        self.needed = len(uncached)
+        covered = set(uncached[:budget])
+        self.run = [target for target in targets if target in cached or target in covered]
+        self.deferred = uncached[budget:]
+
+    @property
+    def days(self):
+        # Rough number of quota days the whole batch needs when today's budget is also what tomorrow brings.
+        if not self.needed:
+            return 0
+        if not self.budget:
+            return None
+        return -(-self.needed // self.budget)
+
+
+def order_targets(plan, order=ORDER_PRIORITY, priorities=None, last_checked=None):
+    """Sorts the plan's targets: user priority first (highest wins), then least recently checked, then input order."""
+    targets = plan.targets
+    if order == ORDER_INPUT:
+        return targets
+    priorities = priorities or {}
+    last_checked = last_checked or {}
+    keys = {}
+    for index, target in enumerate(targets):
+        lines = [normalize_key(line) for line in plan.groups.get(target, [target])]
+        priority = max((priorities.get(line, 0) for line in lines), default=0) if order == ORDER_PRIORITY else 0
+        # A group is as stale as its least recently checked member; never-checked domains sort first.
+        checked = min((last_checked.get(line, 0) for line in lines), default=0)
+        keys[target] = (-priority, checked, index)
+    return sorted(targets, key=keys.get)
+
+
+def plan_quota(plan, key_pool, cx, cache=None, history=None, order=ORDER_PRIORITY, priorities=None):
+    last_checked = None
+    if order != ORDER_INPUT and history is not None:
+        last_checked = history.last_checked([line for target in plan.targets
+                                             for line in plan.groups.get(target, [target])])
+    targets = order_targets(plan, order, priorities, last_checked)
+    cached = set(cache.get_many(targets, cx)) if cache is not None else set()
+    return QuotaPlan(targets, cached, key_pool.total_remaining())
+
+
+class Backlog:
+    """Domains left over when the quota ran out, persisted so the next quota day can pick them up."""
+
+    def __init__(self, path=BACKLOG_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, enabled=False):
+        if not (enabled or config.get('QUOTA_PLANNER', False)):
+            return None
+        return cls(config.get('BACKLOG_FILE', BACKLOG_FILE))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {"domains": [], "deferred_day": None, "updated": None}
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                state = json.load(file)
+        except ValueError:
+            return {"domains": [], "deferred_day": None, "updated": None}
+        state.setdefault("domains", [])
+        state.setdefault("deferred_day", None)
+        return state
+
+    def _save(self, state):
+        state["updated"] = time.time()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(state, file)
+        os.replace(temp_path, self.path)
+
+    def pending(self):
+        with self.lock:
+            return list(self._load()["domains"])
+
+    def due(self):
+        # The queue is drained once per quota day: a run that deferred domains today waits for tomorrow's reset.
+        with self.lock:
+            state = self._load()
+            return bool(state["domains"]) and state["deferred_day"] != quota_day()
+
+    def settle(self, checked, deferred):
+        """Drops the domains a run checked and appends the ones it had to leave for a later quota day."""
+        with self.lock:
+            state = self._load()
+            done = set(checked)
+            domains = [domain for domain in state["domains"] if domain not in done]
+            queued = set(domains)
+            for domain in deferred:
+                if domain not in queued:
+                    queued.add(domain)
+                    domains.append(domain)
+            if deferred:
+                state["deferred_day"] = quota_day()
+            state["domains"] = domains
+            if domains or os.path.exists(self.path):
+                self._save(state)
+            return len(domains)
+
+    def clear(self):
+        with self.lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,130 @@
+import time
+import random
+import threading
+from datetime import datetime, timezone
+
+DEFAULT_QPM = 100
+MAX_BACKOFF = 60.0
+BASE_BACKOFF = 1.0
+THROTTLE_DAILY = "daily"
+THROTTLE_MINUTE = "minute"
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    from email.utils import parsedate_to_datetime
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, retry_after=None, base=BASE_BACKOFF, cap=MAX_BACKOFF):
+    if retry_after is not None:
+        # Add a little jitter so workers sharing a key don't all come back at once.
+        return retry_after + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def classify_throttle(response):
+    try:
+        error = response.json()["error"]
+    except Exception:
+        return THROTTLE_MINUTE
+    reasons = [item.get("reason", "") for item in error.get("errors", [])]
+    text = " ".join([error.get("message", "")] + [str(detail) for detail in error.get("details", [])]).lower()
+    if "dailyLimitExceeded" in reasons or "per day" in text or "perday" in text:
+        return THROTTLE_DAILY
+    return THROTTLE_MINUTE
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute=DEFAULT_QPM, burst=None):
+        self.burst = burst if burst is not None else max(1, per_minute // 10)
+        # Refill slightly slower than the limit so a full burst plus a minute of refill stays under it.
+        self.max_rate = max(1, per_minute - self.burst) / 60.0
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 1:
+                wait = max(wait, (1 - self.tokens) / self.rate)
+            return wait
+
+    def acquire(self, stop_event=None):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_throttle(self, delay):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+
+class RateLimiter:
+
+    def __init__(self, per_minute=DEFAULT_QPM, limits=None):
+        self.per_minute = per_minute
+        self.limits = dict(limits or {})
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(per_minute=config.get('KEY_QPM', DEFAULT_QPM), limits=config.get('KEY_QPM_LIMITS'))
+
+    def bucket(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(self.limits.get(key, self.per_minute))
+            return self.buckets[key]
+
+    def delay(self, key):
+        return self.bucket(key).delay()
+
+    def acquire(self, key, stop_event=None):
+        return self.bucket(key).acquire(stop_event)
+
+    def on_success(self, key):
+        self.bucket(key).on_success()
+
+    def on_throttle(self, key, attempt, retry_after=None):
+        delay = backoff_delay(attempt, retry_after)
+        self.bucket(key).on_throttle(delay)
+        return delay
@@ -0,0 +1,136 @@
+import re
+import array
+from collections import OrderedDict, deque
+from itertools import compress, repeat
+from result_store import QUOTA_CODE
+
+MAX_CACHED_QUERIES = 32
+# A cached mask keeping at most one row in this many is narrowed row by row instead of rescanning every row.
+SPARSE_RATIO = 4
+RANGE = re.compile(r"^(\d+)(?:-|\.\.)(\d+)$")
+COMPARISON = re.compile(r"^(>=|<=|>|<|=)(\d+)$")
+
+
+def parse_filter(text):
+    """Turns a filter string into ``(kind, value)`` terms that must all match.
+
+    ``10-50`` or ``10..50`` and ``>10``, ``>=10``, ``<5``, ``<=5``, ``=0`` filter by count; ``.es`` or
+    ``tld:es`` match the end of the domain, ``^shop`` or ``shop*`` its start, and any other word a substring.
+    """
+    terms = []
+    for token in text.lower().split():
+        match = RANGE.match(token)
+        if match:
+            low, high = sorted(int(number) for number in match.groups())
+            terms.append(("range", (low, high)))
+            continue
+        match = COMPARISON.match(token)
+        if match:
+            comparison, number = match.group(1), int(match.group(2))
+            terms.append(("range", {">": (number + 1, QUOTA_CODE - 1), ">=": (number, QUOTA_CODE - 1),
+                                    "<": (0, number - 1), "<=": (0, number), "=": (number, number)}[comparison]))
+        elif token.startswith("tld:") and len(token) > 4:
+            terms.append(("suffix", "." + token[4:].lstrip(".")))
+        elif token.startswith(".") and len(token) > 1:
+            terms.append(("suffix", token))
+        elif token.startswith("^") and len(token) > 1:
+            terms.append(("prefix", token[1:]))
+        elif token.endswith("*") and len(token) > 1:
+            terms.append(("prefix", token[:-1]))
+        else:
+            terms.append(("contains", token))
+    return terms
+
+
+def implies(term, other):
+    """True when every row matching ``term`` also matches ``other``."""
+    kind, value = term
+    other_kind, other_value = other
+    if kind == "range" or other_kind == "range":
+        return kind == other_kind and other_value[0] <= value[0] and value[1] <= other_value[1]
+    if other_kind == "contains":
+        return other_value in value
+    return kind == other_kind and (value.startswith(other_value) if kind == "prefix" else value.endswith(other_value))
+
+
+class ResultFilter:
+    """The active filter over a ResultStore, kept as one byte per row.
+
+    Masks are cached per set of terms and extended only with the rows appended since, so backspacing or
+    results streaming in during a run cost a scan of the new rows. When an earlier, broader query left few
+    rows (typing one more character, adding ``.es`` to ``shop``), only those rows are checked again.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.text = ""
+        self.terms = []
+        self.cache = OrderedDict()
+
+    @property
+    def active(self):
+        return bool(self.terms)
+
+    def set_text(self, text):
+        self.text = text.strip()
+        self.terms = parse_filter(self.text)
+
+    def mask(self):
+        """A bytearray with one byte per stored row, 1 where every term matches; None without a filter."""
+        if not self.terms:
+            return None
+        with self.store.lock:
+            return self._mask(list(dict.fromkeys(self.terms)), len(self.store))
+
+    def view(self, column="total", reverse=True):
+        """The matching rows in display order, or None without a filter."""
+        mask = self.mask()
+        return None if mask is None else self.store.filtered(column, reverse, mask)
+
+    def _mask(self, terms, size):
+        key, updates = frozenset(terms), self.store.updates
+        mask, seen = self.cache.pop(key, (None, None))
+        if mask is None or seen != updates or len(mask) > size:
+            mask = self._build(terms, size, updates)
+        if len(mask) < size:
+            mask = mask + self._scan(terms, len(mask))
+        self.cache[key] = (mask, updates)
+        while len(self.cache) > MAX_CACHED_QUERIES:
+            self.cache.popitem(last=False)
+        return mask
+
+    def _build(self, terms, size, updates):
+        for other, (cached, seen) in reversed(self.cache.items()):
+            if seen == updates and len(cached) <= size and sparse(cached) and \
+                    all(any(implies(term, old) for term in terms) for old in other):
+                return self._narrow(cached, [term for term in terms if term not in other])
+        if len(terms) == 1:
+            return self.store.match_mask(*terms[0])
+        head = self._mask(terms[:-1], size)
+        if sparse(head):
+            return self._narrow(head, terms[-1:])
+        return intersect([head, self._mask(terms[-1:], size)])
+
+    def _narrow(self, base, terms):
+        row_ids = array.array("l", compress(range(len(base)), base))
+        for term in terms:
+            row_ids = self.store.select(row_ids, *term)
+        mask = bytearray(len(base))
+        deque(map(mask.__setitem__, row_ids, repeat(1)), maxlen=0)
+        return mask
+
+    def _scan(self, terms, start):
+        return intersect([self.store.match_mask(*term, start=start) for term in terms])
+
+
+def sparse(mask):
+    return mask.count(1) * SPARSE_RATIO <= len(mask)
+
+
+def intersect(masks):
+    if len(masks) == 1:
+        return masks[0]
+    combined = int.from_bytes(masks[0], "little")
+    for mask in masks[1:]:
+        combined &= int.from_bytes(mask, "little")
+    return bytearray(combined.to_bytes(len(masks[0]), "little"))
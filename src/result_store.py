@@ -0,0 +1,511 @@
+import os
+import array
+import bisect
+import operator
+import threading
+import time
+from collections import deque
+from itertools import accumulate, chain, compress, islice, repeat
+from tiers import QUOTA_EXCEEDED, TIERS
+
+DEFAULT_MEMORY_ROWS = 1000000
+CHUNK = 500
+FILTER_CHUNK = 4096
+EXPORT_CHUNK = 10000
+# With names spilled to disk the domain order is re-read from SQLite at most this often while results arrive.
+SPILLED_SORT_SECONDS = 2.0
+# Quota markers are stored as a count above any real one, so they sort where count_sort_key puts them.
+QUOTA_CODE = 2 ** 62
+TIER_CODES = {tier: code for code, tier in enumerate(TIERS)}
+TEXT_TESTS = {"contains": operator.contains, "prefix": str.startswith, "suffix": str.endswith}
+
+
+def decode_total(value):
+    return QUOTA_EXCEEDED if value == QUOTA_CODE else value
+
+
+def tier_code(value):
+    if value == QUOTA_CODE:
+        return TIER_CODES["orange"]
+    if value > 10:
+        return TIER_CODES["green"]
+    if value > 5:
+        return TIER_CODES["yellow"]
+    if value > 0:
+        return TIER_CODES["orange"]
+    return TIER_CODES["red"]
+
+
+class ResultRecord:
+    __slots__ = ("domain", "total", "tier")
+
+    def __init__(self, domain, total, tier):
+        self.domain = domain
+        self.total = total
+        self.tier = tier
+
+
+class OrderedRows:
+    """Read-only positional access to the store's rows in one sort order, built from the count index."""
+
+    def __init__(self, store, keys, starts):
+        self.store = store
+        self.keys = keys
+        self.starts = starts
+        self.size = starts[-1]
+
+    def __len__(self):
+        return self.size
+
+    def row_id(self, position):
+        index = bisect.bisect_right(self.starts, position) - 1
+        return self.store.buckets[self.keys[index]][position - self.starts[index]]
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        return self.store.row(self.row_id(position))
+
+    def row_ids(self):
+        return chain.from_iterable(map(self.store.buckets.__getitem__, self.keys))
+
+
+class DomainOrder:
+
+    def __init__(self, store, row_ids, reverse):
+        self.store = store
+        self.ids = row_ids
+        self.reverse = reverse
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_id(self, position):
+        return self.ids[len(self.ids) - 1 - position if self.reverse else position]
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.ids):
+            raise IndexError(position)
+        return self.store.row(self.row_id(position))
+
+    def row_ids(self):
+        return reversed(self.ids) if self.reverse else iter(self.ids)
+
+
+class FilteredRows:
+    """The rows of one display order that pass a filter mask.
+
+    The count comes straight from the mask; the ids are pulled from the ordered ids in growing chunks
+    only as far as they are read, so showing the top of a filtered view does not walk every row.
+    """
+
+    def __init__(self, store, row_ids, mask):
+        self.store = store
+        self.source = row_ids
+        self.mask = mask
+        self.size = mask.count(1)
+        self.ids = array.array("l")
+        self.chunk = FILTER_CHUNK
+
+    def __len__(self):
+        return self.size
+
+    def _fill(self, count):
+        flag = self.mask.__getitem__
+        while len(self.ids) < count:
+            chunk = array.array("l", islice(self.source, self.chunk))
+            if not chunk:
+                break
+            self.ids.extend(compress(chunk, map(flag, chunk)))
+            self.chunk *= 2
+
+    def row_id(self, position):
+        self._fill(position + 1)
+        return self.ids[position]
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError(position)
+        return self.store.row(self.row_id(position))
+
+    def row_ids(self):
+        self._fill(self.size)
+        return iter(self.ids)
+
+
+class ResultStore:
+    """Analysis results kept as columns.
+
+    Totals live in an ``array('q')`` and tiers in an ``array('b')`` of interned codes. Row ids are grouped
+    into one bucket per distinct count, and each tier keeps its sorted bucket keys, so sorted views,
+    copy-by-tier and export walk the buckets in order instead of re-sorting every row. Domain names stay
+    in memory up to ``memory_rows``; past that they move to a temporary SQLite file.
+    """
+
+    def __init__(self, memory_rows=DEFAULT_MEMORY_ROWS, spill_dir=None):
+        self.memory_rows = memory_rows
+        self.spill_dir = spill_dir
+        self.lock = threading.RLock()
+        # Bumped whenever a stored row changes or the store is cleared; appends alone leave it as is.
+        self.updates = 0
+        self._reset()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(memory_rows=config.get('RESULTS_MEMORY_ROWS', DEFAULT_MEMORY_ROWS),
+                   spill_dir=config.get('RESULTS_SPILL_DIR'))
+
+    def _reset(self):
+        self.totals = array.array("q")
+        self.tiers = array.array("b")
+        self.names = []
+        self.ids = {}
+        self.buckets = {}
+        self.tier_keys = {code: [] for code in TIER_CODES.values()}
+        self.version = 0
+        self.layouts = {}
+        self.domain_order = array.array("l")
+        self.domain_order_version = -1
+        self.domain_names = []
+        self.domain_sorted = array.array("l")
+        self.domain_sorted_at = 0.0
+        self.spill_path = None
+        self.spill = None
+
+    def __len__(self):
+        return len(self.totals)
+
+    @property
+    def spilled(self):
+        return self.spill is not None
+
+    # Domain column
+
+    def _lookup_ids(self, domains):
+        if self.spill is None:
+            return {domain: self.ids[domain] for domain in domains if domain in self.ids}
+        found = {}
+        domains = list(domains)
+        for start in range(0, len(domains), CHUNK):
+            chunk = domains[start:start + CHUNK]
+            found.update((name, row_id) for row_id, name in self.spill.execute(
+                "SELECT rid, name FROM names WHERE name IN (%s)" % ",".join("?" * len(chunk)), chunk))
+        return found
+
+    def _names_for(self, row_ids):
+        if self.spill is None:
+            return list(map(self.names.__getitem__, row_ids))
+        names = {}
+        for start in range(0, len(row_ids), CHUNK):
+            chunk = row_ids[start:start + CHUNK]
+            names.update(self.spill.execute(
+                "SELECT rid, name FROM names WHERE rid IN (%s)" % ",".join("?" * len(chunk)), chunk))
+        return [names[row_id] for row_id in row_ids]
+
+    def _spill_names(self):
+        # Only large stores spill, so the window does not pay for sqlite3 at startup.
+        import sqlite3
+        import tempfile
+        handle, self.spill_path = tempfile.mkstemp(prefix="gindexchecker-results-", suffix=".sqlite3",
+                                                   dir=self.spill_dir)
+        os.close(handle)
+        self.spill = sqlite3.connect(self.spill_path, check_same_thread=False)
+        self.spill.execute("PRAGMA journal_mode=OFF")
+        self.spill.execute("PRAGMA synchronous=OFF")
+        self.spill.execute("CREATE TABLE names (rid INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+        self.spill.executemany("INSERT INTO names (rid, name) VALUES (?, ?)", enumerate(self.names))
+        self.spill.commit()
+        self.names = []
+        self.ids = {}
+        self.domain_names = []
+        import atexit
+        atexit.register(self.close)
+
+    # Writes
+
+    def add_many(self, rows):
+        """Adds ``(domain, total)`` pairs; a domain that is already stored gets the new total."""
+        rows = list(rows)
+        if not rows:
+            return
+        with self.lock:
+            existing = self._lookup_ids(domain for domain, _ in rows)
+            new_names = []
+            totals, tiers, buckets = self.totals, self.tiers, self.buckets
+            for domain, total in rows:
+                value = QUOTA_CODE if total == QUOTA_EXCEEDED else int(total)
+                row_id = existing.get(domain)
+                if row_id is None:
+                    row_id = len(totals)
+                    existing[domain] = row_id
+                    totals.append(value)
+                    tiers.append(tier_code(value))
+                    if self.spill is None:
+                        self.names.append(domain)
+                        self.ids[domain] = row_id
+                    else:
+                        new_names.append((row_id, domain))
+                elif totals[row_id] != value:
+                    self.updates += 1
+                    self._unlink(row_id)
+                    totals[row_id] = value
+                    tiers[row_id] = tier_code(value)
+                else:
+                    continue
+                bucket = buckets.get(value)
+                if bucket is None:
+                    bucket = self._new_bucket(value)
+                bucket.append(row_id)
+            if new_names:
+                self.spill.executemany("INSERT INTO names (rid, name) VALUES (?, ?)", new_names)
+                self.spill.commit()
+            self.version += 1
+            self.layouts = {}
+            if self.spill is None and len(self.totals) > self.memory_rows:
+                self._spill_names()
+
+    def update(self, mapping):
+        self.add_many(mapping.items())
+
+    def _new_bucket(self, value):
+        bucket = self.buckets[value] = array.array("l")
+        bisect.insort(self.tier_keys[tier_code(value)], value)
+        return bucket
+
+    def _unlink(self, row_id):
+        value = self.totals[row_id]
+        bucket = self.buckets[value]
+        bucket.remove(row_id)
+        if not bucket:
+            del self.buckets[value]
+            keys = self.tier_keys[tier_code(value)]
+            del keys[bisect.bisect_left(keys, value)]
+
+    def clear(self):
+        with self.lock:
+            self.close()
+            self._reset()
+            self.updates += 1
+
+    def close(self):
+        with self.lock:
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
+                os.remove(self.spill_path)
+
+    # Reads
+
+    def row(self, row_id):
+        with self.lock:
+            return self._names_for([row_id])[0], decode_total(self.totals[row_id])
+
+    def get(self, domain):
+        with self.lock:
+            row_id = self._lookup_ids([domain]).get(domain)
+            if row_id is None:
+                return None
+            value = self.totals[row_id]
+            return ResultRecord(domain, decode_total(value), TIERS[self.tiers[row_id]])
+
+    def __contains__(self, domain):
+        with self.lock:
+            return bool(self._lookup_ids([domain]))
+
+    def contains_many(self, domains):
+        with self.lock:
+            return set(self._lookup_ids(domains))
+
+    def tier_counts(self):
+        with self.lock:
+            return {tier: sum(len(self.buckets[key]) for key in self.tier_keys[code])
+                    for tier, code in TIER_CODES.items()}
+
+    def ordered(self, column="total", reverse=True):
+        """Rows sorted like the results table: by total, by tier (then total) or by domain name."""
+        with self.lock:
+            if column == "domain":
+                return DomainOrder(self, self._sorted_by_domain(), reverse)
+            layout = self.layouts.get((column, reverse))
+            if layout is None:
+                keys = self._sorted_keys(column, reverse)
+                starts = [0]
+                starts.extend(accumulate(map(len, map(self.buckets.__getitem__, keys))))
+                layout = self.layouts[(column, reverse)] = (keys, starts)
+            return OrderedRows(self, *layout)
+
+    def _sorted_keys(self, column, reverse):
+        # The per-tier key lists are already sorted, so both orders are concatenations; nothing is re-sorted.
+        keys = {tier: self.tier_keys[code] for tier, code in TIER_CODES.items()}
+        orange = keys["orange"]
+        quota = orange[-1:] if orange and orange[-1] == QUOTA_CODE else []
+        if column == "tier":
+            ordered = keys["red"] + orange + keys["yellow"] + keys["green"]
+        else:
+            ordered = keys["red"] + orange[:len(orange) - len(quota)] + keys["yellow"] + keys["green"] + quota
+        if reverse:
+            ordered.reverse()
+        return ordered
+
+    def _sorted_by_domain(self):
+        known = len(self.domain_order)
+        stale_tail = self.spill is not None and len(self.domain_sorted) < known and \
+            time.monotonic() - self.domain_sorted_at >= SPILLED_SORT_SECONDS
+        if (self.domain_order_version != self.version and known < len(self.totals)) or stale_tail:
+            if self.spill is not None:
+                self._spilled_domain_order()
+            elif (len(self.names) - known) * 8 > len(self.names):
+                order = sorted(range(len(self.names)), key=self.names.__getitem__)
+                self.domain_names = list(map(self.names.__getitem__, order))
+                self.domain_order = array.array("l", order)
+            else:
+                self._merge_domain_order(known)
+        self.domain_order_version = self.version
+        return self.domain_order
+
+    def _merge_domain_order(self, known):
+        # Only the new names are sorted; each is placed by bisecting the sorted names, and the old order is
+        # copied over in slices, so a drain tick costs O(batch log n) plus one copy instead of a full sort.
+        added = sorted(range(known, len(self.names)), key=self.names.__getitem__)
+        old_names, old_order = self.domain_names, self.domain_order
+        names, order, previous = [], array.array("l"), 0
+        for row_id in added:
+            name = self.names[row_id]
+            position = bisect.bisect_left(old_names, name, previous)
+            names.extend(old_names[previous:position])
+            order.extend(old_order[previous:position])
+            names.append(name)
+            order.append(row_id)
+            previous = position
+        names.extend(old_names[previous:])
+        order.extend(old_order[previous:])
+        self.domain_names, self.domain_order = names, order
+
+    def _spilled_domain_order(self):
+        # Names on disk can't be bisected cheaply, and re-reading the whole order costs a pass over every
+        # name. While results stream in, rows added since the last full read are listed after it (sorted among
+        # themselves) and the full order is re-read at most every SPILLED_SORT_SECONDS.
+        now = time.monotonic()
+        if now - self.domain_sorted_at >= SPILLED_SORT_SECONDS:
+            self.domain_sorted = array.array("l", (row_id for row_id, in self.spill.execute(
+                "SELECT rid FROM names ORDER BY name")))
+            self.domain_sorted_at = now
+            self.domain_order = self.domain_sorted
+        else:
+            self.domain_order = self.domain_sorted + array.array("l", (row_id for row_id, in self.spill.execute(
+                "SELECT rid FROM names WHERE rid >= ? ORDER BY name", (len(self.domain_sorted),))))
+
+    # Filtering
+
+    def match_mask(self, kind, value, start=0):
+        """One byte per row from ``start`` on, 1 where the row matches.
+
+        ``kind`` is ``contains``, ``prefix`` or ``suffix`` (compared with the stored, already lowercase,
+        domain) or ``range`` for an inclusive ``(low, high)`` count range. Text scans run in C through
+        map(); a range only touches the buckets of the counts inside it.
+        """
+        with self.lock:
+            mask = bytearray(len(self.totals) - start)
+            if kind == "range":
+                low, high = value
+                set_flag = mask.__setitem__
+                for code in TIER_CODES.values():
+                    keys = self.tier_keys[code]
+                    for key in keys[bisect.bisect_left(keys, low):bisect.bisect_right(keys, high)]:
+                        bucket = self.buckets[key]
+                        if start:
+                            bucket = [row_id - start for row_id in bucket if row_id >= start]
+                        deque(map(set_flag, bucket, repeat(1)), maxlen=0)
+                return mask
+            if self.spill is not None:
+                condition, params = self._spill_condition(kind, value)
+                for row_id, in self.spill.execute(f"SELECT rid FROM names WHERE rid >= ? AND {condition}",
+                                                  (start,) + params):
+                    mask[row_id - start] = 1
+                return mask
+            return bytearray(map(TEXT_TESTS[kind], self.names[start:], repeat(value)))
+
+    @staticmethod
+    def _spill_condition(kind, value):
+        if kind == "contains":
+            return "instr(name, ?) > 0", (value,)
+        return ("substr(name, 1, ?) = ?" if kind == "prefix" else "substr(name, -?) = ?"), (len(value), value)
+
+    def select(self, row_ids, kind, value):
+        """The ids in ``row_ids`` whose row matches one filter term, in the same order."""
+        with self.lock:
+            if kind == "range":
+                low, high = value
+                flags = map(range(low, high + 1).__contains__, map(self.totals.__getitem__, row_ids))
+            else:
+                names = self._names_for(row_ids) if self.spill is not None else map(self.names.__getitem__, row_ids)
+                flags = map(TEXT_TESTS[kind], names, repeat(value))
+            return array.array("l", compress(row_ids, flags))
+
+    def filtered(self, column, reverse, mask):
+        """The rows whose mask byte is set, in display order; rows added after the mask was built are left out."""
+        with self.lock:
+            if len(mask) < len(self.totals):
+                mask = bytes(mask) + bytes(len(self.totals) - len(mask))
+            return FilteredRows(self, self.ordered(column, reverse).row_ids(), mask)
+
+    def domains_in_tiers(self, tiers, mask=None):
+        """Domains of the given tiers, highest count first; costs time in the number of domains returned."""
+        with self.lock:
+            row_ids = []
+            for tier in tiers:
+                for key in reversed(self.tier_keys[TIER_CODES[tier]]):
+                    row_ids.extend(self.buckets[key])
+            if mask is not None:
+                row_ids = list(compress(row_ids, map(mask.__getitem__, row_ids)))
+            return self._names_for(row_ids)
+
+    def snapshot(self, mask=None):
+        """The rows stored right now, highest count first, as ``(domain, total)`` lists of up to EXPORT_CHUNK.
+
+        Only the mask is taken on the calling thread. Iterating copies the count buckets under the lock,
+        walks them in order without it and reads names one chunk at a time, so an export thread can write
+        500k rows without stalling whoever adds results. Rows added after the call are not included.
+        """
+        with self.lock:
+            return self._snapshot_chunks(b"\x01" * len(self) if mask is None else mask, self.totals)
+
+    def _snapshot_chunks(self, mask, live):
+        with self.lock:
+            if self.totals is not live:
+                return
+            keys = self._sorted_keys("total", True)
+            buckets = [self.buckets[key][:] for key in keys]
+            # Rows added since the call sit past the end of the mask and stay out.
+            mask = bytes(mask[:len(live)]).ljust(len(live), b"\0")
+        # The count index is already in display order, so walking it only needs the mask, not a sort.
+        row_ids, totals = array.array("l"), []
+        for key, bucket in zip(keys, buckets):
+            before = len(row_ids)
+            row_ids.extend(compress(bucket, map(mask.__getitem__, bucket)))
+            totals.extend(repeat(decode_total(key), len(row_ids) - before))
+        for start in range(0, len(row_ids), EXPORT_CHUNK):
+            chunk = row_ids[start:start + EXPORT_CHUNK]
+            with self.lock:
+                if self.totals is not live:
+                    return
+                names = self._names_for(chunk)
+            yield list(zip(names, totals[start:start + EXPORT_CHUNK]))
+
+    def rows(self, column="total", reverse=True, row_ids=None, mask=None):
+        """Snapshot of ``(domain, total)`` pairs in the given order, e.g. for an export."""
+        with self.lock:
+            if mask is not None:
+                row_ids = array.array("l", self.filtered(column, reverse, mask).row_ids())
+            if row_ids is not None or column == "domain":
+                if row_ids is None:
+                    row_ids = list(self.ordered(column, reverse).row_ids())
+                names = self._names_for(row_ids)
+                return [(name, decode_total(self.totals[row_id])) for name, row_id in zip(names, row_ids)]
+            # Walking the count index, every row of a bucket shares the bucket's total.
+            rows = []
+            for key in self._sorted_keys(column, reverse):
+                bucket = self.buckets[key]
+                names = self._names_for(bucket) if self.spill is not None else map(self.names.__getitem__, bucket)
+                rows.extend(zip(names, repeat(decode_total(key), len(bucket))))
+            return rows
@@ -0,0 +1,130 @@
+import tkinter as tk
+from tiers import color_for
+
+
+class ResultsView(tk.Frame):
+
+    ROW_HEIGHT = 20
+    COLUMNS = (("domain", 8), ("total", 300), ("tier", 460))
+
+    def __init__(self, parent, store, row_filter=None, on_open=None, format_total=None, headings=None,
+                 bg='#3c3f41', fg='white', **kwargs):
+        super().__init__(parent, bg=bg, **kwargs)
+        self.store = store
+        self.row_filter = row_filter
+        self.on_open = on_open
+        self.format_total = format_total or str
+        self.bg = bg
+        self.fg = fg
+        self.sort_column = "total"
+        self.sort_reverse = True
+        self.rows = store.ordered(self.sort_column, self.sort_reverse)
+        self.first = 0
+        self.pool = []
+        self.header = tk.Canvas(self, height=self.ROW_HEIGHT, bg='#2d2d2d', highlightthickness=0)
+        self.header.grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.header.bind("<Button-1>", self.on_header_click)
+        self.header_items = {}
+        for column, x in self.COLUMNS:
+            self.header_items[column] = self.header.create_text(x, self.ROW_HEIGHT / 2, anchor="w", fill=fg,
+                                                                font=("tahoma", 9, "bold"))
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0, cursor="arrow")
+        self.canvas.grid(row=1, column=0, sticky="nsew")
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.yview,
+                                      width=16, bg="gray", activebackground="gray")
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.canvas.bind("<Configure>", lambda e: self.redraw())
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<Motion>", self.on_motion)
+        self.canvas.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+        self.set_headings(headings or {"domain": "Domain", "total": "Total Results", "tier": "Tier"})
+
+    def set_headings(self, headings):
+        self.headings = headings
+        for column, item in self.header_items.items():
+            text = headings.get(column, column)
+            if column == self.sort_column:
+                text += " ▼" if self.sort_reverse else " ▲"
+            self.header.itemconfigure(item, text=text)
+
+    def sort_by(self, column, reverse=None):
+        if reverse is None:
+            reverse = not self.sort_reverse if column == self.sort_column else column != "domain"
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self.set_headings(self.headings)
+        self.refresh()
+
+    def refresh(self, reset=False):
+        # The store keeps its rows indexed in every sort order, so only the visible rows are read.
+        rows = self.row_filter.view(self.sort_column, self.sort_reverse) if self.row_filter is not None else None
+        self.rows = rows if rows is not None else self.store.ordered(self.sort_column, self.sort_reverse)
+        if reset:
+            self.first = 0
+        self.redraw()
+
+    def visible_count(self):
+        return max(1, self.canvas.winfo_height() // self.ROW_HEIGHT + 1)
+
+    def ensure_pool(self, count):
+        while len(self.pool) < count:
+            y = len(self.pool) * self.ROW_HEIGHT + self.ROW_HEIGHT / 2
+            domain_id = self.canvas.create_text(self.COLUMNS[0][1], y, anchor="w", font=("tahoma", 10, "underline"))
+            total_id = self.canvas.create_text(self.COLUMNS[1][1], y, anchor="w", fill=self.fg, font=("tahoma", 10))
+            tier_id = self.canvas.create_rectangle(self.COLUMNS[2][1], y - 5, self.COLUMNS[2][1] + 10, y + 5, width=0)
+            self.pool.append((domain_id, total_id, tier_id))
+
+    def redraw(self):
+        visible = self.visible_count()
+        self.ensure_pool(visible)
+        self.first = max(0, min(self.first, len(self.rows) - visible + 1))
+        for offset, (domain_id, total_id, tier_id) in enumerate(self.pool):
+            index = self.first + offset
+            if offset < visible and index < len(self.rows):
+                domain, total = self.rows[index]
+                color = color_for(total)
+                self.canvas.itemconfigure(domain_id, text=domain, fill=color, state="normal")
+                self.canvas.itemconfigure(total_id, text=self.format_total(total), state="normal")
+                self.canvas.itemconfigure(tier_id, fill=color, state="normal")
+            else:
+                for item in (domain_id, total_id, tier_id):
+                    self.canvas.itemconfigure(item, state="hidden")
+        if self.rows:
+            self.scrollbar.set(self.first / len(self.rows), min(1.0, (self.first + visible - 1) / len(self.rows)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def yview(self, *args):
+        visible = self.visible_count() - 1
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * len(self.rows))
+        elif args[0] == "scroll":
+            step = int(args[1])
+            self.first += step * visible if args[2] == "pages" else step * 3
+        self.redraw()
+
+    def row_at(self, y):
+        index = self.first + int(y // self.ROW_HEIGHT)
+        if 0 <= index < len(self.rows):
+            return self.rows[index]
+        return None
+
+    def on_click(self, event):
+        row = self.row_at(event.y)
+        if row and event.x < self.COLUMNS[1][1] and self.on_open:
+            self.on_open(row[0])
+
+    def on_motion(self, event):
+        over_domain = self.row_at(event.y) is not None and event.x < self.COLUMNS[1][1]
+        self.canvas.config(cursor="hand2" if over_domain else "arrow")
+
+    def on_header_click(self, event):
+        column = self.COLUMNS[0][0]
+        for name, x in self.COLUMNS:
+            if event.x >= x - 4:
+                column = name
+        self.sort_by(column)
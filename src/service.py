@@ -0,0 +1,402 @@
+import sys
+import json
+import time
+import uuid
+import asyncio
+import threading
+from urllib.parse import urlsplit, parse_qs
+from engine import LookupEngine, DEFAULT_DEADLINE, DEFAULT_WORKERS
+from key_pool import KeyPool
+from rate_limit import RateLimiter
+from transport import SearchTransport, DEFAULT_TIMEOUT, redact_key
+from metrics import Metrics
+from planner import plan_from_config
+from singleflight import InflightRegistry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_JOBS = 4
+DEFAULT_JOB_TTL = 3600
+MAX_BODY = 64 * 1024 * 1024
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+REASONS = {200: "OK", 202: "Accepted", 204: "No Content", 400: "Bad Request", 401: "Unauthorized",
+           404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class Job:
+
+    def __init__(self, domains, plan):
+        self.id = uuid.uuid4().hex[:12]
+        self.domains = domains
+        self.plan = plan
+        self.state = QUEUED
+        self.results = []
+        self.not_processed = []
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.engine = None
+        self.coalesced = 0
+        self.cancel_requested = False
+        # Replaced on every change; streams wait on the one they saw, so no wake-up is missed.
+        self.changed = asyncio.Event()
+
+    @property
+    def closed(self):
+        return self.state in (DONE, CANCELLED, FAILED)
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def add_results(self, rows):
+        self.results.extend(rows)
+        self.notify()
+
+    def status(self):
+        return {"id": self.id, "state": self.state, "domains": len(self.domains), "queries": len(self.plan.targets),
+                "done": len(self.results), "not_processed": len(self.not_processed), "error": self.error,
+                "coalesced": self.engine.coalesced if self.engine is not None else self.coalesced,
+                "created": self.created, "started": self.started, "finished": self.finished}
+
+
+class JobService:
+    """Runs lookup jobs for HTTP clients; every job shares one key pool, transport, cache and rate limiter."""
+
+    def __init__(self, key_pool, cx, config=None, transport=None, cache=None, rate_limiter=None, metrics=None,
+                 workers=DEFAULT_WORKERS, max_jobs=DEFAULT_MAX_JOBS, job_ttl=DEFAULT_JOB_TTL, token=None,
+                 on_job_done=None):
+        self.key_pool = key_pool
+        self.cx = cx
+        self.config = config or {}
+        self.workers = workers
+        self.transport = transport if transport is not None else SearchTransport(pool_size=workers * max_jobs)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.inflight = InflightRegistry()
+        self.max_jobs = max_jobs
+        self.job_ttl = job_ttl
+        self.token = token
+        self.on_job_done = on_job_done
+        self.jobs = {}
+        self.slots = None
+        self.loop = None
+        self.server = None
+
+    @classmethod
+    def from_config(cls, config, on_job_done=None):
+        api_keys = [key.strip() for key in config.get('API_KEYS', []) if key.strip()]
+        cx = config.get('CX', '').strip()
+        if not api_keys or not cx:
+            raise ValueError("config.json needs at least one API key and the CX key")
+        cache = None
+        if config.get('CACHE_ENABLED', True):
+            from cache import ResultCache
+            cache = ResultCache.from_config(config)
+        workers = config.get('WORKERS', DEFAULT_WORKERS)
+        max_jobs = config.get('SERVICE_MAX_JOBS', DEFAULT_MAX_JOBS)
+        return cls(KeyPool.from_config(api_keys, config), cx, config=config, cache=cache,
+                   rate_limiter=RateLimiter.from_config(config), workers=workers, max_jobs=max_jobs,
+                   job_ttl=config.get('SERVICE_JOB_TTL', DEFAULT_JOB_TTL), token=config.get('SERVICE_TOKEN'),
+                   on_job_done=on_job_done)
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self.loop = asyncio.get_running_loop()
+        self.slots = asyncio.Semaphore(self.max_jobs)
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        for job in self.jobs.values():
+            self.cancel(job)
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def submit(self, domains, group=None):
+        self.purge()
+        domains = list(dict.fromkeys(domain.strip() for domain in domains if domain.strip()))
+        plan = plan_from_config(domains, self.config, group)
+        job = Job(domains, plan)
+        self.jobs[job.id] = job
+        self.loop.create_task(self.run_job(job))
+        return job
+
+    def purge(self):
+        expired = time.time() - self.job_ttl
+        for job_id in [job.id for job in self.jobs.values() if job.closed and job.finished < expired]:
+            del self.jobs[job_id]
+
+    def cancel(self, job):
+        job.cancel_requested = True
+        if job.engine is not None:
+            job.engine.stop()
+
+    async def run_job(self, job):
+        async with self.slots:
+            if job.cancel_requested:
+                job.state = CANCELLED
+                job.not_processed = list(job.domains)
+            else:
+                job.state = RUNNING
+                job.started = time.time()
+                job.notify()
+                try:
+                    # Set here rather than on the executor thread: the results it queued are applied first.
+                    job.state, job.error, job.not_processed = await self.loop.run_in_executor(
+                        None, self.run_lookups, job)
+                except Exception as e:
+                    job.state = FAILED
+                    job.error = redact_key(str(e))
+            job.finished = time.time()
+            job.notify()
+        if self.on_job_done is not None:
+            await self.loop.run_in_executor(None, self.on_job_done, job)
+
+    def run_lookups(self, job):
+        # Runs on an executor thread; results are handed to the event loop, which owns the job's state.
+        engine = LookupEngine(self.key_pool, self.cx, workers=self.workers, transport=self.transport,
+                              cache=self.cache, rate_limiter=self.rate_limiter, metrics=self.metrics,
+                              timeout=self.config.get('REQUEST_TIMEOUT', DEFAULT_TIMEOUT),
+                              hedge=self.config.get('HEDGE', False), inflight=self.inflight,
+                              deadline=self.config.get('LOOKUP_DEADLINE', DEFAULT_DEADLINE))
+        job.engine = engine
+        if job.cancel_requested:
+            engine.stop()
+
+        def on_result(target, total, fetched):
+            self.loop.call_soon_threadsafe(job.add_results, job.plan.expand(target, total))
+
+        _, _, not_processed = engine.run(job.plan.targets, on_result=on_result)
+        job.coalesced = engine.coalesced
+        job.engine = None
+        not_processed = job.plan.lines_for(not_processed)
+        if engine.invalid_cx:
+            return FAILED, "the CX key is invalid", not_processed
+        return CANCELLED if engine.cancelled else DONE, None, not_processed
+
+    async def handle(self, reader, writer):
+        try:
+            request = await read_request(reader)
+            if request is None:
+                return
+            await self.route(writer, *request)
+        except HttpError as e:
+            await send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            try:
+                await send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def route(self, writer, method, target, headers, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+        if self.token and headers.get("authorization") != f"Bearer {self.token}":
+            raise HttpError(401, "missing or wrong bearer token")
+        if parts == ["health"]:
+            return await send_json(writer, 200, {"ok": True, "jobs": len(self.jobs),
+                                                 "quota_remaining": self.key_pool.total_remaining(),
+                                                 "in_flight": self.inflight.stats()})
+        if parts == ["metrics"]:
+            return await send_response(writer, 200, self.metrics.to_prometheus().encode("utf-8"),
+                                       "text/plain; version=0.0.4")
+        if not parts or parts[0] != "jobs" or len(parts) > 3:
+            raise HttpError(404, "not found")
+        if len(parts) == 1:
+            if method == "POST":
+                domains, group = parse_domains(headers, body)
+                try:
+                    job = self.submit(domains, group)
+                except ValueError as e:
+                    raise HttpError(400, str(e))
+                status = job.status()
+                status.update(status_url=f"/jobs/{job.id}", stream_url=f"/jobs/{job.id}/stream",
+                              results_url=f"/jobs/{job.id}/results")
+                return await send_json(writer, 202, status)
+            if method == "GET":
+                return await send_json(writer, 200, {"jobs": [job.status() for job in self.jobs.values()]})
+            raise HttpError(405, "use GET or POST")
+        job = self.jobs.get(parts[1])
+        if job is None:
+            raise HttpError(404, "unknown job")
+        action = parts[2] if len(parts) == 3 else None
+        if action is None and method == "DELETE":
+            self.cancel(job)
+            return await send_json(writer, 202, job.status())
+        if method != "GET":
+            raise HttpError(405, "use GET")
+        if action is None:
+            return await send_json(writer, 200, job.status())
+        if action == "results":
+            status = job.status()
+            status.update(results=[{"domain": domain, "total": total} for domain, total in job.results],
+                          unprocessed=job.not_processed)
+            return await send_json(writer, 200, status)
+        if action == "stream":
+            sse = "text/event-stream" in headers.get("accept", "") or query.get("format") == ["sse"]
+            try:
+                start = int(query.get("from", ["0"])[0])
+            except ValueError:
+                raise HttpError(400, "from must be a result index")
+            return await self.stream(writer, job, sse, start)
+        raise HttpError(404, "not found")
+
+    async def stream(self, writer, job, sse, start=0):
+        content_type = "text/event-stream" if sse else "application/x-ndjson"
+        writer.write(response_head(200, content_type, chunked=True))
+        index = max(0, start)
+        while True:
+            changed = job.changed
+            if index < len(job.results):
+                events = [("result", {"domain": domain, "total": total}) for domain, total in job.results[index:]]
+                index = len(job.results)
+                write_chunk(writer, "".join(format_event(kind, data, sse) for kind, data in events))
+                await writer.drain()
+            if job.closed:
+                status = job.status()
+                status["unprocessed"] = job.not_processed
+                write_chunk(writer, format_event("done", status, sse))
+                break
+            await changed.wait()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def parse_domains(headers, body):
+    # JSON bodies are {"domains": [...], "group": "host"} or a bare list; anything else is one domain per line.
+    text = body.decode("utf-8", errors="replace")
+    if "json" in headers.get("content-type", "") or text.lstrip()[:1] in ("{", "["):
+        try:
+            payload = json.loads(text)
+        except ValueError:
+            raise HttpError(400, "invalid JSON body")
+        if isinstance(payload, list):
+            payload = {"domains": payload}
+        domains = payload.get("domains") if isinstance(payload, dict) else None
+        if not isinstance(domains, list) or not all(isinstance(domain, str) for domain in domains):
+            raise HttpError(400, "expected a list of domains")
+        return domains, payload.get("group")
+    return text.splitlines(), None
+
+
+def response_head(status, content_type, length=None, chunked=False):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+             "Cache-Control: no-cache", "Connection: close"]
+    if chunked:
+        lines.append("Transfer-Encoding: chunked")
+    elif length is not None:
+        lines.append(f"Content-Length: {length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_response(writer, status, body, content_type):
+    writer.write(response_head(status, content_type, len(body)) + body)
+    await writer.drain()
+
+
+async def send_json(writer, status, payload):
+    await send_response(writer, status, json.dumps(payload).encode("utf-8"), "application/json")
+
+
+def format_event(kind, data, sse):
+    if sse:
+        return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+    if kind != "result":
+        data = dict(data, event=kind)
+    return json.dumps(data) + "\n"
+
+
+def write_chunk(writer, text):
+    data = text.encode("utf-8")
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+def main(argv=None):
+    import argparse
+    from config import CONFIG_FILE, load_config, save_config
+    parser = argparse.ArgumentParser(prog="service", description="Serve index-count lookups over local HTTP.")
+    parser.add_argument("-c", "--config", default=CONFIG_FILE, help="path to config.json")
+    parser.add_argument("--host", help=f"address to listen on (default: SERVICE_HOST from config, else {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, help=f"port to listen on (default: SERVICE_PORT from config, else {DEFAULT_PORT})")
+    args = parser.parse_args(argv)
+    config = load_config(args.config)
+    save_lock = threading.Lock()
+
+    def save_key_state(job=None):
+        with save_lock:
+            config['KEY_STATE'] = service.key_pool.to_config()
+            save_config(config, args.config)
+
+    try:
+        service = JobService.from_config(config, on_job_done=save_key_state)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    async def serve():
+        host, port = await service.start(args.host or config.get('SERVICE_HOST', DEFAULT_HOST),
+                                         args.port or config.get('SERVICE_PORT', DEFAULT_PORT))
+        print(f"listening on http://{host}:{port}/jobs", file=sys.stderr)
+        try:
+            await service.server.serve_forever()
+        finally:
+            await service.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        save_key_state()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import threading
+from concurrent.futures import Future
+
+
+class InflightRegistry:
+    """Lets concurrent lookups of the same key share one call.
+
+    The first caller for a key runs the function; callers that arrive while it is running wait on the
+    same future and get its result (or exception) instead of issuing their own request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, function):
+        """Returns ``(value, shared)``; ``shared`` is True when the value came from another caller's call."""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result(), True
+        try:
+            value = function()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(value)
+            return value, False
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.calls)
+
+    def stats(self):
+        with self.lock:
+            return {"in_flight": len(self.calls), "leaders": self.leaders, "coalesced": self.coalesced}
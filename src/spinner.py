@@ -7,6 +7,7 @@ class Spinner(tk.Frame):
         self.length = length
         self.height = 20  
         self.text = text
+        self.idle_text = text
         self.canvas = tk.Canvas(self, width=self.length, height=self.height, bg="white", highlightthickness=0)
         self.canvas.pack()
         self.text_id = self.canvas.create_text(self.length/2, self.height/2, text=self.text, fill="black", font=("tahoma", 10))
@@ -18,6 +19,7 @@ class Spinner(tk.Frame):
 
     def start(self):
         self.animation_running = True
+        self.update_text(self.idle_text)
         self.animate()
         self.pack(pady=10)
 
@@ -37,6 +39,20 @@ class Spinner(tk.Frame):
         self.animation_running = False
         self.pack_forget()
 
+    def update_idle_text(self, new_text):
+        self.idle_text = new_text
+        if self.animation_running:
+            self.update_text(new_text)
+
     def update_text(self, new_text):
         self.text = new_text
-        self.canvas.itemconfigure(self.text_id, text=self.text)
\ No newline at end of file
+        self.canvas.itemconfigure(self.text_id, text=self.text)
+
+    def set_progress(self, done, total, text=None):
+        if total <= 0:
+            return
+        self.animation_running = False
+        self.canvas.coords(self.block, 0, 0, self.length * min(1.0, done / total), self.block_height)
+        self.canvas.tag_raise(self.text_id)
+        if text is not None:
+            self.update_text(text)
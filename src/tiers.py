@@ -0,0 +1,23 @@
+QUOTA_EXCEEDED = "quota_exceeded"
+TIERS = ("green", "yellow", "orange", "red")
+TIER_COLORS = {"green": "#00FF00", "yellow": "yellow", "orange": "orange", "red": "#FF5252"}
+QUOTA_COLOR = "#FF8C00"
+
+def tier_for(total):
+    if total == QUOTA_EXCEEDED:
+        return "orange"
+    if total > 10:
+        return "green"
+    if total > 5:
+        return "yellow"
+    if total > 0:
+        return "orange"
+    return "red"
+
+def color_for(total):
+    if total == QUOTA_EXCEEDED:
+        return QUOTA_COLOR
+    return TIER_COLORS[tier_for(total)]
+
+def count_sort_key(total):
+    return (0, total) if isinstance(total, int) else (1, 0)
@@ -0,0 +1,179 @@
+import sys
+import json
+import time
+import threading
+from metrics import fingerprint
+from transport import redact_key
+
+MESSAGE_LIMIT = 200
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_UNPROCESSED = "unprocessed"
+OUTCOME_CANCELLED = "cancelled"
+OUTCOME_INVALID_CX = "invalid_cx"
+
+
+class LookupTrace:
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.start = time.time()
+        self.requests = []
+        self.waited = 0.0
+
+    def add_request(self, api_key, start, end, status, size=0, message=None, hedge=False):
+        entry = {"key": fingerprint(api_key), "start": round(start, 6), "end": round(end, 6),
+                 "status": status, "bytes": size}
+        if message:
+            entry["message"] = redact_key(message)[:MESSAGE_LIMIT]
+        if hedge:
+            entry["hedge"] = True
+        self.requests.append(entry)
+
+    def add_response(self, api_key, start, end, response, hedge=False):
+        message = None
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = response.text
+        self.add_request(api_key, start, end, response.status_code, len(response.content), message, hedge)
+
+    def add_wait(self, seconds):
+        self.waited += seconds
+
+    def to_entry(self, outcome, total):
+        retries = max(0, sum(1 for request in self.requests if not request.get("hedge")) - 1)
+        return {"type": "lookup", "domain": self.domain, "start": round(self.start, 6), "end": round(time.time(), 6),
+                "outcome": outcome, "total": total, "retries": retries, "waited": round(self.waited, 6),
+                "bytes": sum(request["bytes"] for request in self.requests), "requests": self.requests}
+
+
+class TraceLog:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def from_config(cls, config):
+        path = config.get('TRACE_FILE')
+        return cls(path) if path else None
+
+    def record(self, entry):
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def load_trace(path):
+    entries = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("type") == "lookup":
+                entries.append(entry)
+    return entries
+
+
+def percentiles(values, fractions=(0.5, 0.9, 0.99)):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {f"p{int(f * 100)}": round(ordered[min(len(ordered) - 1, int(len(ordered) * f))], 3) for f in fractions}
+    summary["max"] = round(ordered[-1], 3)
+    return summary
+
+
+def analyze(entries, slowest=10):
+    outcomes = {}
+    keys = {}
+    request_times = []
+    for entry in entries:
+        outcomes[entry["outcome"]] = outcomes.get(entry["outcome"], 0) + 1
+        for request in entry["requests"]:
+            stats = keys.setdefault(request["key"], {"requests": 0, "ok": 0, "throttled": 0, "errors": 0,
+                                                     "bytes": 0, "first": request["start"], "last": request["end"]})
+            stats["requests"] += 1
+            stats["bytes"] += request["bytes"]
+            stats["first"] = min(stats["first"], request["start"])
+            stats["last"] = max(stats["last"], request["end"])
+            if request["status"] == 200:
+                stats["ok"] += 1
+            elif request["status"] == 429:
+                stats["throttled"] += 1
+            else:
+                stats["errors"] += 1
+            request_times.append(request["end"] - request["start"])
+    for stats in keys.values():
+        span = stats.pop("last") - stats.pop("first")
+        stats["ok_per_min"] = round(stats["ok"] * 60 / span, 2) if span > 0 else None
+    lookup_times = [entry["end"] - entry["start"] for entry in entries]
+    span = (max(entry["end"] for entry in entries) - min(entry["start"] for entry in entries)) if entries else 0
+    ranked = sorted(entries, key=lambda entry: entry["end"] - entry["start"], reverse=True)[:slowest]
+    return {
+        "lookups": len(entries),
+        "outcomes": outcomes,
+        "span_s": round(span, 3),
+        "lookups_per_s": round(len(entries) / span, 3) if span > 0 else None,
+        "lookup_latency_s": percentiles(lookup_times),
+        "request_latency_s": percentiles(request_times),
+        "retries": sum(entry["retries"] for entry in entries),
+        "throttle_wait_s": round(sum(entry["waited"] for entry in entries), 3),
+        "bytes": sum(entry["bytes"] for entry in entries),
+        "keys": keys,
+        "slowest": [{"domain": entry["domain"], "seconds": round(entry["end"] - entry["start"], 3),
+                     "outcome": entry["outcome"], "retries": entry["retries"]} for entry in ranked],
+    }
+
+
+def print_report(report, stream):
+    write = stream.write
+    write(f"lookups: {report['lookups']}  " + "  ".join(f"{k}={v}" for k, v in sorted(report["outcomes"].items())) + "\n")
+    write(f"span: {report['span_s']}s  throughput: {report['lookups_per_s']} lookups/s  retries: {report['retries']}  "
+          f"time waiting on throttles/backoff: {report['throttle_wait_s']}s  bytes: {report['bytes']}\n")
+    for label, name in (("lookup latency", "lookup_latency_s"), ("request latency", "request_latency_s")):
+        write(f"{label}: " + "  ".join(f"{k}={v}s" for k, v in report[name].items()) + "\n")
+    write("\nkey          requests     ok  429  errors  ok/min\n")
+    for name, stats in sorted(report["keys"].items(), key=lambda item: -item[1]["requests"]):
+        write(f"{name:<12} {stats['requests']:>8} {stats['ok']:>6} {stats['throttled']:>4} {stats['errors']:>7} "
+              f"{stats['ok_per_min']}\n")
+    if report["slowest"]:
+        write("\nslowest lookups:\n")
+        for entry in report["slowest"]:
+            write(f"  {entry['seconds']:>8}s  {entry['domain']}  ({entry['outcome']}, {entry['retries']} retries)\n")
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="tracelog", description="Summarize a lookup trace written with --trace or TRACE_FILE.")
+    parser.add_argument("trace", help="JSONL trace file")
+    parser.add_argument("--slowest", type=int, default=10, help="number of slowest lookups to list")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+    report = analyze(load_trace(args.trace), slowest=args.slowest)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import re
+import threading
+
+SEARCH_URL = "https://www.googleapis.com/customsearch/v1"
+RESULT_FIELDS = "searchInformation/totalResults"
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = 15
+KEY_PARAM = re.compile(r"(\bkey=)[^&\s'\"]+")
+
+
+class TransportError(Exception):
+    pass
+
+
+def redact_key(text):
+    """Replaces the value of any ``key=`` query parameter, so request URLs in messages don't leak API keys."""
+    return KEY_PARAM.sub(r"\1<redacted>", text)
+
+
+class SearchTransport:
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, url=SEARCH_URL):
+        # requests is slow to import, so it is only loaded once something actually talks to the API.
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.request_error = requests.RequestException
+        self.url = url
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, int(pool_size)))
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        # Google only serves gzip to clients whose User-Agent mentions it.
+        self.session.headers.update({
+            "Accept-Encoding": "gzip",
+            "User-Agent": "GIndexChecker (gzip)",
+        })
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    def search(self, api_key, cx, query, fields=RESULT_FIELDS, timeout=None):
+        params = {"key": api_key, "cx": cx, "q": query, "num": 1}
+        if fields:
+            params["fields"] = fields
+        try:
+            response = self.session.get(self.url, params=params, timeout=timeout)
+        except self.request_error as e:
+            raise TransportError(redact_key(str(e))) from e
+        body = len(response.content)
+        wire = body
+        try:
+            wire = response.raw.tell() or body
+        except Exception:
+            length = response.headers.get("Content-Length")
+            if length and length.isdigit():
+                wire = int(length)
+        with self.lock:
+            self.requests += 1
+            self.wire_bytes += wire
+            self.body_bytes += body
+        return response
+
+    def connections_opened(self):
+        total = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                total += getattr(pool, "num_connections", 0)
+        return total
+
+    def stats(self):
+        with self.lock:
+            requests_made = self.requests
+            wire_bytes = self.wire_bytes
+            body_bytes = self.body_bytes
+        connections = self.connections_opened()
+        return {
+            "requests": requests_made,
+            "connections_opened": connections,
+            "handshakes_saved": max(0, requests_made - connections),
+            "wire_bytes": wire_bytes,
+            "body_bytes": body_bytes,
+            # Only what gzip saved on the responses received; the fields filter and num=1 shrink the body itself,
+            # which shows in wire_bytes but has no baseline here without sending unfiltered queries.
+            "compression_saved": max(0, body_bytes - wire_bytes),
+        }
+
+    def close(self):
+        self.session.close()
@@ -1,9 +1,6 @@
 import os
 import sys
-import json
-import tkinter as tk
-
-CONFIG_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'config.json')
+from config import CONFIG_FILE, load_config, save_config
 
 def resource_path(relative_path):
     try:
@@ -30,7 +27,11 @@ TRANSLATIONS = {
         "enter_domains": "Por favor, ingresa al menos un dominio antes de analizar.",
         "api_limit_reached": "Todas las claves de API han alcanzado el límite diario de consultas.",
         "api_keys_used": "Claves API utilizadas: {count}",
+        "transport_stats": "Conexiones reutilizadas: {handshakes}, KB descargados: {kb} ({compressed_kb} ahorrados por compresión)",
         "domain_results": "Dominio\t\tTotal de Resultados",
+        "column_domain": "Dominio",
+        "column_total": "Total de Resultados",
+        "column_tier": "Nivel",
         "divider": "=" * 50,
         "config_menu_label": "Configuración",
         "change_language": "Change Language",
@@ -43,9 +44,46 @@ TRANSLATIONS = {
         "add_cx_button": "Agregar clave CX",
         "paste_api_key_here": "Pega la clave API aquí y haz clic en Agregar",
         "urls_indexed": "URLs indexadas",
-        "export_csv": "Exportar CSV",
-        "csv_export_success": "CSV exportado exitosamente.",
+        "export_csv": "Exportar",
+        "import_cache": "Importar resultados previos",
+        "import_cache_success": "Se han cargado {count} dominios en la caché.",
+        "csv_export_success": "Se han exportado {count} dominios.",
         "analyzing_text": "Analizando",
+        "cancel_analysis": "Cancelar",
+        "analysis_cancelled": "Análisis cancelado. Los resultados obtenidos se conservan; {count} dominios sin analizar se mantienen en la casilla de entrada.",
+        "resume_title": "Análisis interrumpido",
+        "resume_prompt": "El último análisis no terminó ({done} de {total} dominios analizados). ¿Quieres continuarlo? Los dominios ya analizados no se volverán a consultar.",
+        "resume_cx_changed": "El último análisis no terminó, pero se hizo con otra clave CX. Sus resultados no se pueden mezclar con los de la CX actual y se descartarán.",
+        "progress_text": "{done}/{total} · {rate:.1f} dominios/s · ETA {eta}",
+        "metrics": "Métricas",
+        "compare_runs": "Comparar con el análisis anterior",
+        "query_plan": "{inputs} dominios agrupados en {queries} consultas ({saved} consultas ahorradas)",
+        "queries_saved": "Consultas ahorradas por agrupación: {saved}",
+        "quota_plan": "Consultas necesarias: {needed}, cuota restante hoy: {budget}; {deferred} dominios quedan en cola",
+        "backlog_queued": "{count} dominios no caben en la cuota de hoy y se han guardado en la cola. Se analizarán automáticamente cuando se renueve la cuota ({time}).",
+        "backlog_resumed": "Cuota renovada: analizando {count} dominios de la cola",
+        "results_filter": "Buscar:",
+        "results_filter_count": "{shown} de {total}",
+        "tooltip_results_filter": (
+            "Filtra los resultados mientras escribes. Varias palabras deben cumplirse todas:\n"
+            "  tienda  → contiene «tienda»\n"
+            "  ^shop o shop*  → empieza por «shop»\n"
+            "  .es o tld:es  → termina en .es\n"
+            "  1-50, >1000, <=5, =0  → número de URLs indexadas\n"
+            "Copiar y exportar usan solo los resultados filtrados."
+        ),
+        "history_summary": "Cambios respecto al análisis anterior: {deindexed} desindexados, {dropped} con caída de más del {percent}%, {indexed} indexados de nuevo, {gained} con subida de más del {percent}%.",
+        "history_empty": "Se necesitan al menos dos análisis terminados para comparar.",
+        "history_not_compared": "{count} dominios servidos desde la caché, sin comparar.",
+        "change_deindexed": "desindexado",
+        "change_dropped": "caída",
+        "change_indexed": "indexado",
+        "change_gained": "subida",
+        "metrics_overview": "Consultas: {requests} ({rpm:.1f}/min)    Resultados: {results} ({rate:.2f}/s)",
+        "metrics_statuses": "Respuestas: 200={ok}  400={bad}  429={throttled}  otras={other}  errores de red={error}",
+        "metrics_latency": "Latencia: p50 ≤ {p50}  p95 ≤ {p95}  p99 ≤ {p99}",
+        "metrics_cache": "Caché: {hits} aciertos / {misses} fallos    Reintentos: {retries}    Peticiones duplicadas: {hedges}",
+        "metrics_keys": "Clave (huella)   Consultas   200   429   p95",
         "paste": "Pegar",
         "copy": "Copiar",
         "invalid_cx_error": "La clave CX es inválida. Por favor, configura una clave CX válida.",
@@ -83,7 +121,7 @@ TRANSLATIONS = {
         "tooltip_copy_green": "Copia los dominios marcados en verde.",
         "tooltip_copy_yellow": "Copia los dominios marcados en amarillo.",
         "tooltip_copy_orange": "Copia los dominios marcados en naranja.",
-        "tooltip_export_csv": "Exporta los resultados a un archivo CSV.",
+        "tooltip_export_csv": "Exporta los resultados a CSV, JSON Lines (opcionalmente comprimidos con gzip) o Parquet. Si hay un análisis en curso, los nuevos resultados se siguen añadiendo al archivo.",
         "tooltip_clear_results": "Borra los resultados mostrados.",
         "help_menu_label": "Ayuda",
         "help_documentation": "Documentación",
@@ -132,7 +170,11 @@ TRANSLATIONS = {
         "enter_domains": "Please enter at least one domain before analyzing.",
         "api_limit_reached": "All API keys have reached their daily limit.",
         "api_keys_used": "API keys used: {count}",
+        "transport_stats": "Connections reused: {handshakes}, KB downloaded: {kb} ({compressed_kb} saved by compression)",
         "domain_results": "Domain\t\tTotal Results",
+        "column_domain": "Domain",
+        "column_total": "Total Results",
+        "column_tier": "Tier",
         "divider": "=" * 50,
         "config_menu_label": "Settings",
         "change_language": "Cambiar Idioma",
@@ -145,9 +187,46 @@ TRANSLATIONS = {
         "add_cx_button": "Add CX Key",
         "paste_api_key_here": "Paste the API key here and click Add",
         "urls_indexed": "indexed URLs",
-        "export_csv": "Export CSV",
-        "csv_export_success": "CSV exported successfully.",
+        "export_csv": "Export",
+        "import_cache": "Import Previous Results",
+        "import_cache_success": "{count} domains have been loaded into the cache.",
+        "csv_export_success": "{count} domains exported.",
         "analyzing_text": "Analyzing",
+        "cancel_analysis": "Cancel",
+        "analysis_cancelled": "Analysis cancelled. The results obtained so far are kept; {count} unanalyzed domains remain in the input field.",
+        "resume_title": "Interrupted analysis",
+        "resume_prompt": "The last analysis did not finish ({done} of {total} domains analyzed). Do you want to resume it? Domains already analyzed will not be queried again.",
+        "resume_cx_changed": "The last analysis did not finish, but it used a different CX key. Its results can't be mixed with the current CX's and will be discarded.",
+        "progress_text": "{done}/{total} · {rate:.1f} domains/s · ETA {eta}",
+        "metrics": "Metrics",
+        "compare_runs": "Compare with Previous Analysis",
+        "query_plan": "{inputs} domains grouped into {queries} queries ({saved} queries saved)",
+        "queries_saved": "Queries saved by grouping: {saved}",
+        "quota_plan": "Queries needed: {needed}, quota left today: {budget}; {deferred} domains queued",
+        "backlog_queued": "{count} domains did not fit in today's quota and have been queued. They will be analyzed automatically when the quota resets ({time}).",
+        "backlog_resumed": "Quota reset: analyzing {count} queued domains",
+        "results_filter": "Search:",
+        "results_filter_count": "{shown} of {total}",
+        "tooltip_results_filter": (
+            "Filters the results as you type. Several words must all match:\n"
+            "  store  → contains \"store\"\n"
+            "  ^shop or shop*  → starts with \"shop\"\n"
+            "  .es or tld:es  → ends in .es\n"
+            "  1-50, >1000, <=5, =0  → number of indexed URLs\n"
+            "Copy and export only use the filtered results."
+        ),
+        "history_summary": "Changes since the previous analysis: {deindexed} deindexed, {dropped} dropped more than {percent}%, {indexed} newly indexed, {gained} grew more than {percent}%.",
+        "history_empty": "At least two finished analyses are needed to compare.",
+        "history_not_compared": "{count} domains served from cache, not compared.",
+        "change_deindexed": "deindexed",
+        "change_dropped": "dropped",
+        "change_indexed": "indexed",
+        "change_gained": "grew",
+        "metrics_overview": "Requests: {requests} ({rpm:.1f}/min)    Results: {results} ({rate:.2f}/s)",
+        "metrics_statuses": "Responses: 200={ok}  400={bad}  429={throttled}  other={other}  network errors={error}",
+        "metrics_latency": "Latency: p50 ≤ {p50}  p95 ≤ {p95}  p99 ≤ {p99}",
+        "metrics_cache": "Cache: {hits} hits / {misses} misses    Retries: {retries}    Hedged requests: {hedges}",
+        "metrics_keys": "Key (fingerprint)  Requests   200   429   p95",
         "paste": "Paste",
         "copy": "Copy",
         "invalid_cx_error": "The CX key is invalid. Please configure a valid CX key.",
@@ -185,7 +264,7 @@ TRANSLATIONS = {
         "tooltip_copy_green": "Copies domains marked in green.",
         "tooltip_copy_yellow": "Copies domains marked in yellow.",
         "tooltip_copy_orange": "Copies domains marked in orange.",
-        "tooltip_export_csv": "Exports the results to a CSV file.",
+        "tooltip_export_csv": "Exports the results to CSV, JSON Lines (optionally gzip-compressed) or Parquet. During an analysis, new results keep being appended to the file.",
         "tooltip_clear_results": "Clears the displayed results.",
         "help_menu_label": "Help",
         "help_documentation": "Documentation",
@@ -219,19 +298,8 @@ TRANSLATIONS = {
     }
 }
 
-def load_config():
-    try:
-        with open(CONFIG_FILE, 'r') as file:
-            config = json.load(file)
-            return config
-    except FileNotFoundError:
-        return {'API_KEYS': [], 'CX': '', 'language': "en"}
-
-def save_config(config):
-    with open(CONFIG_FILE, 'w') as file:
-        json.dump(config, file)
-
 def set_app_icon(root):
+    import tkinter as tk
     if sys.platform.startswith("win"):
         root.iconbitmap(resource_path("gindexchecker2.ico"))
     else:
@@ -0,0 +1,84 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+VERIFY_CX = "invalid_cx_placeholder"
+VERIFY_QUERY = "test"
+VERIFY_TIMEOUT = 10
+VERIFY_WORKERS = 8
+DEFAULT_CACHE_MINUTES = 10
+STATUS_OK = "ok"
+STATUS_INVALID = "invalid"
+STATUS_QUOTA = "quota"
+STATUS_FAIL = "fail"
+
+
+def verify_key(transport, key, timeout=VERIFY_TIMEOUT):
+    # A valid key with a bogus CX gets "invalid argument"; a bad key is rejected before the CX is checked.
+    try:
+        response = transport.search(key, VERIFY_CX, VERIFY_QUERY, timeout=timeout)
+    except Exception:
+        return STATUS_FAIL, "Falla"
+    try:
+        error_info = response.json()["error"]["errors"][0]
+        message = error_info.get("message", "").strip().lower()
+    except Exception:
+        return STATUS_FAIL, "Falla"
+    if "quota exceeded" in message:
+        return STATUS_QUOTA, message
+    if response.status_code == 400:
+        if "request contains an invalid argument" in message:
+            return STATUS_OK, "OK"
+        if "api key not valid" in message or "api key not found" in message:
+            return STATUS_INVALID, "no valid"
+    return STATUS_FAIL, message
+
+
+class KeyVerifier:
+
+    def __init__(self, transport, cache_minutes=DEFAULT_CACHE_MINUTES, timeout=VERIFY_TIMEOUT,
+                 workers=VERIFY_WORKERS):
+        self.transport = transport
+        self.ttl = cache_minutes * 60
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.results = {}
+
+    def cached(self, key):
+        with self.lock:
+            entry = self.results.get(key)
+        if entry and time.monotonic() - entry[2] < self.ttl:
+            return entry[0], entry[1]
+        return None
+
+    def forget(self, key):
+        with self.lock:
+            self.results.pop(key, None)
+
+    def verify(self, keys, on_result, on_done=None, force=False):
+        keys = list(keys)
+        pending = []
+        for key in keys:
+            cached = None if force else self.cached(key)
+            if cached:
+                on_result(key, *cached)
+            else:
+                pending.append(key)
+        if not pending:
+            if on_done:
+                on_done()
+            return []
+        remaining = [len(pending)]
+
+        def probe(key):
+            status, message = verify_key(self.transport, key, self.timeout)
+            with self.lock:
+                self.results[key] = (status, message, time.monotonic())
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            on_result(key, status, message)
+            if last and on_done:
+                on_done()
+
+        return [self.executor.submit(probe, key) for key in pending]
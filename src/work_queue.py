@@ -0,0 +1,489 @@
+import os
+import abc
+import sys
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from planner import GROUP_OFF, plan_queries
+
+WORK_QUEUE_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), 'work_queue.sqlite3')
+DEFAULT_SHARD_SIZE = 100
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_POLL_SECONDS = 5
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+CHUNK = 500
+
+
+class LeaseLost(Exception):
+    """The shard's lease expired and was handed to another worker."""
+
+
+class Lease:
+    __slots__ = ("job_id", "shard", "token", "lines", "grouping")
+
+    def __init__(self, job_id, shard, token, lines, grouping=GROUP_OFF):
+        self.job_id = job_id
+        self.shard = shard
+        self.token = token
+        self.lines = lines
+        self.grouping = grouping
+
+
+class WorkQueue(abc.ABC):
+    """Backend interface for a job queue shared by several workers.
+
+    A job is a list of input lines split into shards. Workers lease one shard at a time; a lease carries a
+    token and an expiry, and every call that writes results must present a token that is still current, so
+    a worker that stalled past its lease cannot overwrite the shard once another worker owns it.
+    """
+
+    @abc.abstractmethod
+    def submit(self, lines, job_id=None, shard_size=DEFAULT_SHARD_SIZE, grouping=GROUP_OFF, rules=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def lease(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def record(self, lease, results, lease_seconds=DEFAULT_LEASE_SECONDS):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def complete(self, lease):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release(self, lease):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def status(self, job_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def results(self, job_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def jobs(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    # Uses the rollback journal rather than WAL so the file also works on a network share with working
+    # POSIX locks. Every state change runs in a BEGIN IMMEDIATE transaction, which serialises leasing.
+
+    def __init__(self, path=WORK_QUEUE_FILE, timeout=30):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, created REAL NOT NULL, grouping TEXT NOT NULL, shards INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " job_id TEXT NOT NULL, shard INTEGER NOT NULL, state TEXT NOT NULL, worker TEXT, token TEXT,"
+            " lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (job_id, shard))"
+        )
+        # total has no declared type so both counts and the quota_exceeded marker are stored as given.
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " job_id TEXT NOT NULL, line TEXT NOT NULL, shard INTEGER NOT NULL, position INTEGER NOT NULL,"
+            " total, worker TEXT, PRIMARY KEY (job_id, line))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS items_shard ON items (job_id, shard)")
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    def submit(self, lines, job_id=None, shard_size=DEFAULT_SHARD_SIZE, grouping=GROUP_OFF, rules=None):
+        job_id = job_id or uuid.uuid4().hex[:12]
+        # Lines that share a query stay in one shard, so grouping never sends the same query from two nodes.
+        plan = plan_queries(list(dict.fromkeys(line.strip() for line in lines if line.strip())), grouping, rules)
+        rows = []
+        shard = 0
+        size = 0
+        for target in plan.targets:
+            members = plan.groups[target]
+            if size and size + len(members) > shard_size:
+                shard += 1
+                size = 0
+            rows.extend((job_id, line, shard, len(rows)) for line in members)
+            size += len(members)
+        shards = shard + 1 if rows else 0
+        with self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone():
+                raise ValueError(f"job {job_id} already exists")
+            conn.execute("INSERT INTO jobs (id, created, grouping, shards) VALUES (?, ?, ?, ?)",
+                         (job_id, time.time(), grouping, shards))
+            conn.executemany("INSERT INTO shards (job_id, shard, state) VALUES (?, ?, ?)",
+                             [(job_id, index, PENDING) for index in range(shards)])
+            conn.executemany("INSERT INTO items (job_id, line, shard, position) VALUES (?, ?, ?, ?)", rows)
+        return job_id
+
+    def lease(self, job_id, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        with self._transaction() as conn:
+            job = conn.execute("SELECT grouping FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                raise KeyError(job_id)
+            row = conn.execute(
+                "SELECT shard FROM shards WHERE job_id = ? AND (state = ? OR (state = ? AND lease_until < ?))"
+                " ORDER BY state = ?, shard LIMIT 1", (job_id, PENDING, LEASED, now, LEASED)).fetchone()
+            if row is None:
+                return None
+            shard = row[0]
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE shards SET state = ?, worker = ?, token = ?, lease_until = ?, attempts = attempts + 1"
+                " WHERE job_id = ? AND shard = ?", (LEASED, worker, token, now + lease_seconds, job_id, shard))
+            lines = [line for line, in conn.execute(
+                "SELECT line FROM items WHERE job_id = ? AND shard = ? AND total IS NULL ORDER BY position",
+                (job_id, shard))]
+        return Lease(job_id, shard, token, lines, job[0])
+
+    def _check(self, conn, lease):
+        row = conn.execute("SELECT state, token FROM shards WHERE job_id = ? AND shard = ?",
+                           (lease.job_id, lease.shard)).fetchone()
+        if row is None or row[0] != LEASED or row[1] != lease.token:
+            raise LeaseLost(f"lease on shard {lease.shard} of job {lease.job_id} was lost")
+
+    def record(self, lease, results, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Stores results for lines of the leased shard and extends the lease; an empty list is a heartbeat."""
+        with self._transaction() as conn:
+            self._check(conn, lease)
+            worker = conn.execute("SELECT worker FROM shards WHERE job_id = ? AND shard = ?",
+                                  (lease.job_id, lease.shard)).fetchone()[0]
+            conn.executemany(
+                "UPDATE items SET total = ?, worker = ? WHERE job_id = ? AND line = ? AND total IS NULL",
+                [(total, worker, lease.job_id, line) for line, total in results])
+            conn.execute("UPDATE shards SET lease_until = ? WHERE job_id = ? AND shard = ?",
+                         (time.time() + lease_seconds, lease.job_id, lease.shard))
+
+    def complete(self, lease):
+        with self._transaction() as conn:
+            self._check(conn, lease)
+            missing = conn.execute("SELECT COUNT(*) FROM items WHERE job_id = ? AND shard = ? AND total IS NULL",
+                                   (lease.job_id, lease.shard)).fetchone()[0]
+            conn.execute("UPDATE shards SET state = ?, token = NULL, lease_until = NULL WHERE job_id = ? AND shard = ?",
+                         (PENDING if missing else DONE, lease.job_id, lease.shard))
+            return not missing
+
+    def release(self, lease):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE shards SET state = ?, worker = NULL, token = NULL, lease_until = NULL"
+                " WHERE job_id = ? AND shard = ? AND token = ?", (PENDING, lease.job_id, lease.shard, lease.token))
+
+    def status(self, job_id):
+        now = time.time()
+        with self.lock:
+            job = self.conn.execute("SELECT created, grouping, shards FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                raise KeyError(job_id)
+            states = dict(self.conn.execute(
+                "SELECT CASE WHEN state = ? AND lease_until < ? THEN 'expired' ELSE state END, COUNT(*)"
+                " FROM shards WHERE job_id = ? GROUP BY 1", (LEASED, now, job_id)).fetchall())
+            lines, checked = self.conn.execute(
+                "SELECT COUNT(*), COUNT(total) FROM items WHERE job_id = ?", (job_id,)).fetchone()
+            workers = dict(self.conn.execute(
+                "SELECT worker, COUNT(*) FROM items WHERE job_id = ? AND total IS NOT NULL GROUP BY worker",
+                (job_id,)).fetchall())
+        return {"job": job_id, "created": job[0], "grouping": job[1], "shards": job[2],
+                "pending": states.get(PENDING, 0), "leased": states.get(LEASED, 0),
+                "expired": states.get("expired", 0), "done": states.get(DONE, 0),
+                "lines": lines, "checked": checked, "workers": workers}
+
+    def results(self, job_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT line, total FROM items WHERE job_id = ? AND total IS NOT NULL ORDER BY position",
+                (job_id,)).fetchall()
+
+    def jobs(self):
+        with self.lock:
+            return [job_id for job_id, in self.conn.execute("SELECT id FROM jobs ORDER BY created")]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class _Transaction:
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __enter__(self):
+        self.queue.lock.acquire()
+        try:
+            self.queue.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.queue.lock.release()
+            raise
+        return self.queue.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.queue.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.queue.lock.release()
+
+
+BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+
+def register_backend(scheme, factory):
+    """Makes ``open_queue("<scheme>://...")`` build the queue with ``factory(location)``."""
+    BACKENDS[scheme] = factory
+
+
+def open_queue(location=None):
+    location = location or WORK_QUEUE_FILE
+    scheme, separator, rest = location.partition("://")
+    if not separator:
+        return SQLiteWorkQueue(location)
+    if scheme not in BACKENDS:
+        raise ValueError(f"unknown work queue backend: {scheme}")
+    return BACKENDS[scheme](rest)
+
+
+def queue_from_config(config, location=None):
+    return open_queue(location or config.get('WORK_QUEUE'))
+
+
+class QueueWorker:
+    """Leases shards of a job and checks them with engines built by ``engine_factory`` until the job is done."""
+
+    def __init__(self, queue, job_id, engine_factory, worker_id=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 poll_seconds=DEFAULT_POLL_SECONDS, rules=None, on_result=None, on_error=None):
+        self.queue = queue
+        self.job_id = job_id
+        self.engine_factory = engine_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.rules = rules
+        self.on_result = on_result
+        self.on_error = on_error
+        self.stop_event = threading.Event()
+        self.engine = None
+        self.checked = 0
+        self.lost_shards = []
+        self.out_of_quota = False
+        self.invalid_cx = False
+
+    def stop(self):
+        self.stop_event.set()
+        if self.engine is not None:
+            self.engine.stop()
+
+    def run(self, wait=True):
+        while not self.stop_event.is_set():
+            lease = self.queue.lease(self.job_id, self.worker_id, self.lease_seconds)
+            if lease is None:
+                status = self.queue.status(self.job_id)
+                if not wait or status["done"] == status["shards"]:
+                    break
+                # Other workers hold the remaining shards; wait in case one of their leases expires.
+                self.stop_event.wait(self.poll_seconds)
+                continue
+            if not self.run_shard(lease):
+                break
+        return self.checked
+
+    def run_shard(self, lease):
+        engine = self.engine = self.engine_factory()
+        plan = plan_queries(lease.lines, lease.grouping, self.rules)
+        buffer = []
+        buffer_lock = threading.Lock()
+        lost = threading.Event()
+        finished = threading.Event()
+
+        interval = min(2.0, self.lease_seconds / 3.0)
+
+        def flush(retry=True):
+            with buffer_lock:
+                rows = buffer[:]
+                del buffer[:]
+            try:
+                self.queue.record(lease, rows, self.lease_seconds)
+            except LeaseLost:
+                lost.set()
+                engine.stop()
+            except Exception as e:
+                with buffer_lock:
+                    buffer[:0] = rows
+                if not retry:
+                    raise
+                # A locked database or a dropped connection is retried with the same rows; the lease is only
+                # lost if the queue stays unreachable until it expires.
+                if self.on_error is not None:
+                    self.on_error(f"could not write results for shard {lease.shard}, retrying: {e}")
+                return False
+            return True
+
+        def heartbeat():
+            # Renews the lease well before it expires and writes results in batches instead of one per lookup.
+            while not finished.wait(interval) and not lost.is_set():
+                flush()
+
+        def on_result(target, total, fetched):
+            for line, total in plan.expand(target, total):
+                with buffer_lock:
+                    buffer.append((line, total))
+                if self.on_result is not None:
+                    self.on_result(line, total)
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            _, _, not_processed = engine.run(plan.targets, on_result=on_result)
+        finally:
+            finished.set()
+            thread.join()
+            self.engine = None
+        # The last rows are retried for as long as a lease lasts before the error is raised.
+        give_up = time.monotonic() + self.lease_seconds
+        while not lost.is_set() and not flush(retry=time.monotonic() < give_up):
+            time.sleep(interval)
+        if lost.is_set():
+            self.lost_shards.append(lease.shard)
+            return not self.stop_event.is_set()
+        self.checked += len(plan.lines_for(plan.targets)) - len(plan.lines_for(not_processed))
+        if not_processed:
+            self.queue.release(lease)
+            self.invalid_cx = engine.invalid_cx
+            self.out_of_quota = not engine.invalid_cx and not engine.cancelled
+            return False
+        self.queue.complete(lease)
+        return True
+
+
+def main(argv=None):
+    import argparse
+    from config import CONFIG_FILE, load_config, save_config
+    parser = argparse.ArgumentParser(prog="work_queue", description="Split one domain list across several workers.")
+    parser.add_argument("--queue", help="queue location: a SQLite path or <backend>://... (default: WORK_QUEUE from config)")
+    parser.add_argument("-c", "--config", default=CONFIG_FILE, help="path to config.json")
+    commands = parser.add_subparsers(dest="command")
+    submit = commands.add_parser("submit", help="add a job and print its id")
+    submit.add_argument("inputs", nargs="*", help="files with domains, one per line ('-' or nothing reads stdin)")
+    submit.add_argument("--job", help="job id (default: random)")
+    submit.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="lines per shard")
+    submit.add_argument("--group", choices=("off", "host", "registrable"), default=GROUP_OFF)
+    work = commands.add_parser("work", help="check shards of a job with this machine's keys")
+    work.add_argument("job")
+    work.add_argument("-w", "--workers", type=int, help="parallel lookups (default: WORKERS from config)")
+    work.add_argument("--worker", help="worker name recorded with its results (default: host-pid)")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="lease length in seconds")
+    work.add_argument("--no-wait", action="store_true", help="exit when no shard is free instead of waiting for the job to finish")
+    status = commands.add_parser("status", help="show the progress of a job")
+    status.add_argument("job")
+    results = commands.add_parser("results", help="write the merged results of a job")
+    results.add_argument("job")
+    results.add_argument("-o", "--output", help="output file (default: CSV on stdout)")
+    results.add_argument("-f", "--format", help="output format (default: from the -o extension)")
+    commands.add_parser("jobs", help="list jobs")
+    args = parser.parse_args(argv)
+    config = load_config(args.config)
+    try:
+        queue = queue_from_config(config, args.queue)
+    except (ValueError, sqlite3.Error) as e:
+        print(e, file=sys.stderr)
+        return 1
+    try:
+        if args.command == "submit":
+            from cli import read_domains
+            rules = None
+            if args.group == "registrable":
+                from public_suffix import load_rules
+                rules = load_rules(config)
+            print(queue.submit(read_domains(args.inputs, False), args.job, args.shard_size, args.group, rules))
+        elif args.command == "work":
+            return work_job(queue, args, config, save_config)
+        elif args.command == "status":
+            for name, value in queue.status(args.job).items():
+                print(f"{name}: {value}")
+        elif args.command == "results":
+            from exporters import CsvExporter, open_exporter
+            writer = open_exporter(args.output, args.format) if args.output else CsvExporter(sys.stdout)
+            try:
+                for line, total in queue.results(args.job):
+                    writer.write(line, total)
+            finally:
+                writer.close()
+        else:
+            for job_id in queue.jobs():
+                progress = queue.status(job_id)
+                print(f"{job_id}  {progress['checked']:>8}/{progress['lines']} lines  "
+                      f"{progress['done']}/{progress['shards']} shards done")
+    except KeyError as e:
+        print(f"unknown job: {e.args[0]}", file=sys.stderr)
+        return 1
+    finally:
+        queue.close()
+    return 0
+
+
+def work_job(queue, args, config, save_config):
+    from engine import LookupEngine, DEFAULT_DEADLINE, DEFAULT_WORKERS
+    from key_pool import KeyPool
+    from rate_limit import RateLimiter
+    from transport import SearchTransport, DEFAULT_TIMEOUT
+    from public_suffix import load_rules
+    api_keys = [key.strip() for key in config.get('API_KEYS', []) if key.strip()]
+    cx = config.get('CX', '').strip()
+    if not api_keys or not cx:
+        print("config.json needs at least one API key and the CX key", file=sys.stderr)
+        return 1
+    workers = args.workers or config.get('WORKERS', DEFAULT_WORKERS)
+    key_pool = KeyPool.from_config(api_keys, config)
+    rate_limiter = RateLimiter.from_config(config)
+    transport = SearchTransport(pool_size=workers)
+    cache = None
+    if config.get('CACHE_ENABLED', True):
+        from cache import ResultCache
+        cache = ResultCache.from_config(config)
+
+    def engine_factory():
+        return LookupEngine(key_pool, cx, workers=workers, transport=transport, cache=cache,
+                            rate_limiter=rate_limiter, timeout=config.get('REQUEST_TIMEOUT', DEFAULT_TIMEOUT),
+                            hedge=config.get('HEDGE', False), deadline=config.get('LOOKUP_DEADLINE', DEFAULT_DEADLINE))
+
+    def on_error(message):
+        print(f"{worker.worker_id}: {message}", file=sys.stderr)
+
+    worker = QueueWorker(queue, args.job, engine_factory, worker_id=args.worker, lease_seconds=args.lease,
+                         rules=load_rules(config), on_error=on_error)
+    try:
+        checked = worker.run(wait=not args.no_wait)
+    except KeyboardInterrupt:
+        worker.stop()
+        return 130
+    finally:
+        config['KEY_STATE'] = key_pool.to_config()
+        save_config(config, args.config)
+    for shard in worker.lost_shards:
+        print(f"{worker.worker_id}: lost the lease on shard {shard}; another worker took it over", file=sys.stderr)
+    print(f"{worker.worker_id}: checked {checked} lines", file=sys.stderr)
+    if worker.invalid_cx:
+        print("the CX key is invalid", file=sys.stderr)
+        return 2
+    if worker.out_of_quota:
+        print("this machine's API keys are invalid or out of quota; its shard was returned to the queue", file=sys.stderr)
+        return 3
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import time
+import pytest
+from cache import ResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite3"), ttl_hours=24, zero_ttl_hours=2, error_ttl_hours=0.5,
+                        max_entries=3)
+    yield cache
+    cache.close()
+
+
+def hours_ago(hours):
+    return time.time() - hours * 3600
+
+
+def test_hits_are_shared_by_equivalent_spellings(cache):
+    cache.put("Example.com", "cx", 40)
+    assert cache.get_many(["example.com", "https://example.com/", "other.com"], "cx") == {
+        "example.com": 40, "https://example.com/": 40}
+    assert cache.get("example.com", "other-cx") is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+@pytest.mark.parametrize("total, error, fresh_at, stale_at", [
+    (40, False, 23, 25),
+    (0, False, 1, 3),
+    (0, True, 0.25, 1),
+])
+def test_each_outcome_expires_after_its_own_ttl(cache, total, error, fresh_at, stale_at):
+    cache.put("fresh.com", "cx", total, error=error, checked_at=hours_ago(fresh_at))
+    cache.put("stale.com", "cx", total, error=error, checked_at=hours_ago(stale_at))
+    assert cache.get_many(["fresh.com", "stale.com"], "cx") == {"fresh.com": total}
+
+
+def test_an_older_answer_does_not_replace_a_newer_one(cache):
+    cache.put("a.com", "cx", 10, checked_at=hours_ago(1))
+    cache.put("a.com", "cx", 99, checked_at=hours_ago(5))
+    assert cache.get("a.com", "cx") == 10
+    cache.put("a.com", "cx", 12)
+    assert cache.get("a.com", "cx") == 12
+
+
+def test_eviction_drops_expired_entries_then_the_oldest(cache):
+    cache.put("expired.com", "cx", 5, checked_at=hours_ago(30))
+    for age, domain in enumerate(["d1.com", "d2.com", "d3.com", "d4.com"]):
+        cache.put(domain, "cx", 5, checked_at=hours_ago(4 - age))
+    cache.evict()
+    rows = cache.conn.execute("SELECT domain FROM results ORDER BY checked_at").fetchall()
+    assert [domain for domain, in rows] == ["d2.com", "d3.com", "d4.com"]
+
+
+def test_warming_skips_rows_that_are_already_expired(cache, tmp_path):
+    path = tmp_path / "GIndexChecker_2020-01-01_10-00.csv"
+    path.write_text("domain,total\nold.com,12\n")
+    assert cache.warm_from_csv([str(path)], "cx") == 0
+    recent = tmp_path / f"GIndexChecker_{time.strftime('%Y-%m-%d_%H-%M', time.localtime(hours_ago(1)))}.csv"
+    recent.write_text("domain,total\na.com,12\nb.com,0\nbroken.com,n/a\n")
+    assert cache.warm_from_csv([str(recent)], "cx") == 2
+    assert cache.get_many(["a.com", "b.com", "broken.com"], "cx") == {"a.com": 12, "b.com": 0}
@@ -0,0 +1,260 @@
+import json
+import threading
+import time
+import pytest
+import engine
+import rate_limit
+from engine import LookupEngine
+from key_pool import KeyPool, STATUS_EXHAUSTED, STATUS_INVALID
+from rate_limit import RateLimiter
+from transport import TransportError
+
+INVALID_KEY = {"error": {"errors": [{"message": "API key not valid. Please pass a valid API key."}]}}
+INVALID_CX = {"error": {"errors": [{"message": "Request contains an invalid argument."}]}}
+PER_MINUTE = {"error": {"message": "Quota exceeded for quota metric 'Queries per minute per user'", "errors": []}}
+PER_DAY = {"error": {"message": "Quota exceeded for quota metric 'Queries per day'", "errors": []}}
+
+
+class Response:
+
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def found(total):
+    return Response(200, {"searchInformation": {"totalResults": str(total)}})
+
+
+class ScriptedTransport:
+    """Answers each domain from a list of responses, one per request; the last one repeats."""
+
+    def __init__(self, script, default=found(7)):
+        self.script = {domain: list(answers) for domain, answers in script.items()}
+        self.default = default
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def search(self, api_key, cx, query, timeout=None):
+        domain = query[len("site:"):]
+        with self.lock:
+            self.calls.append((api_key, domain, timeout))
+            answers = self.script.get(domain) or [self.default]
+            answer = answers.pop(0) if len(answers) > 1 else answers[0]
+        if callable(answer):
+            return answer(timeout)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(engine, "backoff_delay", lambda attempt, retry_after=None: 0.01)
+    monkeypatch.setattr(rate_limit, "backoff_delay", lambda attempt, retry_after=None: 0.01)
+
+
+def make_engine(transport, keys=("k1", "k2"), cx="cx", **options):
+    errors = []
+    options.setdefault("workers", 1)
+    lookup = LookupEngine(KeyPool(list(keys)), cx, transport=transport, rate_limiter=RateLimiter(per_minute=100000),
+                          on_error=lambda domain, status, text: errors.append((domain, status)), **options)
+    return lookup, errors
+
+
+def test_reads_the_total_and_counts_key_use():
+    lookup, errors = make_engine(ScriptedTransport({"a.com": [found(12)], "b.com": [found(0)]}))
+    results, keys_used, not_processed = lookup.run(["a.com", "b.com"])
+    assert results == {"a.com": 12, "b.com": 0}
+    assert not_processed == [] and errors == []
+    assert sum(lookup.key_pool.usage().values()) == 2 and keys_used <= {"k1", "k2"}
+
+
+@pytest.mark.parametrize("body", ["<html>proxy login</html>", {"searchInformation": {"totalResults": "many"}},
+                                  {"searchInformation": {"totalResults": None}}, ["not", "an", "object"]])
+def test_unreadable_200_is_reported_as_this_domains_error(body):
+    lookup, errors = make_engine(ScriptedTransport({"a.com": [Response(200, body)]}))
+    results, _, not_processed = lookup.run(["a.com", "b.com"])
+    assert results == {"a.com": 0, "b.com": 7}
+    assert errors == [("a.com", 200)] and not_processed == []
+
+
+def test_unexpected_exception_leaves_the_domain_unprocessed_and_the_worker_running():
+    lookup, errors = make_engine(ScriptedTransport({"a.com": [RuntimeError("boom")]}))
+    results, _, not_processed = lookup.run(["a.com", "b.com", "c.com"])
+    assert not_processed == ["a.com"]
+    assert results == {"b.com": 7, "c.com": 7}
+    assert errors == [("a.com", "RuntimeError")]
+
+
+def test_per_minute_throttle_is_retried_on_the_same_domain():
+    transport = ScriptedTransport({"a.com": [Response(429, PER_MINUTE, {"Retry-After": "0"}), found(3)]})
+    lookup, errors = make_engine(transport)
+    results, _, _ = lookup.run(["a.com"])
+    assert results == {"a.com": 3} and lookup.retries == 1 and errors == []
+
+
+def test_retries_stop_after_max_retries():
+    lookup, _ = make_engine(ScriptedTransport({"a.com": [TransportError("reset")]}), max_retries=2)
+    results, _, not_processed = lookup.run(["a.com", "b.com"])
+    assert not_processed == ["a.com"] and results == {"b.com": 7}
+    assert lookup.retries == 3
+
+
+def test_daily_quota_and_invalid_keys_move_on_to_another_key():
+    answers = {"k1": Response(429, PER_DAY), "k2": Response(400, INVALID_KEY), "k3": found(5)}
+    transport = ScriptedTransport({}, default=None)
+    transport.search = lambda api_key, cx, query, timeout=None: answers[api_key]
+    lookup, errors = make_engine(transport, keys=("k1", "k2", "k3"))
+    results, keys_used, _ = lookup.run(["a.com", "b.com"])
+    assert results == {"a.com": 5, "b.com": 5} and keys_used == {"k3"}
+    assert lookup.key_pool.status("k1") == STATUS_EXHAUSTED
+    assert lookup.key_pool.status("k2") == STATUS_INVALID
+    assert errors == []
+
+
+def test_invalid_cx_stops_the_run():
+    lookup, _ = make_engine(ScriptedTransport({}, default=Response(400, INVALID_CX)))
+    results, _, not_processed = lookup.run(["a.com", "b.com"])
+    assert results == {} and not_processed == ["a.com", "b.com"]
+    assert lookup.invalid_cx and not lookup.cancelled
+
+
+def test_other_errors_record_zero():
+    lookup, errors = make_engine(ScriptedTransport({"a.com": [Response(500, "backend error")]}))
+    results, _, _ = lookup.run(["a.com"])
+    assert results == {"a.com": 0} and errors == [("a.com", 500)]
+
+
+def test_deadline_gives_up_on_a_lookup_that_keeps_failing():
+    def slow_failure(timeout):
+        time.sleep(min(timeout, 0.1))
+        raise TransportError("timed out")
+
+    transport = ScriptedTransport({"a.com": [slow_failure]})
+    lookup, _ = make_engine(transport, deadline=0.35, timeout=5, max_retries=100)
+    started = time.monotonic()
+    results, _, not_processed = lookup.run(["a.com"])
+    assert time.monotonic() - started < 1.0
+    assert not_processed == ["a.com"] and results == {}
+    # No request is allowed longer than what is left of the deadline.
+    assert all(timeout <= 0.35 for _, _, timeout in transport.calls)
+
+
+def test_stop_leaves_the_rest_unprocessed():
+    lookup, _ = make_engine(ScriptedTransport({}))
+
+    def stop_after_first(*result):
+        lookup.stop()
+
+    results, _, not_processed = lookup.run(["a.com", "b.com", "c.com"], on_result=stop_after_first)
+    assert results == {"a.com": 7} and not_processed == ["b.com", "c.com"]
+    assert lookup.cancelled
+
+
+
+
+def test_join_waits_for_requests_in_flight_after_stop():
+    def slow(timeout):
+        time.sleep(0.2)
+        return found(1)
+
+    lookup, _ = make_engine(ScriptedTransport({}, default=slow), workers=4)
+    delivered = []
+    thread = threading.Thread(target=lookup.run, args=([f"d{i}.com" for i in range(20)], lambda *r: delivered.append(r)))
+    thread.start()
+    while not lookup.threads:
+        time.sleep(0.01)
+    lookup.stop()
+    assert lookup.join(2)
+    count = len(delivered)
+    time.sleep(0.3)
+    assert len(delivered) == count <= 4
+
+
+def test_followers_of_a_failed_shared_lookup_keep_running():
+    from singleflight import InflightRegistry
+    release = threading.Event()
+
+    def fail_when_released(timeout):
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    registry = InflightRegistry()
+    transport = ScriptedTransport({"a.com": [fail_when_released]})
+    leader, _ = make_engine(transport, inflight=registry)
+    follower, follower_errors = make_engine(transport, inflight=registry)
+    outcomes = {}
+    thread = threading.Thread(target=lambda: outcomes.update(leader=leader.run(["a.com"])))
+    thread.start()
+    while not registry.in_flight():
+        time.sleep(0.01)
+    threading.Timer(0.1, release.set).start()
+    outcomes["follower"] = follower.run(["a.com", "b.com"])
+    thread.join(5)
+    assert outcomes["leader"][2] == ["a.com"]
+    assert outcomes["follower"][0] == {"b.com": 7} and outcomes["follower"][2] == ["a.com"]
+    assert follower_errors == [("a.com", "RuntimeError")] and follower.coalesced == 0
+
+
+@pytest.fixture
+def mock_engine():
+    pytest.importorskip("requests")
+    from mock_server import MockSearchServer
+    from transport import SearchTransport
+    servers = []
+
+    def factory(keys=("k1", "k2"), cx="mock-cx", engine_options=None, **server_options):
+        server = MockSearchServer(latency=0.001, jitter=0, **server_options).start()
+        servers.append(server)
+        return make_engine(SearchTransport(url=server.url), keys=keys, cx=cx, **dict(engine_options or {}))[0], server
+
+    yield factory
+    for server in servers:
+        server.stop()
+
+
+def expected_total(domain):
+    return sum(map(ord, f"site:{domain}")) % 500
+
+
+def test_mock_server_answers_every_domain(mock_engine):
+    lookup, server = mock_engine(engine_options={"workers": 4})
+    domains = [f"d{i}.com" for i in range(30)]
+    results, _, not_processed = lookup.run(domains)
+    assert results == {domain: expected_total(domain) for domain in domains} and not_processed == []
+    assert server.requests == 30
+
+
+def test_mock_server_throttling_is_retried(mock_engine):
+    lookup, server = mock_engine(throttle_rate=0.3, engine_options={"workers": 4, "max_retries": 50})
+    domains = [f"d{i}.com" for i in range(30)]
+    results, _, not_processed = lookup.run(domains)
+    assert len(results) == 30 and not_processed == []
+    assert lookup.retries == server.statuses[429] > 0
+
+
+def test_mock_server_daily_quota_leaves_the_rest_unprocessed(mock_engine):
+    lookup, _ = mock_engine(daily_quota=3, invalid_keys={"k3"}, keys=("k1", "k2", "k3"))
+    results, _, not_processed = lookup.run([f"d{i}.com" for i in range(10)])
+    assert len(results) == 6 and len(not_processed) == 4
+    assert [lookup.key_pool.status(key) for key in ("k1", "k2", "k3")] == [STATUS_EXHAUSTED, STATUS_EXHAUSTED,
+                                                                             STATUS_INVALID]
+
+
+def test_mock_server_rejects_a_wrong_cx(mock_engine):
+    lookup, _ = mock_engine(cx="other-cx")
+    results, _, not_processed = lookup.run(["a.com", "b.com"])
+    assert results == {} and not_processed == ["a.com", "b.com"] and lookup.invalid_cx
+
+
+def test_mock_server_slow_answers_hit_the_deadline(mock_engine):
+    lookup, _ = mock_engine(tail_rate=1.0, tail_latency=1.0, engine_options={"deadline": 0.3, "timeout": 5})
+    started = time.monotonic()
+    results, _, not_processed = lookup.run(["a.com"])
+    assert time.monotonic() - started < 0.9
+    assert results == {} and not_processed == ["a.com"]
@@ -0,0 +1,109 @@
+import io
+import csv
+from history import HistoryStore, classify_change, write_diff_csv, DEINDEXED, DROPPED, INDEXED, GAINED, DIFF_HEADER
+
+
+def test_classify_change_thresholds():
+    assert classify_change(120, 0) == DEINDEXED
+    assert classify_change(0, 5) == INDEXED
+    assert classify_change(100, 49) == DROPPED
+    assert classify_change(100, 50) is None
+    assert classify_change(100, 151) == GAINED
+    assert classify_change(100, 150) is None
+    assert classify_change(0, 0) is None
+
+
+def test_classify_change_custom_percent():
+    assert classify_change(100, 85, drop_percent=10) == DROPPED
+    assert classify_change(100, 85, drop_percent=20) is None
+
+
+def run(store, counts, checked=None):
+    run_id = store.start_run("cx")
+    for domain, total in counts.items():
+        store.record(run_id, domain, total, checked)
+    store.finish_run(run_id)
+    return run_id
+
+
+def test_diff_compares_last_two_runs(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    run(store, {"gone.com": 300, "drop.com": 1000, "new.com": 0, "up.com": 10, "same.com": 40})
+    run(store, {"gone.com": 0, "drop.com": 200, "new.com": 7, "up.com": 100, "same.com": 41})
+    changes = store.diff()
+    assert [(change["domain"], change["change"]) for change in changes] == [
+        ("gone.com", DEINDEXED), ("drop.com", DROPPED), ("new.com", INDEXED), ("up.com", GAINED)]
+    assert changes[1]["percent"] == -80.0
+    assert changes[2]["percent"] is None
+    store.close()
+
+
+def test_diff_ignores_domains_missing_from_a_run(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    run(store, {"a.com": 100})
+    run(store, {"b.com": 0})
+    assert store.diff() == []
+    store.close()
+
+
+def test_diff_needs_two_finished_runs(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    run(store, {"a.com": 100})
+    store.start_run("cx")
+    assert store.diff() == []
+    store.close()
+
+
+def test_record_skips_non_counts_and_normalizes_domains(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    run(store, {"Example.com": 200, "quota.com": "quota_exceeded"})
+    run(store, {"example.com": 0})
+    assert [change["domain"] for change in store.diff()] == ["example.com"]
+    assert store.runs()[1]["domains"] == 1
+    store.close()
+
+
+def test_write_diff_csv(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    run(store, {"a.com": 0})
+    run(store, {"a.com": 3})
+    stream = io.StringIO()
+    write_diff_csv(store.diff(), stream)
+    rows = list(csv.reader(io.StringIO(stream.getvalue())))
+    assert rows[0] == DIFF_HEADER
+    assert rows[1][:5] == ["a.com", "0", "3", "", INDEXED]
+    store.close()
+
+
+def test_cache_hits_are_not_compared(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    first = run(store, {"a.com": 100, "b.com": 100}, checked=1000.0)
+    # The second analysis replays a.com from the cache (fetched for the first one) and checks b.com again.
+    second = store.start_run("cx")
+    store.record(second, "a.com", 100, checked=1000.0)
+    store.record(second, "b.com", 0)
+    store.finish_run(second)
+    assert store.latest_runs(2) == [first, second]
+    assert [change["domain"] for change in store.diff()] == ["b.com"]
+    assert store.not_compared() == 1
+    # A fully cached analysis still counts as a run but has nothing new to compare.
+    run(store, {"a.com": 100, "b.com": 0}, checked=1000.0)
+    assert store.diff() == [] and store.not_compared() == 2
+    latest = run(store, {"a.com": 0})
+    assert [change["domain"] for change in store.diff(second, latest)] == ["a.com"]
+    assert store.trend("a.com")[:1] == [(1000.0, 100)] and len(store.trend("a.com")) == 2
+    store.close()
+
+
+def test_adds_checked_column_to_old_databases(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "history.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE observations (run_id INTEGER NOT NULL, domain_id INTEGER NOT NULL,"
+                 " total INTEGER NOT NULL, PRIMARY KEY (run_id, domain_id)) WITHOUT ROWID")
+    conn.close()
+    store = HistoryStore(path)
+    run(store, {"a.com": 5})
+    run(store, {"a.com": 50})
+    assert [change["change"] for change in store.diff()] == [GAINED]
+    store.close()
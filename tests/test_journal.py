@@ -0,0 +1,52 @@
+import json
+import cli
+from journal import Journal
+
+
+def test_resume_skips_a_torn_last_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path))
+    journal.start(["a.com", "b.com", "c.com"], "cx1")
+    journal.record("a.com", 10)
+    journal.close()
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"type": "result", "domain": "b.co')
+    job = Journal(str(path)).load()
+    assert job["cx"] == "cx1"
+    assert job["results"] == {"a.com": 10}
+    assert job["remaining"] == ["b.com", "c.com"]
+
+
+def test_reopen_starts_a_new_line_after_a_torn_one(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path))
+    journal.start(["a.com", "b.com"], "cx1")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as file:
+        file.write('{"type": "res')
+    journal.reopen()
+    journal.record("b.com", 3)
+    journal.close()
+    job = journal.load()
+    assert job["results"] == {"b.com": 3} and job["remaining"] == ["a.com"]
+
+
+def test_finish_removes_the_journal(tmp_path):
+    journal = Journal(str(tmp_path / "journal.jsonl"))
+    journal.start(["a.com"], "cx1")
+    journal.record("a.com", 1)
+    journal.finish()
+    assert journal.load() is None
+
+
+def test_cli_refuses_to_resume_a_run_started_with_another_cx(tmp_path, capsys):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"API_KEYS": ["k1"], "CX": "cx2"}))
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path))
+    journal.start(["a.com", "b.com"], "cx1")
+    journal.record("a.com", 10)
+    journal.close()
+    assert cli.main(["-c", str(config), "--journal", str(path), "--resume"]) == cli.EXIT_CONFIG
+    assert "different CX" in capsys.readouterr().err
+    assert Journal(str(path)).load()["results"] == {"a.com": 10}
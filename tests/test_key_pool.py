@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+import pytest
+import key_pool
+from key_pool import KeyPool, STATUS_EXHAUSTED, STATUS_INVALID, STATUS_OK, quota_day
+
+
+@pytest.fixture
+def today(monkeypatch):
+    day = {"value": "2026-03-01"}
+    monkeypatch.setattr(key_pool, "quota_day", lambda now=None: day["value"])
+    return day
+
+
+def test_quota_day_follows_pacific_time():
+    # 07:30 UTC is still the previous evening in California.
+    assert quota_day(datetime(2026, 3, 2, 7, 30, tzinfo=timezone.utc)) == "2026-03-01"
+    assert quota_day(datetime(2026, 3, 2, 9, 30, tzinfo=timezone.utc)) == "2026-03-02"
+
+
+def test_usage_and_exhaustion_reset_on_a_new_quota_day(today):
+    pool = KeyPool(["k1", "k2"], daily_quota=10)
+    for _ in range(4):
+        pool.record_use("k1")
+    pool.mark_exhausted("k2")
+    assert pool.usage() == {"k1": 4, "k2": 0} and pool.total_remaining() == 6
+    today["value"] = "2026-03-02"
+    assert pool.usage() == {"k1": 0, "k2": 0}
+    assert pool.status("k2") == STATUS_OK and pool.total_remaining() == 20
+
+
+def test_invalid_keys_stay_out_after_the_reset(today):
+    pool = KeyPool(["k1", "k2"])
+    pool.mark_invalid("k1")
+    today["value"] = "2026-03-02"
+    assert pool.status("k1") == STATUS_INVALID
+    assert {pool.acquire() for _ in range(5)} == {"k2"}
+
+
+def test_saved_state_from_an_earlier_day_starts_fresh(today):
+    state = {"k1": {"day": "2026-02-28", "used": 100, "status": STATUS_EXHAUSTED},
+             "k2": {"day": "2026-03-01", "used": 30, "status": STATUS_OK}}
+    pool = KeyPool.from_config(["k1", "k2"], {"KEY_STATE": state, "KEY_QUOTAS": {"k2": 40}})
+    assert pool.remaining("k1") == 100 and pool.remaining("k2") == 10
+    assert pool.to_config()["k1"] == {"day": "2026-03-01", "used": 0, "status": STATUS_OK}
+
+
+def test_acquire_prefers_keys_with_more_quota_left(today):
+    pool = KeyPool(["k1", "k2"], daily_quota=100)
+    for _ in range(75):
+        pool.record_use("k1")
+    picks = [pool.acquire() for _ in range(100)]
+    assert picks.count("k2") == 80
+    pool.mark_exhausted("k2")
+    pool.mark_exhausted("k1")
+    assert pool.acquire() is None and not pool.has_available()
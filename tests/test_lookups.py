@@ -0,0 +1,46 @@
+import json
+import time
+import asyncio
+from gindexchecker_core.lookups import build_engine, check_domains_async
+from rate_limit import RateLimiter
+
+
+class SlowTransport:
+
+    def search(self, api_key, cx, query, timeout=None):
+        time.sleep(0.05)
+        return Response()
+
+
+class Response:
+    status_code = 200
+    headers = {}
+    text = json.dumps({"searchInformation": {"totalResults": "4"}})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def make_engine():
+    return build_engine(["k1"], "cx", transport=SlowTransport(), workers=2,
+                        rate_limiter=RateLimiter(per_minute=100000))
+
+
+def test_async_lookups_yield_every_domain():
+    async def collect():
+        return [item async for item in check_domains_async(["a.com", "b.com", "c.com"], engine=make_engine())]
+
+    assert sorted(asyncio.run(collect())) == [("a.com", 4), ("b.com", 4), ("c.com", 4)]
+
+
+def test_closing_the_async_iterator_waits_for_the_lookups_to_stop():
+    engine = make_engine()
+
+    async def first():
+        results = check_domains_async([f"d{i}.com" for i in range(50)], engine=engine)
+        item = await results.__anext__()
+        await results.aclose()
+        return item, any(thread.is_alive() for thread in engine.threads)
+
+    item, running = asyncio.run(first())
+    assert item[1] == 4 and engine.cancelled and not running
@@ -0,0 +1,54 @@
+from public_suffix import SuffixRules, default_rules, load_rules
+from planner import GROUP_HOST, GROUP_OFF, GROUP_REGISTRABLE, plan_queries
+
+
+def test_single_label_tld_needs_no_rule():
+    rules = default_rules()
+    assert rules.registrable_domain("shop.example.com") == "example.com"
+    assert rules.registrable_domain("example.com") == "example.com"
+    assert rules.registrable_domain("com") == "com"
+
+
+def test_multi_label_suffixes():
+    rules = default_rules()
+    assert rules.registrable_domain("a.b.example.co.uk") == "example.co.uk"
+    assert rules.registrable_domain("tienda.com.es") == "tienda.com.es"
+    assert rules.registrable_domain("co.uk") == "co.uk"
+
+
+def test_platform_subdomains_belong_to_different_owners():
+    rules = default_rules()
+    assert rules.registrable_domain("alice.github.io") == "alice.github.io"
+    assert rules.registrable_domain("docs.alice.github.io") == "alice.github.io"
+
+
+def test_wildcard_and_exception_rules():
+    rules = SuffixRules(["*.ck", "!www.ck"])
+    assert rules.registrable_domain("shop.example.co.ck") == "example.co.ck"
+    assert rules.registrable_domain("www.ck") == "www.ck"
+    assert rules.registrable_domain("a.www.ck") == "www.ck"
+
+
+def test_parses_list_format(tmp_path):
+    path = tmp_path / "public_suffix_list.dat"
+    path.write_text("// comment\n\nCOM.ES // trailing comment\n*.KAWASAKI.jp\n!city.kawasaki.jp\nбел\n",
+                    encoding="utf-8")
+    rules = load_rules({"PUBLIC_SUFFIX_FILE": str(path)})
+    assert rules.rules == {"com.es", "*.kawasaki.jp", "xn--90ais"}
+    assert rules.exceptions == {"city.kawasaki.jp"}
+    assert rules.registrable_domain("a.b.kawasaki.jp") == "a.b.kawasaki.jp"
+    assert rules.registrable_domain("x.city.kawasaki.jp") == "city.kawasaki.jp"
+
+
+def test_plan_groups_lines_by_registrable_domain():
+    lines = ["https://a.example.com/page", "www.example.com", "b.example.co.uk", "example.co.uk", "other.org"]
+    plan = plan_queries(lines, GROUP_REGISTRABLE)
+    assert plan.targets == ["example.com", "example.co.uk", "other.org"]
+    assert plan.saved == 2
+    assert plan.expand("example.com", 12) == [("https://a.example.com/page", 12), ("www.example.com", 12)]
+
+
+def test_plan_by_host_and_off():
+    lines = ["https://www.example.com/a", "example.com", "a.example.com"]
+    assert plan_queries(lines, GROUP_HOST).targets == ["example.com", "a.example.com"]
+    assert plan_queries(lines, GROUP_OFF).targets == lines
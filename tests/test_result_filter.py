@@ -0,0 +1,109 @@
+import random
+import pytest
+import result_store
+from result_filter import ResultFilter, implies, parse_filter
+from result_store import QUOTA_CODE, ResultStore
+from tiers import QUOTA_EXCEEDED, tier_for
+
+
+def test_parse_filter():
+    assert parse_filter("10-50 5..2 >10 >=10 <5 <=5 =0") == [
+        ("range", (10, 50)), ("range", (2, 5)), ("range", (11, QUOTA_CODE - 1)), ("range", (10, QUOTA_CODE - 1)),
+        ("range", (0, 4)), ("range", (0, 5)), ("range", (0, 0))]
+    assert parse_filter(" Shop  .ES tld:io ^blog news* ") == [
+        ("contains", "shop"), ("suffix", ".es"), ("suffix", ".io"), ("prefix", "blog"), ("prefix", "news")]
+    assert parse_filter("") == []
+
+
+def test_implies():
+    assert implies(("contains", "shop"), ("contains", "sho"))
+    assert implies(("prefix", "shop"), ("contains", "ho"))
+    assert implies(("suffix", ".co.uk"), ("suffix", ".uk"))
+    assert not implies(("suffix", ".uk"), ("suffix", ".co.uk"))
+    assert implies(("range", (10, 20)), ("range", (0, 50)))
+    assert not implies(("range", (10, 60)), ("range", (0, 50)))
+    assert not implies(("contains", "shop"), ("range", (0, 50)))
+
+
+def matches(domain, total, text):
+    value = QUOTA_CODE if total == QUOTA_EXCEEDED else total
+    for kind, term in parse_filter(text):
+        if kind == "range":
+            ok = term[0] <= value <= term[1]
+        elif kind == "contains":
+            ok = term in domain
+        elif kind == "prefix":
+            ok = domain.startswith(term)
+        else:
+            ok = domain.endswith(term)
+        if not ok:
+            return False
+    return True
+
+
+@pytest.fixture(params=["memory", "spilled"])
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, "SPILLED_SORT_SECONDS", 0)
+    store = ResultStore(memory_rows=200 if request.param == "spilled" else 10 ** 6, spill_dir=str(tmp_path))
+    yield store
+    store.close()
+
+
+def sample(count, seed):
+    rng = random.Random(seed)
+    words, suffixes = ["shop", "blog", "casa"], ["es", "com", "io"]
+    return [(f"{rng.choice(words)}{rng.randint(0, 9999)}-{seed}-{i}.{rng.choice(suffixes)}",
+             rng.choice([0, 2, 7, 40, 900, QUOTA_EXCEEDED])) for i in range(count)]
+
+
+QUERIES = ["sh", "sho", "shop", "shop .es", ".es", "^blog", "blog*", "tld:io", "1-50", ">100", "=0",
+           "shop 1-50", "1-50 shop", "-1-"]
+
+
+def test_view_matches_a_plain_scan(store):
+    result_filter = ResultFilter(store)
+    truth = {}
+    # Streaming rows in between queries exercises the cached masks being extended and narrowed.
+    for seed in range(3):
+        rows = sample(250, seed)
+        store.add_many(rows)
+        truth.update(rows)
+        for text in QUERIES:
+            result_filter.set_text(text)
+            expected = {domain for domain, total in truth.items() if matches(domain, total, text)}
+            for column, reverse in (("total", True), ("domain", False), ("tier", True)):
+                view = result_filter.view(column, reverse)
+                assert [view[position][0] for position in range(len(view))] == \
+                    [domain for domain, _ in store.rows(column, reverse) if domain in expected], (text, column)
+
+
+def test_cached_masks_see_updates(store):
+    store.add_many([("shop1.es", 3), ("shop2.es", 40), ("blog.es", 3)])
+    result_filter = ResultFilter(store)
+    result_filter.set_text("shop 1-10")
+    assert store.rows(mask=result_filter.mask()) == [("shop1.es", 3)]
+    store.update({"shop1.es": 900, "shop2.es": 5})
+    assert store.rows(mask=result_filter.mask()) == [("shop2.es", 5)]
+    store.add_many([("shop3.es", 1)])
+    assert store.rows(mask=result_filter.mask()) == [("shop2.es", 5), ("shop3.es", 1)]
+    store.clear()
+    assert len(result_filter.view()) == 0
+
+
+def test_mask_feeds_tier_copy_and_export(store):
+    rows = sample(300, 7)
+    store.add_many(rows)
+    result_filter = ResultFilter(store)
+    result_filter.set_text(".es")
+    mask = result_filter.mask()
+    greens = store.domains_in_tiers(["green"], mask)
+    assert sorted(greens) == sorted(d for d, t in rows if d.endswith(".es") and tier_for(t) == "green")
+    exported = [row for chunk in store.snapshot(mask=mask) for row in chunk]
+    assert exported == [row for row in store.rows() if row[0].endswith(".es")]
+
+
+def test_no_filter():
+    store = ResultStore()
+    result_filter = ResultFilter(store)
+    result_filter.set_text("   ")
+    assert not result_filter.active and result_filter.mask() is None and result_filter.view() is None
@@ -0,0 +1,100 @@
+import random
+import pytest
+import result_store
+from result_store import ResultStore
+from tiers import QUOTA_EXCEEDED, TIERS, count_sort_key, tier_for
+
+TOTALS = [0, 1, 3, 6, 8, 11, 40, 900, QUOTA_EXCEEDED]
+
+
+def sample(count, seed=1, prefix="d"):
+    rng = random.Random(seed)
+    return [(f"{prefix}{rng.randint(0, 10 ** 6)}-{i}.com", rng.choice(TOTALS)) for i in range(count)]
+
+
+@pytest.fixture(params=["memory", "spilled"])
+def store(request, tmp_path, monkeypatch):
+    # A spilled store rereads its domain order at most every SPILLED_SORT_SECONDS; tests want it at once.
+    monkeypatch.setattr(result_store, "SPILLED_SORT_SECONDS", 0)
+    store = ResultStore(memory_rows=50 if request.param == "spilled" else 10 ** 6, spill_dir=str(tmp_path))
+    yield store
+    store.close()
+
+
+def listed(view):
+    return [view[position] for position in range(len(view))]
+
+
+def test_total_order(store):
+    rows = sample(300)
+    store.add_many(rows)
+    expected = sorted((total for _, total in rows), key=count_sort_key, reverse=True)
+    assert [total for _, total in listed(store.ordered("total", True))] == expected
+    assert [total for _, total in store.rows("total", False)] == expected[::-1]
+    assert sorted(store.rows()) == sorted(rows)
+
+
+def test_tier_order(store):
+    store.add_many(sample(200))
+    tiers = [tier_for(total) for _, total in store.rows("tier", True)]
+    assert tiers == sorted(tiers, key=TIERS.index)
+
+
+def test_domain_order_follows_appends(store):
+    rows = sample(400)
+    store.add_many(rows[:300])
+    names = sorted(domain for domain, _ in rows[:300])
+    assert [domain for domain, _ in listed(store.ordered("domain", False))] == names
+    # A small append is merged into the existing order, a large one re-sorts; both must match a full sort.
+    for batch in (rows[300:310], rows[310:] + sample(500, seed=2, prefix="e")):
+        store.add_many(batch)
+        names = sorted(names + [domain for domain, _ in batch])
+        assert [domain for domain, _ in listed(store.ordered("domain", False))] == names
+        assert [domain for domain, _ in store.rows("domain", True)] == names[::-1]
+
+
+def test_update_moves_a_row_between_buckets(store):
+    store.add_many([("a.com", 50), ("b.com", 3), ("c.com", QUOTA_EXCEEDED)])
+    updates = store.updates
+    store.update({"a.com": 0, "c.com": 12, "b.com": 3})
+    assert store.updates == updates + 2
+    assert store.rows() == [("c.com", 12), ("b.com", 3), ("a.com", 0)]
+    assert store.get("a.com").tier == "red" and store.get("missing.com") is None
+    assert store.tier_counts() == {"green": 1, "yellow": 0, "orange": 1, "red": 1}
+
+
+def test_domains_in_tiers(store):
+    rows = sample(200)
+    store.add_many(rows)
+    greens = store.domains_in_tiers(["green"])
+    assert sorted(greens) == sorted(d for d, total in rows if tier_for(total) == "green")
+    totals = dict(rows)
+    assert [totals[d] for d in greens] == sorted((totals[d] for d in greens), key=count_sort_key, reverse=True)
+
+
+def test_snapshot_is_taken_in_chunks(store, monkeypatch):
+    monkeypatch.setattr(result_store, "EXPORT_CHUNK", 64)
+    rows = sample(300)
+    store.add_many(rows)
+    chunks = list(store.snapshot())
+    assert [len(chunk) for chunk in chunks] == [64, 64, 64, 64, 44]
+    flat = [row for chunk in chunks for row in chunk]
+    assert flat == store.rows()
+
+
+def test_snapshot_stops_when_the_store_is_cleared(store, monkeypatch):
+    monkeypatch.setattr(result_store, "EXPORT_CHUNK", 64)
+    store.add_many(sample(300))
+    chunks = store.snapshot()
+    next(chunks)
+    store.clear()
+    assert list(chunks) == []
+    assert len(store) == 0 and store.rows() == []
+
+
+def test_spills_past_memory_rows(tmp_path):
+    store = ResultStore(memory_rows=10, spill_dir=str(tmp_path))
+    store.add_many(sample(11))
+    assert store.spilled and len(list(tmp_path.iterdir())) == 1
+    store.close()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,158 @@
+import json
+import asyncio
+import threading
+from key_pool import KeyPool
+from rate_limit import RateLimiter
+from service import DONE, JobService
+
+
+class Response:
+
+    def __init__(self, total):
+        self.status_code = 200
+        self.headers = {}
+        self.text = json.dumps({"searchInformation": {"totalResults": str(total)}})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class CountingTransport:
+    """Answers every domain with the length of its name; ``gate`` holds requests back until it is set."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def search(self, api_key, cx, query, timeout=None):
+        self.gate.wait(5)
+        return Response(len(query) - len("site:"))
+
+
+def serve(test, token=None, transport=None):
+    async def main():
+        service = JobService(KeyPool(["k1"]), "cx", transport=transport or CountingTransport(),
+                             rate_limiter=RateLimiter(per_minute=100000), workers=2, token=token)
+        _, port = await service.start(port=0)
+        try:
+            return await test(service, port)
+        finally:
+            await service.stop()
+    return asyncio.run(main())
+
+
+async def request(port, method, path, body=b"", headers=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost"]
+    head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    if body and not any(name.lower() == "content-length" for name in headers or {}):
+        head.append(f"Content-Length: {len(body)}")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.lower().split(": ", 1) for line in lines[1:])
+    if headers.get("transfer-encoding") == "chunked":
+        body = dechunk(body)
+    return int(lines[0].split()[1]), headers, body
+
+
+def dechunk(data):
+    body = b""
+    while True:
+        size, _, data = data.partition(b"\r\n")
+        size = int(size, 16)
+        if not size:
+            return body
+        body, data = body + data[:size], data[size + 2:]
+
+
+async def submit(port, domains):
+    status, _, body = await request(port, "POST", "/jobs", json.dumps({"domains": domains}).encode(),
+                                    {"Content-Type": "application/json"})
+    assert status == 202
+    return json.loads(body)
+
+
+def test_job_runs_and_serves_its_results():
+    async def test(service, port):
+        job = await submit(port, ["a.com", "bb.com", " ", "a.com"])
+        assert job["domains"] == 2 and job["stream_url"] == f"/jobs/{job['id']}/stream"
+        await request(port, "GET", job["stream_url"])
+        status, _, body = await request(port, "GET", job["results_url"])
+        return status, json.loads(body)
+
+    status, job = serve(test)
+    assert status == 200 and job["state"] == DONE
+    assert sorted((row["domain"], row["total"]) for row in job["results"]) == [("a.com", 5), ("bb.com", 6)]
+    assert job["unprocessed"] == []
+
+
+def test_stream_sends_each_result_then_done():
+    transport = CountingTransport()
+    transport.gate.clear()
+
+    async def test(service, port):
+        job = await submit(port, ["a.com", "bb.com", "ccc.com"])
+        stream = asyncio.ensure_future(request(port, "GET", job["stream_url"]))
+        await asyncio.sleep(0.1)
+        transport.gate.set()
+        return await stream
+
+    status, headers, body = serve(test, transport=transport)
+    events = [json.loads(line) for line in body.decode().splitlines()]
+    assert status == 200 and headers["content-type"] == "application/x-ndjson"
+    assert sorted(event["domain"] for event in events[:-1]) == ["a.com", "bb.com", "ccc.com"]
+    assert events[-1]["event"] == "done" and events[-1]["done"] == 3
+
+
+def test_stream_resumes_from_an_index_as_server_sent_events():
+    async def test(service, port):
+        job = await submit(port, ["a.com", "bb.com", "ccc.com"])
+        await request(port, "GET", job["stream_url"])
+        return await request(port, "GET", job["stream_url"] + "?from=2", headers={"Accept": "text/event-stream"})
+
+    status, headers, body = serve(test)
+    kinds = [line for line in body.decode().splitlines() if line.startswith("event: ")]
+    assert status == 200 and headers["content-type"] == "text/event-stream"
+    assert kinds == ["event: result", "event: done"]
+
+
+def test_bad_input_gets_400():
+    async def test(service, port):
+        job = await submit(port, ["a.com"])
+        return [(await request(port, "GET", job["stream_url"] + "?from=x"))[0],
+                (await request(port, "POST", "/jobs", b"a.com", {"Content-Length": "ten"}))[0],
+                (await request(port, "POST", "/jobs", b"a.com", {"Content-Length": "-1"}))[0],
+                (await request(port, "POST", "/jobs", b"{not json", {"Content-Type": "application/json"}))[0]]
+
+    assert serve(test) == [400, 400, 400, 400]
+
+
+def test_unknown_jobs_and_missing_tokens_are_refused():
+    async def test(service, port):
+        return [(await request(port, "GET", "/jobs/nope"))[0],
+                (await request(port, "GET", "/jobs"))[0],
+                (await request(port, "GET", "/jobs", headers={"Authorization": "Bearer secret"}))[0]]
+
+    assert serve(test, token="secret") == [401, 401, 200]
+
+
+def test_delete_cancels_a_running_job():
+    transport = CountingTransport()
+    transport.gate.clear()
+
+    async def test(service, port):
+        job = await submit(port, [f"d{i}.com" for i in range(20)])
+        await asyncio.sleep(0.1)
+        status, _, _ = await request(port, "DELETE", job["status_url"])
+        transport.gate.set()
+        await request(port, "GET", job["stream_url"])
+        _, _, body = await request(port, "GET", job["status_url"])
+        return status, json.loads(body)
+
+    status, job = serve(test, transport=transport)
+    assert status == 202 and job["state"] == "cancelled"
+    assert job["done"] + job["not_processed"] == 20 and job["not_processed"] > 0
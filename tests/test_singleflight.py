@@ -0,0 +1,102 @@
+import threading
+import pytest
+from singleflight import InflightRegistry
+
+
+def run_together(registry, key, function, callers):
+    results = [None] * callers
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, registry.do(key, function)))
+               for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_callers_share_one_call():
+    registry = InflightRegistry()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    threads, results = run_together(registry, "a.com", slow, 5)
+    while registry.stats()["coalesced"] < 4:
+        threading.Event().wait(0.001)
+    assert registry.in_flight() == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert sorted(results) == [(42, False)] + [(42, True)] * 4
+    assert registry.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_sequential_calls_are_not_shared():
+    registry = InflightRegistry()
+    assert registry.do("a.com", lambda: 1) == (1, False)
+    assert registry.do("a.com", lambda: 2) == (2, False)
+    assert registry.do("b.com", lambda: 3) == (3, False)
+
+
+def test_followers_get_the_leader_exception():
+    registry = InflightRegistry()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("boom")
+
+    def leader():
+        with pytest.raises(RuntimeError):
+            registry.do("a.com", failing)
+
+    def follower():
+        try:
+            registry.do("a.com", lambda: 0)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=leader)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=follower))
+    threads[1].start()
+    while registry.stats()["coalesced"] < 1:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert [str(e) for e in errors] == ["boom"]
+    assert registry.in_flight() == 0
+    assert registry.do("a.com", lambda: 7) == (7, False)
+
+
+def test_engines_sharing_a_registry_query_a_domain_once():
+    pytest.importorskip("requests")
+    from engine import LookupEngine
+    from mock_server import MockSearchServer
+    from rate_limit import RateLimiter
+    from transport import SearchTransport
+    registry = InflightRegistry()
+    domains = [f"d{i}.com" for i in range(20)]
+    with MockSearchServer(latency=0.05, jitter=0) as server:
+        transport = SearchTransport(url=server.url)
+        engines = [LookupEngine(["k1", "k2"], server.cx, workers=4, transport=transport, inflight=registry,
+                                rate_limiter=RateLimiter(per_minute=100000)) for _ in range(2)]
+        results = [None, None]
+        threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, engines[i].run(domains)[0]))
+                   for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        transport.close()
+    assert results[0] == results[1] and len(results[0]) == 20
+    coalesced = engines[0].coalesced + engines[1].coalesced
+    assert coalesced > 0 and server.requests + coalesced == 40
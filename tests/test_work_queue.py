@@ -0,0 +1,131 @@
+import sqlite3
+import pytest
+from planner import GROUP_REGISTRABLE
+from work_queue import LeaseLost, QueueWorker, SQLiteWorkQueue, WorkQueue, open_queue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"))
+    yield queue
+    queue.close()
+
+
+def test_backends_must_implement_the_whole_interface():
+    class Partial(WorkQueue):
+        def submit(self, lines, job_id=None, **options):
+            return "job"
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_submit_splits_lines_into_shards(queue):
+    job = queue.submit([f"d{i}.com" for i in range(25)] + ["d0.com", " "], shard_size=10)
+    status = queue.status(job)
+    assert (status["shards"], status["pending"], status["lines"]) == (3, 3, 25)
+
+
+def test_grouped_lines_stay_in_one_shard(queue):
+    lines = ["a.com", "x.example.com", "y.example.com", "z.example.com", "b.com"]
+    job = queue.submit(lines, shard_size=2, grouping=GROUP_REGISTRABLE)
+    shards = []
+    while True:
+        lease = queue.lease(job, "w1")
+        if lease is None:
+            break
+        shards.append(lease.lines)
+    assert shards == [["a.com"], ["x.example.com", "y.example.com", "z.example.com"], ["b.com"]]
+
+
+def test_expired_lease_is_handed_to_another_worker(queue):
+    job = queue.submit(["a.com", "b.com"])
+    stale = queue.lease(job, "w1", lease_seconds=-1)
+    assert queue.status(job)["expired"] == 1
+    fresh = queue.lease(job, "w2")
+    assert fresh.shard == stale.shard and fresh.token != stale.token
+    with pytest.raises(LeaseLost):
+        queue.record(stale, [("a.com", 1)])
+    with pytest.raises(LeaseLost):
+        queue.complete(stale)
+    queue.record(fresh, [("a.com", 5), ("b.com", 0)])
+    assert queue.complete(fresh)
+    assert queue.results(job) == [("a.com", 5), ("b.com", 0)]
+    assert queue.status(job)["workers"] == {"w2": 2}
+
+
+def test_live_lease_is_not_handed_out_twice(queue):
+    job = queue.submit(["a.com"])
+    assert queue.lease(job, "w1") is not None
+    assert queue.lease(job, "w2") is None
+
+
+def test_new_lease_only_carries_unchecked_lines(queue):
+    job = queue.submit(["a.com", "b.com", "c.com"])
+    first = queue.lease(job, "w1")
+    queue.record(first, [("b.com", 3)])
+    assert not queue.complete(first)
+    assert queue.status(job)["pending"] == 1
+    assert queue.lease(job, "w2").lines == ["a.com", "c.com"]
+
+
+def test_release_returns_the_shard(queue):
+    job = queue.submit(["a.com"])
+    lease = queue.lease(job, "w1")
+    queue.release(lease)
+    assert queue.lease(job, "w2").lines == ["a.com"]
+
+
+def test_open_queue_rejects_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        open_queue("redis://localhost")
+    open_queue(str(tmp_path / "queue.sqlite3")).close()
+
+
+@pytest.fixture
+def engine_factory():
+    pytest.importorskip("requests")
+    from engine import LookupEngine
+    from mock_server import MockSearchServer
+    from rate_limit import RateLimiter
+    from transport import SearchTransport
+    with MockSearchServer(latency=0.001, jitter=0) as server:
+        transport = SearchTransport(url=server.url)
+        yield lambda: LookupEngine(["k1", "k2"], server.cx, workers=4, transport=transport,
+                                   rate_limiter=RateLimiter(per_minute=100000))
+        transport.close()
+
+
+def test_worker_checks_every_shard(queue, engine_factory):
+    lines = [f"d{i}.com" for i in range(30)]
+    job = queue.submit(lines, shard_size=8)
+    seen = []
+    worker = QueueWorker(queue, job, engine_factory, worker_id="w1", on_result=lambda line, total: seen.append(line))
+    assert worker.run(wait=False) == 30
+    assert sorted(seen) == sorted(lines)
+    assert [line for line, _ in queue.results(job)] == lines
+    assert queue.status(job)["done"] == 4 and worker.lost_shards == []
+
+
+def test_worker_retries_a_failed_heartbeat(queue, engine_factory):
+    class LockedQueue(SQLiteWorkQueue):
+        failures = 2
+
+        def record(self, lease, results, lease_seconds=120):
+            if self.failures:
+                self.failures -= 1
+                raise sqlite3.OperationalError("database is locked")
+            return super().record(lease, results, lease_seconds)
+
+    flaky = LockedQueue(queue.path)
+    job = flaky.submit([f"d{i}.com" for i in range(40)])
+    errors = []
+    worker = QueueWorker(flaky, job, engine_factory, lease_seconds=0.3, on_error=errors.append)
+    worker.run(wait=False)
+    assert len(errors) == 2 and "database is locked" in errors[0]
+    assert flaky.status(job)["checked"] == 40
+    flaky.failures = 1000
+    job = flaky.submit(["a.com"])
+    with pytest.raises(sqlite3.OperationalError):
+        QueueWorker(flaky, job, engine_factory, lease_seconds=0.3).run(wait=False)
+    flaky.close()